@@ -1,16 +1,25 @@
+import csv
+import io
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func, desc, case, distinct
 from sqlalchemy.orm import Session
 
 from app.core.security import (
     get_current_active_user,
     check_admin_privileges,
+    get_password_hash,
 )
+from app.core.authz import invalidate_admin_ids
 from app.db.session import get_db
 from app.models.user import User
 from app.models.quiz import DifficultyLevel, Path, Quiz, Category, quiz_category_association, quiz_path_association
-from app.models.challenge import QuizAttempt
+from app.models.challenge import Challenge, QuizAttempt, UserChallenge
+from app.services.path_snapshot import invalidate_path
+from app.services.leaderboard import GLOBAL, leaderboards
+from app.services import analytics, exports, ledger, progress as progress_report, quiz_stats
 from app.schemas.admin import (
     DifficultyLevelCreate,
     DifficultyLevelUpdate,
@@ -27,10 +36,23 @@ from app.schemas.admin import (
     QuizAttemptResponse,
     ParentChildrenProgressResponse,
     StudentProgressSummary,
+    ActivityAnalyticsResponse,
+    QuizStatsResponse,
+    PointsReconciliationResponse,
 )
 
 router = APIRouter()
 
+MAX_ANALYTICS_DAYS = 3 * 366
+
+
+def top_students_by_points(db: Session, limit: int = 5) -> List[User]:
+    """Primi studenti per punti, letti dalla classifica in memoria (una query per i dati utente)."""
+    leaderboards.ensure_fresh(db)
+    top_ids = [user_id for _, user_id, _ in leaderboards.top(GLOBAL, limit)]
+    users = {user.id: user for user in db.query(User).filter(User.id.in_(top_ids))}
+    return [users[user_id] for user_id in top_ids if user_id in users]
+
 @router.get("/test", status_code=status.HTTP_200_OK)
 def test_admin_api(
     current_user: User = Depends(check_admin_privileges),
@@ -151,7 +173,6 @@ def create_path(
     
     # Add quizzes if provided
     if path_in.quiz_ids:
-        from app.models.quiz import Quiz
         quizzes = db.query(Quiz).filter(Quiz.id.in_(path_in.quiz_ids)).all()
         if len(quizzes) != len(path_in.quiz_ids):
             raise HTTPException(
@@ -223,7 +244,6 @@ def update_path(
     
     # Update quizzes if provided
     if path_in.quiz_ids is not None:
-        from app.models.quiz import Quiz
         quizzes = db.query(Quiz).filter(Quiz.id.in_(path_in.quiz_ids)).all()
         if len(quizzes) != len(path_in.quiz_ids):
             raise HTTPException(
@@ -235,6 +255,7 @@ def update_path(
     db.add(path)
     db.commit()
     db.refresh(path)
+    invalidate_path(path_id)
     return path
 
 @router.delete("/paths/{path_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -256,6 +277,7 @@ def delete_path(
     
     db.delete(path)
     db.commit()
+    invalidate_path(path_id)
     return None
 
 @router.get("/stats", response_model=dict)
@@ -267,8 +289,6 @@ def get_system_stats(
     Get system statistics (admin only).
     """
     try:
-        from app.models.challenge import Challenge, QuizAttempt, UserChallenge
-        from datetime import datetime
         
         # Conta gli utenti
         total_users = db.query(User).count()
@@ -333,7 +353,7 @@ def get_system_stats(
             })
         
         # Top students by points
-        top_students = db.query(User).filter(User.role == "student").order_by(User.points.desc()).limit(5).all()
+        top_students = top_students_by_points(db)
         
         # Studenti più attivi (con più tentativi di quiz)
         most_active_students_query = (
@@ -413,9 +433,6 @@ def import_quizzes_from_csv(
     Import quizzes from a CSV file (admin only).
     CSV format: question,option1,option2,option3,option4,correct_answer,explanation,difficulty_level,category
     """
-    import csv
-    import io
-    from app.models.quiz import Quiz, Category, DifficultyLevel
     
     # Leggi il file CSV
     content = file.file.read().decode('utf-8')
@@ -488,7 +505,6 @@ def create_user(
     """
     Create a new user with a specific role (admin only).
     """
-    from app.core.security import get_password_hash
     
     # Verifica se esiste già un utente con lo stesso username o email
     user = db.query(User).filter(
@@ -542,6 +558,7 @@ def create_user(
             user.parents.append(parent)
             db.commit()
     
+    invalidate_admin_ids()
     return user
 
 @router.get("/users", status_code=status.HTTP_200_OK)
@@ -587,7 +604,6 @@ def update_user(
     """
     Update an existing user (admin only).
     """
-    from app.core.security import get_password_hash
     
     # Verifica se l'utente esiste
     user = db.query(User).filter(User.id == user_id).first()
@@ -656,10 +672,14 @@ def update_user(
     if user_update.role == "student" and user.points is None:
         user.points = 0
     elif user_update.role != "student":
+        # Azzera il saldo nel registro prima di togliere i punti
+        if user.points:
+            ledger.set_points(db, user.id, 0, ledger.ROLE_CHANGE)
         user.points = None
     
     db.commit()
     db.refresh(user)
+    invalidate_admin_ids()
     
     return user
 
@@ -685,28 +705,19 @@ def get_user_detail(
         role_info = {}
         
         if user.role == "student":
-            # Calcola il numero totale di tentativi
-            total_attempts = db.query(QuizAttempt).filter(QuizAttempt.user_id == user.id).count()
-            
-            # Calcola il numero di risposte corrette
-            correct_answers = db.query(QuizAttempt).filter(
-                QuizAttempt.user_id == user.id,
-                QuizAttempt.correct == True
-            ).count()
-            
-            # Calcola l'accuratezza
-            accuracy = (correct_answers / total_attempts * 100) if total_attempts > 0 else 0
+            # Tentativi e risposte corrette con una sola query aggregata
+            summary = progress_report.summarize(user, progress_report.attempt_stats(db, [user.id]))
             
             # Aggiungi informazioni specifiche per gli studenti
             role_info = {
-                "total_attempts": total_attempts,
-                "correct_answers": correct_answers,
-                "accuracy": round(accuracy, 2),
+                "total_attempts": summary["total_attempts"],
+                "correct_answers": summary["correct_answers"],
+                "accuracy": summary["accuracy"],
                 "parents": [{
                     "id": parent.id,
                     "username": parent.username,
                     "email": parent.email
-                } for parent in user.parents]
+                } for parent in progress_report.linked_users(db, user.id, children=False)]
             }
         elif user.role == "parent":
             # Aggiungi informazioni specifiche per i genitori
@@ -716,7 +727,7 @@ def get_user_detail(
                     "username": child.username,
                     "email": child.email,
                     "points": child.points or 0
-                } for child in user.students]
+                } for child in progress_report.linked_users(db, user.id, children=True)]
             }
         
         # Restituisci i dati dell'utente con informazioni aggiuntive
@@ -805,7 +816,7 @@ def update_student_points(
             )
         
         # Aggiorna i punti dello studente
-        user.points = points
+        ledger.set_points(db, user.id, points, ledger.MANUAL)
         db.commit()
         db.refresh(user)
         
@@ -851,7 +862,7 @@ def get_users_stats(
             }
         
         # Statistiche sugli studenti
-        students_with_most_points = db.query(User).filter(User.role == "student").order_by(desc(User.points)).limit(5).all()
+        students_with_most_points = top_students_by_points(db)
         
         # Statistiche sui tentativi di quiz
         most_active_students_query = (
@@ -1051,6 +1062,117 @@ def get_quiz_categories_stats(
             detail=f"Error getting quiz categories stats: {str(e)}"
         )
 
+@router.get("/analytics/activity", response_model=ActivityAnalyticsResponse)
+def get_activity_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: str = Query(analytics.DAY, pattern="^(day|week)$"),
+    moving_average: int = Query(0, ge=0, le=90),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_admin_privileges),
+) -> Any:
+    """
+    Attempts, accuracy, active students and points earned/spent per day or
+    per week, with zero-filled buckets and optional moving averages (admin only).
+    """
+    # Di default gli ultimi 30 giorni
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end",
+        )
+    if (end - start).days > MAX_ANALYTICS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {MAX_ANALYTICS_DAYS} days",
+        )
+
+    # Aggiornamento incrementale degli aggregati (solo le righe nuove)
+    analytics.ensure_fresh(db)
+    series = analytics.activity_series(db, start, end, bucket)
+    if moving_average:
+        analytics.with_moving_averages(series, moving_average)
+    return {
+        "bucket": bucket,
+        "start": series[0]["period"],
+        "end": series[-1]["period"] + timedelta(days=6 if bucket == analytics.WEEK else 0),
+        "moving_average_window": moving_average or None,
+        "series": series,
+    }
+
+@router.get("/quiz-stats", response_model=QuizStatsResponse)
+def get_quiz_item_stats(
+    sort: str = Query("p_value", pattern="^(" + "|".join(quiz_stats.SORT_COLUMNS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    min_attempts: int = Query(0, ge=0),
+    question_chars: int = Query(120, ge=10, le=2000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_admin_privileges),
+) -> Any:
+    """
+    Per-quiz difficulty (p-value), attempts, mean attempts to first correct
+    answer and answer histogram, sorted and paginated (admin only).
+    """
+    # Elabora solo i tentativi arrivati dopo l'ultimo aggiornamento
+    quiz_stats.ensure_fresh(db)
+    return quiz_stats.list_stats(
+        db,
+        sort=sort,
+        descending=order == "desc",
+        skip=skip,
+        limit=limit,
+        min_attempts=min_attempts,
+        question_chars=question_chars,
+    )
+
+@router.get("/points/reconciliation", response_model=PointsReconciliationResponse)
+def get_points_reconciliation(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_admin_privileges),
+) -> Any:
+    """
+    Students whose points differ from the sum of their points ledger (admin only).
+    """
+    return {"mismatches": ledger.reconcile(db), "repaired": False}
+
+@router.post("/points/reconciliation", response_model=PointsReconciliationResponse)
+def repair_points_reconciliation(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_admin_privileges),
+) -> Any:
+    """
+    Record the difference between points and ledger of each mismatching
+    student as an adjustment, so the ledger matches users.points (admin only).
+    """
+    return {"mismatches": ledger.reconcile(db, repair=True), "repaired": True}
+
+@router.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    fmt: str = Query(exports.CSV, alias="format", pattern="^(csv|ndjson|parquet)$"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: User = Depends(check_admin_privileges),
+) -> Any:
+    """
+    Stream quiz attempts, student progress or reward purchases
+    (/export/attempts, /export/progress, /export/purchases) as CSV,
+    NDJSON or Parquet for offline analysis (admin only).
+    """
+    try:
+        body = exports.export(dataset, fmt, date_from=date_from, date_to=date_to)
+    except exports.ExportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return StreamingResponse(
+        body,
+        media_type=exports.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{fmt}"'},
+    )
+
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_user(
     user_id: int,
@@ -1078,6 +1200,7 @@ def delete_user(
     # Elimina l'utente
     db.delete(user)
     db.commit()
+    invalidate_admin_ids()
 
 @router.patch("/users/{user_id}/toggle-active", response_model=UserResponse)
 def toggle_user_active_status(
@@ -1113,11 +1236,18 @@ def toggle_user_active_status(
 @router.get("/users/{user_id}/quizzes", response_model=dict)
 def get_student_quizzes(
     user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    question_chars: int = Query(120, ge=10, le=2000),
     db: Session = Depends(get_db),
     current_user: User = Depends(check_admin_privileges),
 ) -> Any:
     """
-    Get all quizzes completed by a student (admin only).
+    Get the quiz attempts of a student, newest first (admin only).
+    Paginated with an opaque cursor: pass back `next_cursor` to get the next page.
+    Totals cover the whole (optionally date-filtered) history.
     """
     try:
         # Verifica se l'utente esiste
@@ -1135,27 +1265,18 @@ def get_student_quizzes(
                 detail="User is not a student",
             )
         
-        # Ottieni tutti i tentativi di quiz dell'utente
-        quiz_attempts = db.query(QuizAttempt).filter(QuizAttempt.user_id == user.id).all()
-        
-        # Calcola le statistiche
-        total_attempts = len(quiz_attempts)
-        correct_answers = sum(1 for attempt in quiz_attempts if attempt.correct)
-        total_points = sum(attempt.points_earned or 0 for attempt in quiz_attempts)
-        
-        # Formatta i tentativi per la risposta
-        formatted_attempts = []
-        for attempt in quiz_attempts:
-            quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
-            formatted_attempts.append({
-                "id": attempt.id,
-                "quiz_id": attempt.quiz_id,
-                "quiz_title": quiz.title if quiz else "Unknown Quiz",
-                "answer": attempt.answer,
-                "correct": attempt.correct,
-                "points_earned": attempt.points_earned,
-                "created_at": attempt.created_at.isoformat()
-            })
+        # Pagina dei tentativi (join con quizzes) e totali calcolati in SQL
+        try:
+            history = progress_report.attempt_history(
+                db, user.id, limit,
+                cursor=cursor, date_from=date_from, date_to=date_to,
+                question_chars=question_chars,
+            )
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
         
         # Restituisci la risposta completa
         return {
@@ -1167,11 +1288,10 @@ def get_student_quizzes(
                 "is_active": user.is_active,
                 "points": user.points or 0
             },
-            "attempts": formatted_attempts,
-            "total_attempts": total_attempts,
-            "correct_answers": correct_answers,
-            "total_points": total_points
+            **history,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_student_quizzes: {e}")
         raise HTTPException(
@@ -1204,30 +1324,8 @@ def get_parent_children_progress(
                 detail="User is not a parent",
             )
         
-        # Ottieni i figli dell'utente (studenti associati al genitore)
-        children_data = []
-        for child in user.students:
-            # Calcola il numero totale di tentativi
-            total_attempts = db.query(QuizAttempt).filter(QuizAttempt.user_id == child.id).count()
-            
-            # Calcola il numero di risposte corrette
-            correct_answers = db.query(QuizAttempt).filter(
-                QuizAttempt.user_id == child.id,
-                QuizAttempt.correct == True
-            ).count()
-            
-            # Calcola l'accuratezza
-            accuracy = (correct_answers / total_attempts * 100) if total_attempts > 0 else 0
-            
-            # Aggiungi il sommario del progresso dello studente
-            children_data.append({
-                "id": child.id,
-                "username": child.username,
-                "points": child.points or 0,
-                "total_attempts": total_attempts,
-                "correct_answers": correct_answers,
-                "accuracy": round(accuracy, 2)
-            })
+        # Riepilogo di tutti i figli: una query per i figli e una GROUP BY sui tentativi
+        children_data = progress_report.children_progress(db, user.id)
         
         # Restituisci la risposta
         return ParentChildrenProgressResponse(
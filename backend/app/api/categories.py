@@ -1,3 +1,4 @@
+import random
 from typing import Any, List
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -37,7 +38,6 @@ def create_category(
             detail="Category already exists",
         )
     
-    import random
 
     # Generate a random color if not provided
     color = category_in.color
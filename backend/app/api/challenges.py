@@ -9,10 +9,13 @@ from app.core.security import (
     get_current_active_user,
     check_parent_or_admin_privileges,
 )
+from app.core.authz import AuthContext, get_auth_context
 from app.db.session import get_db
 from app.models.user import User
 from app.models.quiz import Path
 from app.models.challenge import Challenge, UserChallenge
+from app.services import challenge_attempts
+from app.services.challenge_scheduler import challenge_scheduler
 from app.schemas.challenge import (
     ChallengeCreate,
     ChallengeUpdate,
@@ -59,6 +62,7 @@ def create_challenge(
     db.add(db_challenge)
     db.commit()
     db.refresh(db_challenge)
+    challenge_scheduler.upsert(db_challenge)
     return db_challenge
 
 @router.get("/", response_model=ChallengeListResponse)
@@ -68,26 +72,28 @@ def read_challenges(
     active_only: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Retrieve challenges.
     """
-    query = db.query(Challenge)
-    
-    # Filter by active status if requested
+    # Active challenges are served from the in-memory scheduler
     if active_only:
-        now = datetime.now()
-        query = query.filter(
-            Challenge.is_active == True,
-            (Challenge.start_date == None) | (Challenge.start_date <= now),
-            (Challenge.end_date == None) | (Challenge.end_date >= now)
-        )
+        challenge_scheduler.ensure_fresh(db)
+        if current_user.role == "student":
+            active = challenge_scheduler.active_for_creators(auth.parent_ids)
+        elif current_user.role == "parent":
+            active = challenge_scheduler.active_for_creators([current_user.id])
+        else:
+            active = challenge_scheduler.active_for_creators()
+        return {"challenges": active[skip:skip + limit], "total": len(active)}
+    
+    query = db.query(Challenge)
     
     # Students only see challenges created for them
     if current_user.role == "student":
         # Get challenges created by their parents
-        parent_ids = [parent.id for parent in current_user.parents]
-        query = query.filter(Challenge.creator_id.in_(parent_ids))
+        query = query.filter(Challenge.creator_id.in_(auth.parent_ids))
     
     # Parents only see challenges they created
     elif current_user.role == "parent":
@@ -105,6 +111,7 @@ def read_challenge(
     challenge_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Get a specific challenge by id.
@@ -119,8 +126,7 @@ def read_challenge(
     # Check permissions
     if current_user.role == "student":
         # Students can only view challenges created by their parents
-        parent_ids = [parent.id for parent in current_user.parents]
-        if challenge.creator_id not in parent_ids:
+        if not auth.is_child_of(challenge.creator_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions",
@@ -177,6 +183,7 @@ def update_challenge(
     db.add(challenge)
     db.commit()
     db.refresh(challenge)
+    challenge_scheduler.upsert(challenge)
     return challenge
 
 @router.delete("/{challenge_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -205,6 +212,7 @@ def delete_challenge(
     
     db.delete(challenge)
     db.commit()
+    challenge_scheduler.remove(challenge_id)
     return None
 
 @router.post("/attempt", response_model=UserChallengeResponse, status_code=status.HTTP_201_CREATED)
@@ -234,7 +242,7 @@ def create_challenge_attempt(
     
     # Check if challenge is active
     now = datetime.now()
-    if not challenge.is_active:
+    if not challenge.active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Challenge is not active",
@@ -252,39 +260,18 @@ def create_challenge_attempt(
             detail="Challenge has already ended",
         )
     
-    # Check if student already has an active attempt
-    existing_attempt = db.query(UserChallenge).filter(
-        UserChallenge.student_id == current_user.id,
-        UserChallenge.challenge_id == challenge.id,
-        UserChallenge.is_completed == False
-    ).first()
-    
-    if existing_attempt:
-        return existing_attempt
-    
-    # Create attempt
-    db_attempt = UserChallenge(
-        student_id=current_user.id,
-        challenge_id=challenge.id,
-        is_completed=False,
-        points_earned=0,
-        progress={
-            "total_quizzes": len(challenge.path.quizzes),
-            "completed_quizzes": 0,
-            "correct_answers": 0,
-        },
-    )
-    
-    db.add(db_attempt)
-    db.commit()
-    db.refresh(db_attempt)
-    return db_attempt
+    # Return the open attempt if there is one, otherwise create it
+    try:
+        return challenge_attempts.start_attempt(db, current_user.id, challenge)
+    except challenge_attempts.ChallengeAttemptError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.get("/attempt/{attempt_id}", response_model=UserChallengeDetailResponse)
 def read_challenge_attempt(
     attempt_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Get a specific challenge attempt by id.
@@ -298,7 +285,7 @@ def read_challenge_attempt(
     
     # Check permissions
     is_student_owner = current_user.id == attempt.student_id
-    is_parent_of_student = current_user.role == "parent" and attempt.student in current_user.students
+    is_parent_of_student = current_user.role == "parent" and auth.is_parent_of(attempt.student_id)
     is_admin = current_user.role == "admin"
     
     if not (is_student_owner or is_parent_of_student or is_admin):
@@ -334,60 +321,8 @@ def complete_challenge_attempt(
             detail="Not enough permissions",
         )
     
-    # Check if already completed
-    if attempt.is_completed:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Challenge attempt is already completed",
-        )
-    
-    # Get quiz attempts for this challenge
-    from app.models.challenge import QuizAttempt
-    quiz_attempts = db.query(QuizAttempt).filter(
-        QuizAttempt.challenge_attempt_id == attempt.id
-    ).all()
-    
-    # Get all quizzes in the path
-    path_quizzes = attempt.challenge.path.quizzes
-    
-    # Check if all quizzes have been attempted
-    attempted_quiz_ids = {qa.quiz_id for qa in quiz_attempts}
-    path_quiz_ids = {q.id for q in path_quizzes}
-    
-    if not attempted_quiz_ids.issuperset(path_quiz_ids):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not all quizzes in the challenge have been attempted",
-        )
-    
-    # Calculate points earned
-    correct_attempts = [qa for qa in quiz_attempts if qa.is_correct]
-    quiz_points = sum(qa.points_earned for qa in quiz_attempts)
-    
-    # Add bonus points if all answers are correct
-    all_correct = len(correct_attempts) == len(path_quizzes)
-    bonus_points = attempt.challenge.path.bonus_points if all_correct else 0
-    
-    # Set completion data
-    attempt.is_completed = True
-    attempt.completed_time = func.now()
-    attempt.points_earned = quiz_points + bonus_points
-    attempt.progress = {
-        "total_quizzes": len(path_quizzes),
-        "completed_quizzes": len(attempted_quiz_ids),
-        "correct_answers": len(correct_attempts),
-        "bonus_earned": all_correct,
-        "quiz_points": quiz_points,
-        "bonus_points": bonus_points,
-    }
-    
-    # Update student's points
-    student = attempt.student
-    student.points += attempt.points_earned
-    
-    db.add(attempt)
-    db.add(student)
-    db.commit()
-    db.refresh(attempt)
-    
-    return attempt
+    # Completion only checks the per-attempt counters
+    try:
+        return challenge_attempts.complete_attempt(db, attempt)
+    except challenge_attempts.ChallengeAttemptError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
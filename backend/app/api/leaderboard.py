@@ -0,0 +1,117 @@
+from typing import Any, Hashable
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.core.authz import AuthContext, get_auth_context
+from app.db.session import get_db
+from app.models.challenge import Challenge
+from app.models.user import User
+from app.schemas.leaderboard import LeaderboardEntry, LeaderboardResponse, MyRankResponse
+from app.services.leaderboard import GLOBAL, challenge_scope, leaderboards, parent_scope
+
+router = APIRouter()
+
+
+def _page(db: Session, scope: Hashable, name: str, limit: int, offset: int,
+          auth: AuthContext) -> LeaderboardResponse:
+    """Build a leaderboard page from the in-memory index (one query for usernames)."""
+    leaderboards.ensure_fresh(db)
+    rows = leaderboards.top(scope, limit, offset)
+
+    usernames = {}
+    if rows:
+        usernames = dict(
+            db.query(User.id, User.username).filter(User.id.in_([user_id for _, user_id, _ in rows]))
+        )
+
+    return LeaderboardResponse(
+        scope=name,
+        total=leaderboards.size(scope),
+        entries=[
+            LeaderboardEntry(rank=rank, user_id=user_id, username=usernames.get(user_id, ""), points=points)
+            for rank, user_id, points in rows
+        ],
+        my_rank=leaderboards.rank(scope, auth.user_id),
+        my_points=leaderboards.score(scope, auth.user_id),
+    )
+
+
+@router.get("/global", response_model=LeaderboardResponse)
+def get_global_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    auth: AuthContext = Depends(get_auth_context),
+) -> Any:
+    """
+    Top students by total points.
+    """
+    return _page(db, GLOBAL, "global", limit, offset, auth)
+
+
+@router.get("/parent/{parent_id}", response_model=LeaderboardResponse)
+def get_parent_leaderboard(
+    parent_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    auth: AuthContext = Depends(get_auth_context),
+) -> Any:
+    """
+    Leaderboard of the students linked to a parent (the parent, their students or an admin).
+    """
+    if not (auth.is_admin or auth.user_id == parent_id or auth.is_child_of(parent_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return _page(db, parent_scope(parent_id), "parent", limit, offset, auth)
+
+
+@router.get("/challenge/{challenge_id}", response_model=LeaderboardResponse)
+def get_challenge_leaderboard(
+    challenge_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    auth: AuthContext = Depends(get_auth_context),
+) -> Any:
+    """
+    Leaderboard of a challenge, by the best points earned in it.
+    """
+    if not db.query(Challenge.id).filter(Challenge.id == challenge_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Challenge not found",
+        )
+    return _page(db, challenge_scope(challenge_id), "challenge", limit, offset, auth)
+
+
+@router.get("/me", response_model=MyRankResponse)
+def get_my_rank(
+    db: Session = Depends(get_db),
+    auth: AuthContext = Depends(get_auth_context),
+) -> Any:
+    """
+    Positions of the current student in the global and parent leaderboards.
+    """
+    if not auth.is_student:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only students have a rank",
+        )
+    leaderboards.ensure_fresh(db)
+    return MyRankResponse(
+        points=leaderboards.score(GLOBAL, auth.user_id) or 0,
+        global_rank=leaderboards.rank(GLOBAL, auth.user_id),
+        global_total=leaderboards.size(GLOBAL),
+        parent_ranks=[
+            {
+                "parent_id": parent_id,
+                "rank": leaderboards.rank(parent_scope(parent_id), auth.user_id),
+                "total": leaderboards.size(parent_scope(parent_id)),
+            }
+            for parent_id in sorted(auth.parent_ids)
+        ],
+    )
@@ -15,6 +15,8 @@ from app.models.quiz import Path, Quiz, PathQuiz
 from app.models.challenge import PathQuizAttempt, UserProgress
 from app.schemas.quiz import QuizResponse
 from app.schemas.path_quiz import PathQuizCreate, PathQuizResponse, PathQuizAttemptCreate, PathQuizAttemptResponse
+from app.services import ledger
+from app.services.path_snapshot import path_snapshots, invalidate_path
 
 router = APIRouter()
 
@@ -75,6 +77,9 @@ def create_path_quiz(
     db.commit()
     db.refresh(path_quiz)
     
+    # Il contenuto del percorso è cambiato: lo snapshot in cache non è più valido
+    invalidate_path(path.id)
+    
     return path_quiz
 
 @router.get("/path/{path_id}", response_model=List[PathQuizResponse])
@@ -89,9 +94,9 @@ def get_path_quizzes(
     Gli studenti possono vedere solo i quiz dei percorsi a loro assegnati.
     I genitori possono vedere i quiz dei percorsi che hanno creato.
     """
-    # Verifica che il percorso esista
-    path = db.query(Path).filter(Path.id == path_id).first()
-    if not path:
+    # Lo snapshot contiene i quiz già serializzati e gli studenti assegnati
+    snapshot = path_snapshots.get(db, path_id)
+    if not snapshot:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Percorso con ID {path_id} non trovato"
@@ -100,19 +105,14 @@ def get_path_quizzes(
     # Controlla i permessi
     if current_user.role == UserRole.STUDENT:
         # Verifica che il percorso sia assegnato allo studente
-        progress = db.query(UserProgress).filter(
-            UserProgress.user_id == current_user.id,
-            UserProgress.path_id == path_id
-        ).first()
-        
-        if not progress:
+        if not snapshot.is_assigned_to(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Non hai accesso a questo percorso"
             )
     elif current_user.role == UserRole.PARENT:
         # Verifica che il genitore sia il creatore del percorso
-        if path.creator_id != current_user.id:
+        if snapshot.creator_id != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Non hai accesso a questo percorso"
@@ -121,12 +121,8 @@ def get_path_quizzes(
         # Per gli admin, nessuna restrizione
         pass
     
-    # Recupera tutti i quiz del percorso, ordinati per posizione
-    path_quizzes = db.query(PathQuiz).filter(
-        PathQuiz.path_id == path_id
-    ).order_by(PathQuiz.order).all()
-    
-    return path_quizzes
+    # I quiz dello snapshot sono già ordinati per posizione
+    return list(snapshot.quizzes)
 
 @router.get("/{path_quiz_id}", response_model=PathQuizResponse)
 def get_path_quiz(
@@ -138,39 +134,31 @@ def get_path_quiz(
     """
     Recupera un quiz specifico di un percorso.
     """
-    # Recupera il quiz del percorso
-    path_quiz = db.query(PathQuiz).filter(PathQuiz.id == path_quiz_id).first()
-    if not path_quiz:
+    # Recupera lo snapshot del percorso che contiene il quiz
+    snapshot = path_snapshots.get_for_path_quiz(db, path_quiz_id)
+    if not snapshot:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Quiz con ID {path_quiz_id} non trovato nel percorso"
         )
     
-    # Recupera il percorso per controllare i permessi
-    path = db.query(Path).filter(Path.id == path_quiz.path_id).first()
-    
     # Controlla i permessi
     if current_user.role == UserRole.STUDENT:
         # Verifica che il percorso sia assegnato allo studente
-        progress = db.query(UserProgress).filter(
-            UserProgress.user_id == current_user.id,
-            UserProgress.path_id == path.id
-        ).first()
-        
-        if not progress:
+        if not snapshot.is_assigned_to(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Non hai accesso a questo quiz"
             )
     elif current_user.role == UserRole.PARENT:
         # Verifica che il genitore sia il creatore del percorso
-        if path.creator_id != current_user.id:
+        if snapshot.creator_id != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Non hai accesso a questo quiz"
             )
     
-    return path_quiz
+    return snapshot.quizzes_by_id[path_quiz_id]
 
 @router.post("/attempt", response_model=PathQuizAttemptResponse)
 def create_path_quiz_attempt(
@@ -230,7 +218,8 @@ def create_path_quiz_attempt(
     # Se la risposta è corretta, aggiorna i progressi dell'utente
     if is_correct:
         # Aggiorna i punti dell'utente
-        current_user.points += points_earned
+        db.flush()  # Id del tentativo per il registro dei punti
+        ledger.add_points(db, current_user.id, points_earned, ledger.PATH_QUIZ, db_attempt.id)
         
         # Aggiorna il conteggio dei quiz completati nel percorso
         progress.completed_quizzes += 1
@@ -255,7 +244,7 @@ def create_path_quiz_attempt(
             progress.completed = True
             
             # Assegna i punti bonus
-            current_user.points += path_quiz.path.bonus_points
+            ledger.add_points(db, current_user.id, path_quiz.path.bonus_points, ledger.PATH_BONUS, path_quiz.path_id)
             print(f"Percorso completato! Bonus: {path_quiz.path.bonus_points} punti")
         
         db.add(progress)
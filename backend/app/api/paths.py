@@ -11,8 +11,10 @@ from app.schemas.path import (
     StudentPathResponse
 )
 from app.schemas.user import UserResponse
-from app.core.security import verify_parent_student_relation
+from app.core.authz import load_auth_context
 from app.schemas.quiz import QuizResponse
+from app.services import ledger
+from app.services.path_snapshot import invalidate_path
 
 router = APIRouter()
 
@@ -308,6 +310,9 @@ def update_path(
     db.commit()
     db.refresh(path)
     
+    # Invalida lo snapshot del contenuto del percorso
+    invalidate_path(path_id)
+    
     return path
 
 @router.delete("/{path_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -367,6 +372,8 @@ def delete_path(
     # Ora possiamo eliminare il percorso
     db.delete(path)
     db.commit()
+    
+    invalidate_path(path_id)
 
 @router.post("/assign", response_model=dict)
 def assign_path_to_student(
@@ -417,7 +424,7 @@ def assign_path_to_student(
         )
     
     # Verifica la relazione genitore-figlio
-    is_parent = verify_parent_student_relation(db, current_user.id, student.id)
+    is_parent = load_auth_context(db, current_user).is_parent_of(student.id)
     if not is_parent:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -491,6 +498,9 @@ def assign_path_to_student(
     db.add(progress)
     db.commit()
     
+    # Lo snapshot include i quiz copiati e gli studenti assegnati
+    invalidate_path(path_template.id)
+    
     return {
         "message": f"Percorso '{path_template.name}' assegnato con successo allo studente {student.email}"
     }
@@ -537,7 +547,7 @@ def unassign_path_from_student(
         )
     
     # Verifica che lo studente sia associato al genitore
-    if not verify_parent_student_relation(db, current_user.id, student.id):
+    if not load_auth_context(db, current_user).is_parent_of(student.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Non sei il genitore di questo studente"
@@ -559,6 +569,8 @@ def unassign_path_from_student(
     db.delete(existing_progress)
     db.commit()
     
+    invalidate_path(path.id)
+    
     return {"message": f"Percorso '{path.name}' disassegnato con successo dallo studente {student.email}"}
 
 @router.get("/student/{path_id}/completed-quizzes", response_model=List[int])
@@ -627,7 +639,7 @@ def get_student_paths(
             )
     elif current_user.role == UserRole.PARENT:
         # Il genitore può vedere solo i percorsi dei suoi studenti
-        if not verify_parent_student_relation(db, current_user.id, student_id):
+        if not load_auth_context(db, current_user).is_parent_of(student_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Non sei il genitore di questo studente"
@@ -751,8 +763,7 @@ def mark_quiz_completed_in_path(
         # Assegna i punti bonus allo studente
         path = db.query(Path).filter(Path.id == path_id).first()
         if path and path.bonus_points > 0:
-            student = db.query(User).filter(User.id == current_user.id).first()
-            student.points += path.bonus_points
+            ledger.add_points(db, current_user.id, path.bonus_points, ledger.PATH_BONUS, path.id)
     
     db.commit()
     
@@ -776,8 +787,7 @@ def get_student_paths(
         )
     
     # Verifica che lo studente sia figlio del genitore corrente
-    student_user = db.query(User).filter(User.id == student_id).first()
-    if not student_user or student_user not in current_user.students:
+    if not load_auth_context(db, current_user).is_parent_of(student_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Non hai il permesso di visualizzare i percorsi di questo studente"
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, List, Optional
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -8,7 +8,9 @@ from app.core.security import (
     get_current_active_user,
     check_parent_or_admin_privileges,
 )
+from app.core.authz import AuthContext, get_auth_context
 from app.db.session import get_db
+from app.services import ledger, progress as progress_report
 from app.models.user import User
 from app.models.challenge import QuizAttempt, UserChallenge, UserReward
 from app.schemas.progress import (
@@ -21,6 +23,7 @@ from app.schemas.progress import (
     Response,
     ListResponse,
     StudentProgressResponse,
+    ChildrenProgressResponse,
 )
 
 router = APIRouter()
@@ -57,6 +60,7 @@ def read_rewards(
     active_only: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Retrieve rewards.
@@ -73,11 +77,9 @@ def read_rewards(
     
     # Students only see active rewards created by their parents or admins
     elif current_user.role == "student":
-        parent_ids = [parent.id for parent in current_user.parents]
         query = query.filter(
             Reward.is_active == True,
-            (Reward.creator_id.in_(parent_ids)) | 
-            (Reward.creator_id.in_(db.query(User.id).filter(User.role == "admin")))
+            Reward.creator_id.in_(auth.parent_ids | auth.admin_ids)
         )
     
     # Admins see all rewards
@@ -92,6 +94,7 @@ def read_reward(
     reward_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Get a specific reward by id.
@@ -105,10 +108,7 @@ def read_reward(
     
     # Check permissions for students
     if current_user.role == "student":
-        parent_ids = [parent.id for parent in current_user.parents]
-        admin_ids = [user.id for user in db.query(User).filter(User.role == "admin").all()]
-        
-        if reward.creator_id not in parent_ids and reward.creator_id not in admin_ids:
+        if not auth.is_child_of(reward.creator_id) and reward.creator_id not in auth.admin_ids:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not enough permissions",
@@ -211,13 +211,6 @@ def redeem_reward(
             detail="UserReward not found or not active",
         )
     
-    # Verify student has enough points
-    if current_user.points < reward.points_cost:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not enough points to redeem this reward",
-        )
-    
     # Create redemption
     db_redemption = UserReward(
         user_id=current_user.id,
@@ -227,11 +220,18 @@ def redeem_reward(
         icon=reward.icon
     )
     
-    # Deduct points from student
-    current_user.points -= reward.points_cost
-    
     db.add(db_redemption)
-    db.add(current_user)
+    db.flush()
+    
+    # Deduct points from student, only if the balance covers the cost
+    if ledger.add_points(db, current_user.id, -reward.points_cost, ledger.REDEMPTION, db_redemption.id,
+                         min_balance=0) is None:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not enough points to redeem this reward",
+        )
+    
     db.commit()
     db.refresh(db_redemption)
     return db_redemption
@@ -243,6 +243,7 @@ def read_redemptions(
     status: str = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Retrieve reward redemptions.
@@ -255,8 +256,7 @@ def read_redemptions(
     
     # Parents only see rewards from their students
     elif current_user.role == "parent":
-        student_ids = [student.id for student in current_user.students]
-        query = query.filter(UserReward.user_id.in_(student_ids))
+        query = query.filter(UserReward.user_id.in_(auth.child_ids))
     
     # Admins see all redemptions
     
@@ -267,11 +267,33 @@ def read_redemptions(
 
 # Funzione rimossa perché RewardRedemption non esiste più
 
+@router.get("/children", response_model=ChildrenProgressResponse)
+def get_children_progress(
+    parent_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_parent_or_admin_privileges),
+) -> Any:
+    """
+    Progress summary of all of a parent's children in one call
+    (parents get their own children, admins pass parent_id).
+    """
+    if current_user.role == "parent":
+        parent_id = current_user.id
+    elif parent_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="parent_id is required",
+        )
+    
+    children = progress_report.children_progress(db, parent_id)
+    return {"children": children, "total_children": len(children)}
+
 @router.get("/student/{student_id}", response_model=StudentProgressResponse)
 def get_student_progress(
     student_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Get a student's progress (for parents, admins, or the student themselves).
@@ -286,7 +308,7 @@ def get_student_progress(
     
     # Check permissions
     is_self = current_user.id == student_id
-    is_parent = current_user.role == "parent" and student in current_user.students
+    is_parent = current_user.role == "parent" and auth.is_parent_of(student_id)
     is_admin = current_user.role == "admin"
     
     if not (is_self or is_parent or is_admin):
@@ -295,77 +317,5 @@ def get_student_progress(
             detail="Not enough permissions",
         )
     
-    # Get quiz attempts
-    quiz_attempts = db.query(QuizAttempt).filter(QuizAttempt.student_id == student_id).all()
-    
-    # Get challenge attempts
-    challenge_attempts = db.query(UserChallenge).filter(UserChallenge.user_id == student_id).all()
-    
-    # Get reward redemptions
-    redemptions = db.query(UserReward).filter(UserReward.user_id == student_id).all()
-    
-    # Calculate statistics
-    total_quizzes_attempted = len(quiz_attempts)
-    correct_quiz_answers = len([qa for qa in quiz_attempts if qa.correct])
-    quiz_success_rate = (correct_quiz_answers / total_quizzes_attempted * 100) if total_quizzes_attempted > 0 else 0
-    
-    total_challenges_attempted = len(challenge_attempts)
-    completed_challenges = len([ca for ca in challenge_attempts if ca.completed])
-    challenge_completion_rate = (completed_challenges / total_challenges_attempted * 100) if total_challenges_attempted > 0 else 0
-    
-    total_points_earned = student.points + sum(r.points for r in redemptions)
-    total_points_spent = sum(r.points for r in redemptions)
-    
-    return {
-        "student": {
-            "id": student.id,
-            "username": student.username,
-            "full_name": student.full_name,
-            "points": student.points,
-        },
-        "quiz_stats": {
-            "total_attempted": total_quizzes_attempted,
-            "correct_answers": correct_quiz_answers,
-            "success_rate": round(quiz_success_rate, 2),
-        },
-        "challenge_stats": {
-            "total_attempted": total_challenges_attempted,
-            "completed": completed_challenges,
-            "completion_rate": round(challenge_completion_rate, 2),
-        },
-        "points_stats": {
-            "total_earned": total_points_earned,
-            "total_spent": total_points_spent,
-            "current_balance": student.points,
-        },
-        "recent_quiz_attempts": [
-            {
-                "id": qa.id,
-                "quiz_id": qa.quiz_id,
-                "is_correct": qa.is_correct,
-                "points_earned": qa.points_earned,
-                "created_at": qa.created_at,
-            }
-            for qa in sorted(quiz_attempts, key=lambda x: x.created_at, reverse=True)[:5]
-        ],
-        "recent_challenge_attempts": [
-            {
-                "id": ca.id,
-                "challenge_id": ca.challenge_id,
-                "is_completed": ca.is_completed,
-                "points_earned": ca.points_earned,
-                "created_at": ca.created_at,
-            }
-            for ca in sorted(challenge_attempts, key=lambda x: x.created_at, reverse=True)[:5]
-        ],
-        "recent_redemptions": [
-            {
-                "id": r.id,
-                "reward_id": r.reward_id,
-                "points_spent": r.points_spent,
-                "status": r.status,
-                "created_at": r.created_at,
-            }
-            for r in sorted(redemptions, key=lambda x: x.created_at, reverse=True)[:5]
-        ],
-    }
+    # Aggregates and LIMIT 5 subqueries, computed in SQL
+    return progress_report.student_report(db, student)
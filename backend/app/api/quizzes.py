@@ -2,7 +2,8 @@ from typing import Any, List
 import csv
 from io import StringIO
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 import sqlalchemy.orm
 
@@ -10,9 +11,13 @@ from app.core.security import (
     get_current_active_user,
     check_admin_privileges,
 )
+from app.core.responses import model_response
 from app.db.session import get_db
 from app.models.user import User
 from app.models.quiz import Quiz, Category, DifficultyLevel, Path, quiz_path_association
+from app.models.challenge import QuizAttempt, UserProgress
+from app.services import challenge_attempts, ledger, quiz_search
+from app.services.recommendations import recommender
 from app.schemas.quiz import (
     QuizCreate,
     QuizUpdate,
@@ -24,6 +29,8 @@ from app.schemas.quiz import (
     CategoryInQuiz,
     DifficultyLevelInQuiz,
     CompletedQuizIdResponse,
+    QuizRecommendationsResponse,
+    QuizSearchResponse,
 )
 
 router = APIRouter()
@@ -105,7 +112,70 @@ def read_quizzes(
     total = query.count()
     quizzes = query.offset(skip).limit(limit).all()
     
-    return {"quizzes": quizzes, "total": total}
+    return model_response(QuizListResponse, {"quizzes": quizzes, "total": total})
+
+@router.get("/search", response_model=QuizSearchResponse)
+def search_quizzes(
+    q: str = Query(..., min_length=2, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    category_id: int = None,
+    difficulty_level_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Full-text search over quiz questions and explanations, ranked by
+    relevance, with the matching words highlighted in the snippet.
+    """
+    return quiz_search.search(
+        db,
+        q,
+        skip=skip,
+        limit=limit,
+        category_id=category_id,
+        difficulty_level_id=difficulty_level_id,
+    )
+
+@router.get("/recommended", response_model=QuizRecommendationsResponse)
+def read_recommended_quizzes(
+    limit: int = Query(10, ge=1, le=50),
+    category_id: int = None,
+    difficulty_level_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Next best quizzes for the current user, based on their mastery by
+    category and difficulty (already solved quizzes are excluded).
+    """
+    ranked = recommender.recommend(
+        db,
+        current_user.id,
+        limit=limit,
+        category_id=category_id,
+        difficulty_level_id=difficulty_level_id,
+    )
+    if not ranked:
+        return {"quizzes": []}
+
+    # Solo i quiz scelti vengono caricati, con categorie e difficoltà
+    quizzes = {
+        quiz.id: quiz
+        for quiz in db.query(Quiz)
+        .options(
+            sqlalchemy.orm.selectinload(Quiz.categories),
+            sqlalchemy.orm.joinedload(Quiz.difficulty_level),
+        )
+        .filter(Quiz.id.in_([quiz_id for quiz_id, _ in ranked]))
+    }
+    return {
+        "quizzes": [
+            {**QuizDetailResponse.model_validate(quizzes[quiz_id]).model_dump(), "predicted_success": predicted}
+            for quiz_id, predicted in ranked
+            if quiz_id in quizzes
+        ]
+    }
 
 @router.get("/{quiz_id}", response_model=QuizDetailResponse)
 def read_quiz(
@@ -221,7 +291,6 @@ def create_quiz_attempt(
         )
     
     # Check if the user has already successfully completed this quiz
-    from app.models.challenge import QuizAttempt
     print(f"\n\nDEBUG - Esecuzione query per verificare tentativi precedenti: user_id={current_user.id}, quiz_id={quiz.id}")
     # Mostra prima tutti i tentativi dell'utente per questo quiz
     all_attempts = db.query(QuizAttempt).filter(
@@ -284,7 +353,6 @@ def create_quiz_attempt(
     print(f"DEBUG - Punti effettivamente assegnati: {points_earned} (azzerati: {already_completed})")
     
     # Create attempt
-    from app.models.challenge import QuizAttempt
     
     db_attempt = QuizAttempt(
         user=current_user,
@@ -293,20 +361,30 @@ def create_quiz_attempt(
         correct=is_correct,  # Nel modello si chiama 'correct' non 'is_correct'
         points_earned=points_earned,
         completed=is_correct,  # Imposta a true se la risposta è corretta
-        # attempt_time e challenge_attempt_id non sono presenti nel modello
+        # attempt_time non è presente nel modello
     )
     
     db.add(db_attempt)
     
+    # Risposta data all'interno di una sfida: aggiorna i contatori del tentativo
+    if attempt_in.challenge_attempt_id is not None:
+        try:
+            challenge_attempts.record_quiz_attempt(
+                db, db_attempt, current_user.id, attempt_in.challenge_attempt_id
+            )
+        except challenge_attempts.ChallengeAttemptError as e:
+            db.rollback()
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
     # Update student's points if correct
     print(f"\n\nDebug - Tentativo quiz: utente={current_user.username}, risposta={attempt_in.answer}, corretta={is_correct}")
     print(f"Debug - Punti prima: {current_user.points}")
     
     if is_correct:
-        current_user.points += points_earned
+        db.flush()  # Id del tentativo per il registro dei punti
+        ledger.add_points(db, current_user.id, points_earned, ledger.QUIZ, db_attempt.id)
         print(f"Debug - Punti guadagnati: {points_earned}")
         print(f"Debug - Punti dopo l'incremento: {current_user.points}")
-        db.add(current_user)
         
     db.commit()
     # Refreshiamo anche l'utente per assicurarci che i punti siano stati aggiornati nel database
@@ -318,9 +396,6 @@ def create_quiz_attempt(
     # Se la risposta è corretta, segna il quiz come completato nei percorsi associati
     if is_correct:
         # Trova tutti i percorsi che contengono questo quiz e che sono assegnati allo studente
-        from app.models.quiz import Path, quiz_path_association
-        from app.models.challenge import UserProgress
-        from sqlalchemy import and_
         
         # Query per trovare i percorsi che contengono questo quiz
         paths_with_quiz = db.query(Path).join(
@@ -343,7 +418,6 @@ def create_quiz_attempt(
             
             if user_progress:
                 # Conta i quiz già completati in questo percorso
-                from sqlalchemy import select, func
                 
                 # Trova tutti i quiz del percorso
                 stmt = select([quiz_path_association.c.quiz_id]).where(
@@ -368,7 +442,7 @@ def create_quiz_attempt(
                     user_progress.completed = True
                     
                     # Assegna i punti bonus
-                    current_user.points += path.bonus_points
+                    ledger.add_points(db, current_user.id, path.bonus_points, ledger.PATH_BONUS, path.id)
                     print(f"Debug - Percorso completato! Bonus: {path.bonus_points} punti")
                 
                 db.add(user_progress)
@@ -407,7 +481,6 @@ def get_completed_quizzes(
     """
     Get quizzes successfully completed by the current user.
     """
-    from app.models.challenge import QuizAttempt
     
     # Query for all attempts where the user completed a quiz successfully
     completed_attempts = db.query(QuizAttempt).filter(
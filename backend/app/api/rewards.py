@@ -5,6 +5,7 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
 
 from app.core.auth import get_current_user, get_current_active_user
+from app.core.authz import AuthContext, get_auth_context
 from app.db.session import get_db
 from app.models.user import User, UserRole
 from app.models.reward import Reward, RewardPurchase, user_reward_shop_association
@@ -14,6 +15,7 @@ from app.schemas.reward import (
     RewardPurchaseCreate, RewardPurchase as RewardPurchaseSchema,
     StudentShopReward, RewardPurchaseUpdate, ParentStudentShopReward
 )
+from app.services import shop
 
 router = APIRouter()
 
@@ -103,6 +105,8 @@ def update_reward(
     
     db.commit()
     db.refresh(db_reward)
+    # The reward may be listed in any student's shop
+    shop.invalidate_all_shops()
     return db_reward
 
 @router.delete("/rewards/{reward_id}", tags=["rewards"])
@@ -121,6 +125,7 @@ def delete_reward(
     
     db.delete(db_reward)
     db.commit()
+    shop.invalidate_all_shops()
     return {"detail": "Reward deleted successfully"}
 
 # Assign rewards to student shops
@@ -128,7 +133,8 @@ def delete_reward(
 def assign_reward_to_student_shop(
     assignment: StudentRewardAssignment,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Assign a reward to a student's shop (Admin or Parent only)"""
     # Verify permissions
@@ -140,11 +146,7 @@ def assign_reward_to_student_shop(
     
     # If parent, check if the student is their child
     if is_parent:
-        student = db.query(User).filter(
-            User.id == assignment.student_id,
-            User.id.in_([s.id for s in current_user.students])
-        ).first()
-        if not student:
+        if not auth.is_parent_of(assignment.student_id):
             raise HTTPException(status_code=403, detail="Not authorized to assign rewards to this student")
     else:
         student = db.query(User).filter(User.id == assignment.student_id).first()
@@ -156,38 +158,19 @@ def assign_reward_to_student_shop(
     if not reward:
         raise HTTPException(status_code=404, detail="Reward not found")
     
-    # Check if the student already has this reward in their shop
-    association = db.query(user_reward_shop_association).filter(
-        user_reward_shop_association.c.user_id == assignment.student_id,
-        user_reward_shop_association.c.reward_id == assignment.reward_id
-    ).first()
-    
-    if association:
-        # Update the quantity
-        db.execute(
-            user_reward_shop_association.update().where(
-                user_reward_shop_association.c.user_id == assignment.student_id,
-                user_reward_shop_association.c.reward_id == assignment.reward_id
-            ).values(quantity=user_reward_shop_association.c.quantity + assignment.quantity)
-        )
-    else:
-        # Create a new association
-        db.execute(
-            user_reward_shop_association.insert().values(
-                user_id=assignment.student_id,
-                reward_id=assignment.reward_id,
-                quantity=assignment.quantity
-            )
-        )
+    # Insert the reward or add to the existing quantity in one statement
+    shop.assign_to_shops(db, assignment.reward_id, [assignment.student_id], assignment.quantity)
     
     db.commit()
+    shop.invalidate_shop(assignment.student_id)
     return {"detail": "Reward assigned to student shop successfully"}
 
 @router.post("/rewards/assign/bulk/", tags=["rewards"])
 def bulk_assign_reward(
     bulk_assignment: BulkRewardAssignment,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Bulk assign a reward to multiple students' shops (Admin or Parent only)"""
     # Verify permissions
@@ -200,10 +183,9 @@ def bulk_assign_reward(
     # Filter student IDs based on permissions
     authorized_student_ids = []
     if is_parent:
-        parent_student_ids = [s.id for s in current_user.students]
         authorized_student_ids = [
             student_id for student_id in bulk_assignment.student_ids 
-            if student_id in parent_student_ids
+            if auth.is_parent_of(student_id)
         ]
         if not authorized_student_ids:
             raise HTTPException(status_code=403, detail="Not authorized to assign rewards to any of these students")
@@ -215,50 +197,23 @@ def bulk_assign_reward(
     if not reward:
         raise HTTPException(status_code=404, detail="Reward not found")
     
-    # Assign the reward to each authorized student
-    for student_id in authorized_student_ids:
-        # Verify student exists and is a student
-        student = db.query(User).filter(
-            User.id == student_id, 
-            User.role == UserRole.STUDENT
-        ).first()
-        
-        if not student:
-            continue  # Skip if student doesn't exist or isn't a student
-        
-        # Check if the student already has this reward in their shop
-        association = db.query(user_reward_shop_association).filter(
-            user_reward_shop_association.c.user_id == student_id,
-            user_reward_shop_association.c.reward_id == bulk_assignment.reward_id
-        ).first()
-        
-        if association:
-            # Update the quantity
-            db.execute(
-                user_reward_shop_association.update().where(
-                    user_reward_shop_association.c.user_id == student_id,
-                    user_reward_shop_association.c.reward_id == bulk_assignment.reward_id
-                ).values(quantity=user_reward_shop_association.c.quantity + bulk_assignment.quantity)
-            )
-        else:
-            # Create a new association
-            db.execute(
-                user_reward_shop_association.insert().values(
-                    user_id=student_id,
-                    reward_id=bulk_assignment.reward_id,
-                    quantity=bulk_assignment.quantity
-                )
-            )
+    # Skip ids that don't exist or aren't students (one query for all of them)
+    student_ids = shop.existing_students(db, authorized_student_ids)
+    
+    # Single INSERT ... ON CONFLICT DO UPDATE for all the shops
+    shop.assign_to_shops(db, bulk_assignment.reward_id, student_ids, bulk_assignment.quantity)
     
     db.commit()
-    return {"detail": f"Reward assigned to {len(authorized_student_ids)} student shops successfully"}
+    shop.invalidate_shops(student_ids)
+    return {"detail": f"Reward assigned to {len(student_ids)} student shops successfully"}
 
 @router.delete("/rewards/remove-from-shop/{student_id}/{reward_id}", tags=["rewards"])
 def remove_reward_from_student_shop(
     student_id: int,
     reward_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Remove a reward from a student's shop (Admin or Parent only)"""
     # Verify permissions
@@ -269,7 +224,7 @@ def remove_reward_from_student_shop(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # If parent, check if the student is their child
-    if is_parent and student_id not in [s.id for s in current_user.students]:
+    if is_parent and not auth.is_parent_of(student_id):
         raise HTTPException(status_code=403, detail="Not authorized to remove rewards from this student's shop")
     
     # Delete the association
@@ -281,6 +236,7 @@ def remove_reward_from_student_shop(
     )
     
     db.commit()
+    shop.invalidate_shop(student_id)
     
     if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Reward not found in student's shop")
@@ -297,36 +253,8 @@ def get_student_shop(
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Not authorized - only students can access their shop")
     
-    # Get rewards from the student's shop with quantity
-    shop_rewards = db.query(
-        Reward, 
-        user_reward_shop_association.c.quantity.label("quantity")
-    ).join(
-        user_reward_shop_association,
-        Reward.id == user_reward_shop_association.c.reward_id
-    ).filter(
-        user_reward_shop_association.c.user_id == current_user.id,
-        Reward.is_active == True
-    ).all()
-    
-    # Convert to response schema
-    result = []
-    for reward, quantity in shop_rewards:
-        reward_dict = {
-            "id": reward.id,
-            "name": reward.name,
-            "description": reward.description,
-            "image_url": reward.image_url,
-            "point_cost": reward.point_cost,
-            "is_active": reward.is_active,
-            "creator_id": reward.creator_id,
-            "created_at": reward.created_at,
-            "updated_at": reward.updated_at,
-            "quantity": quantity
-        }
-        result.append(reward_dict)
-    
-    return result
+    # Projection query + per-student cache, no ORM hydration
+    return list(shop.get_student_shop(db, current_user.id))
 
 @router.post("/student/purchase/", response_model=RewardPurchaseSchema, tags=["rewards"])
 def purchase_reward(
@@ -338,63 +266,12 @@ def purchase_reward(
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Not authorized - only students can purchase rewards")
     
-    # Check if the reward is in the student's shop
-    association = db.query(user_reward_shop_association).filter(
-        user_reward_shop_association.c.user_id == current_user.id,
-        user_reward_shop_association.c.reward_id == purchase.reward_id
-    ).first()
-    
-    if not association:
-        raise HTTPException(status_code=404, detail="Reward not found in your shop")
-    
-    # Get the reward with its current price
-    reward = db.query(Reward).filter(
-        Reward.id == purchase.reward_id,
-        Reward.is_active == True
-    ).first()
-    
-    if not reward:
-        raise HTTPException(status_code=404, detail="Reward not available")
-    
-    # Check if student has enough points
-    if current_user.points < reward.point_cost:
-        raise HTTPException(status_code=400, detail=f"Not enough points. You need {reward.point_cost} points but have {current_user.points}")
-    
-    # Create purchase record
-    purchase_record = RewardPurchase(
-        user_id=current_user.id,
-        reward_id=reward.id,
-        point_cost=reward.point_cost,
-        is_delivered=False
-    )
-    
-    # Deduct points from student
-    current_user.points -= reward.point_cost
-    
-    # Reduce quantity in shop or remove if quantity becomes 0
-    current_quantity = association.quantity
-    if current_quantity <= 1:
-        # Delete the association if quantity would become 0
-        db.execute(
-            user_reward_shop_association.delete().where(
-                user_reward_shop_association.c.user_id == current_user.id,
-                user_reward_shop_association.c.reward_id == reward.id
-            )
-        )
-    else:
-        # Decrease quantity by 1
-        db.execute(
-            user_reward_shop_association.update().where(
-                user_reward_shop_association.c.user_id == current_user.id,
-                user_reward_shop_association.c.reward_id == reward.id
-            ).values(quantity=current_quantity - 1)
-        )
-    
-    db.add(purchase_record)
-    db.commit()
-    db.refresh(purchase_record)
-    
-    return purchase_record
+    # Points and shop quantity are decremented with conditional updates,
+    # so concurrent purchases can never overspend or oversell
+    try:
+        return shop.purchase(db, current_user.id, purchase.reward_id)
+    except shop.PurchaseError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.get("/student/purchases/", response_model=List[RewardPurchaseSchema], tags=["rewards"])
 def get_student_purchases(
@@ -416,7 +293,8 @@ def get_student_purchases(
 def get_student_shop_for_parent(
     student_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Get all rewards in a student's shop (Parent only)"""
     is_admin = current_user.role == UserRole.ADMIN
@@ -426,41 +304,19 @@ def get_student_shop_for_parent(
         raise HTTPException(status_code=403, detail="Not authorized")
         
     # If parent, check if the student is their child
-    if is_parent and student_id not in [s.id for s in current_user.students]:
+    if is_parent and not auth.is_parent_of(student_id):
         raise HTTPException(status_code=403, detail="Not authorized to view this student's shop")
         
-    # Get rewards from the student's shop with quantity
-    rewards_query = db.query(
-        Reward,
-        user_reward_shop_association.c.quantity.label("quantity")
-    ).join(
-        user_reward_shop_association,
-        Reward.id == user_reward_shop_association.c.reward_id
-    ).filter(
-        user_reward_shop_association.c.user_id == student_id,
-        Reward.is_active == True
-    )
-    
-    # Convert to ParentStudentShopReward schema
-    result = []
-    for reward, quantity in rewards_query:
-        result.append(ParentStudentShopReward(
-            id=reward.id,
-            name=reward.name,
-            description=reward.description,
-            image_url=reward.image_url,
-            point_cost=reward.point_cost,
-            quantity=quantity
-        ))
-        
-    return result
+    # Same cached shop view used by the student endpoint
+    return shop.get_parent_view(db, student_id)
 
 # Parent and admin endpoints for managing purchases
 @router.get("/admin/purchases/{student_id}", response_model=List[RewardPurchaseSchema], tags=["rewards"])
 def get_student_purchases_admin(
     student_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Get all purchases made by a specific student (Admin or Parent only)"""
     # Verify permissions
@@ -471,7 +327,7 @@ def get_student_purchases_admin(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # If parent, check if the student is their child
-    if is_parent and student_id not in [s.id for s in current_user.students]:
+    if is_parent and not auth.is_parent_of(student_id):
         raise HTTPException(status_code=403, detail="Not authorized to view this student's purchases")
     
     # Get student's purchases
@@ -486,7 +342,8 @@ def update_purchase_status(
     purchase_id: int,
     update: RewardPurchaseUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context)
 ):
     """Update the delivery status of a purchase (Admin or Parent only)"""
     # Verify permissions
@@ -505,7 +362,7 @@ def update_purchase_status(
         raise HTTPException(status_code=404, detail="Purchase not found")
     
     # If parent, check if the student is their child
-    if is_parent and purchase.user_id not in [s.id for s in current_user.students]:
+    if is_parent and not auth.is_parent_of(purchase.user_id):
         raise HTTPException(status_code=403, detail="Not authorized to update this purchase")
     
     # Update the purchase
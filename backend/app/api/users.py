@@ -1,6 +1,6 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.core.security import (
@@ -8,8 +8,11 @@ from app.core.security import (
     get_current_active_user,
     check_admin_privileges,
 )
+from app.core.authz import AuthContext, get_auth_context, invalidate_admin_ids
+from app.core.responses import model_response
 from app.db.session import get_db
 from app.models.user import User, parent_student_association
+from app.services import ledger
 from app.schemas.user import (
     UserCreate,
     UserUpdate,
@@ -18,6 +21,7 @@ from app.schemas.user import (
     UserListResponse,
     ParentStudentLink,
     ChangePoints,
+    PointsHistoryResponse,
 )
 
 router = APIRouter()
@@ -54,6 +58,7 @@ def create_user(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_admin_ids()
     return db_user
 
 @router.get("/", response_model=UserListResponse)
@@ -74,7 +79,7 @@ def read_users(
     total = query.count()
     users = query.offset(skip).limit(limit).all()
     
-    return {"users": users, "total": total}
+    return model_response(UserListResponse, {"users": users, "total": total})
 
 @router.get("/me", response_model=UserDetailResponse)
 def read_user_me(
@@ -91,6 +96,7 @@ def read_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Get a specific user by id.
@@ -104,7 +110,7 @@ def read_user(
     
     # Only admin or parent of student can access another user's data
     is_admin = current_user.role == "admin"
-    is_parent_of_user = current_user.role == "parent" and user.role == "student" and user in current_user.students
+    is_parent_of_user = current_user.role == "parent" and user.role == "student" and auth.is_parent_of(user_id)
     is_self = current_user.id == user_id
     
     if not (is_admin or is_parent_of_user or is_self):
@@ -115,6 +121,41 @@ def read_user(
     
     return user
 
+@router.get("/{user_id}/points-history", response_model=PointsHistoryResponse)
+def read_points_history(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
+) -> Any:
+    """
+    Get a student's current points and their history, newest first.
+    """
+    is_admin = current_user.role == "admin"
+    is_parent_of_user = current_user.role == "parent" and auth.is_parent_of(user_id)
+    if not (is_admin or is_parent_of_user or current_user.id == user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    
+    balance = ledger.get_balance(db, user_id)
+    if balance is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    
+    entries = ledger.history(db, user_id, limit=limit, before_id=before_id)
+    return {
+        "user_id": user_id,
+        "balance": balance,
+        "entries": entries,
+        "next_before_id": entries[-1]["id"] if len(entries) == limit else None,
+    }
+
 @router.put("/{user_id}", response_model=UserResponse)
 def update_user(
     *,
@@ -172,6 +213,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    invalidate_admin_ids()
     return None
 
 @router.post("/link-parent-student", status_code=status.HTTP_201_CREATED)
@@ -222,6 +264,7 @@ def change_student_points(
     points_in: ChangePoints,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    auth: AuthContext = Depends(get_auth_context),
 ) -> Any:
     """
     Change a student's points (admin or parent only).
@@ -236,7 +279,7 @@ def change_student_points(
     
     # Check permissions (admin can change any student's points, parent can only change their students' points)
     is_admin = current_user.role == "admin"
-    is_parent_of_student = current_user.role == "parent" and student in current_user.students
+    is_parent_of_student = current_user.role == "parent" and auth.is_parent_of(student.id)
     
     if not (is_admin or is_parent_of_student):
         raise HTTPException(
@@ -244,12 +287,10 @@ def change_student_points(
             detail="Not enough permissions",
         )
     
-    # Update points
-    student.points += points_in.points
-    if student.points < 0:
-        student.points = 0  # Prevent negative points
+    # Update points atomically; a removal larger than the balance resets it to 0
+    if ledger.add_points(db, student.id, points_in.points, ledger.MANUAL, min_balance=0) is None:
+        ledger.set_points(db, student.id, 0, ledger.MANUAL)
     
-    db.add(student)
     db.commit()
     db.refresh(student)
     
@@ -0,0 +1,139 @@
+"""
+Contesto di autorizzazione per richiesta.
+
+I controlli dei permessi nei router caricavano ogni volta le relazioni lazy
+`current_user.students` / `current_user.parents` o interrogavano la tabella
+utenti per trovare gli admin. L'AuthContext carica una sola volta per richiesta
+gli id dei figli e dei genitori dell'utente corrente (una query sulla tabella di
+associazione) e usa un insieme di id admin condiviso dal processo, così i
+controlli diventano semplici lookup in un set.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+from fastapi import Depends
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.security import get_current_active_user
+from app.db.session import get_db
+from app.models.user import User, parent_student_association
+
+# Chiave usata per memorizzare il contesto nella sessione (che vive quanto la richiesta)
+_SESSION_KEY = "auth_context"
+
+# Tempo massimo di validità dell'insieme degli admin, per limitare la staleness
+# quando l'invalidazione avviene in un altro worker
+ADMIN_IDS_TTL_SECONDS = 300
+
+
+class AdminIdCache:
+    """Insieme degli id admin condiviso dal processo, con invalidazione esplicita"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._admin_ids: Optional[FrozenSet[int]] = None
+        self._loaded_at = 0.0
+
+    def get(self, db: Session) -> FrozenSet[int]:
+        with self._lock:
+            if self._admin_ids is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._admin_ids
+
+        admin_ids = frozenset(
+            user_id for (user_id,) in db.query(User.id).filter(User.role == "admin")
+        )
+
+        with self._lock:
+            self._admin_ids = admin_ids
+            self._loaded_at = time.monotonic()
+        return admin_ids
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._admin_ids = None
+
+
+admin_ids_cache = AdminIdCache(ttl=ADMIN_IDS_TTL_SECONDS)
+
+
+def invalidate_admin_ids() -> None:
+    """Da chiamare dopo ogni creazione, eliminazione o cambio di ruolo di un utente."""
+    admin_ids_cache.invalidate()
+
+
+@dataclass(frozen=True)
+class AuthContext:
+    """Relazioni dell'utente corrente, caricate una volta per richiesta"""
+    user_id: int
+    role: str
+    child_ids: FrozenSet[int]
+    parent_ids: FrozenSet[int]
+    admin_ids: FrozenSet[int]
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @property
+    def is_parent(self) -> bool:
+        return self.role == "parent"
+
+    @property
+    def is_student(self) -> bool:
+        return self.role == "student"
+
+    def is_parent_of(self, student_id: int) -> bool:
+        return student_id in self.child_ids
+
+    def is_child_of(self, parent_id: int) -> bool:
+        return parent_id in self.parent_ids
+
+
+def load_auth_context(db: Session, user: User) -> AuthContext:
+    """
+    Restituisce il contesto di autorizzazione dell'utente.
+    Il risultato viene memorizzato nella sessione, quindi più chiamate
+    nella stessa richiesta eseguono una sola query.
+    """
+    cached = db.info.get(_SESSION_KEY)
+    if cached is not None and cached.user_id == user.id:
+        return cached
+
+    child_ids = set()
+    parent_ids = set()
+    rows = db.query(
+        parent_student_association.c.parent_id,
+        parent_student_association.c.student_id,
+    ).filter(
+        or_(
+            parent_student_association.c.parent_id == user.id,
+            parent_student_association.c.student_id == user.id,
+        )
+    )
+    for parent_id, student_id in rows:
+        if parent_id == user.id:
+            child_ids.add(student_id)
+        if student_id == user.id:
+            parent_ids.add(parent_id)
+
+    context = AuthContext(
+        user_id=user.id,
+        role=user.role,
+        child_ids=frozenset(child_ids),
+        parent_ids=frozenset(parent_ids),
+        admin_ids=admin_ids_cache.get(db),
+    )
+    db.info[_SESSION_KEY] = context
+    return context
+
+
+def get_auth_context(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> AuthContext:
+    """Dipendenza FastAPI che fornisce l'AuthContext dell'utente corrente."""
+    return load_auth_context(db, current_user)
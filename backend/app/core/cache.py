@@ -0,0 +1,123 @@
+"""
+Cache LRU in memoria, thread-safe, con invalidazione per chiave.
+
+Ogni chiave ha un numero di versione che viene incrementato a ogni
+invalidazione: chi calcola un valore legge la versione prima di interrogare il
+database e lo salva solo se nel frattempo nessuno ha invalidato la chiave.
+
+Le versioni sono tenute solo per un numero limitato di chiavi (KeyVersions):
+quelle dimenticate, perché uscite dalla cache o più vecchie, rispondono con una
+versione minima che supera ogni versione già scartata, così nessun valore
+calcolato prima di un'invalidazione può essere salvato.
+
+La cache è locale al processo, e così l'invalidazione: con più worker gli
+altri processi non la vedono. Con `ttl` ogni valore scade dopo quel numero di
+secondi dal salvataggio, che è quindi il ritardo massimo con cui una modifica
+servita da un altro worker diventa visibile.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class KeyVersions:
+    """
+    Versioni per chiave con memoria limitata; non thread-safe, va usata sotto
+    il lock di chi la possiede.
+
+    Le versioni vengono da un contatore unico e crescente. Quando una chiave
+    viene dimenticata la versione minima (`_floor`) sale almeno alla sua, e le
+    chiavi senza versione propria rispondono con quella.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(maxsize, 1)
+        self._versions: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+
+    def get(self, key: Hashable) -> int:
+        return self._versions.get(key, self._floor)
+
+    def bump(self, key: Hashable) -> None:
+        self._clock += 1
+        self._versions[key] = self._clock
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.maxsize:
+            # Le più vecchie hanno la versione più bassa
+            _, version = self._versions.popitem(last=False)
+            self._floor = max(self._floor, version)
+
+    def forget(self, key: Hashable) -> None:
+        version = self._versions.pop(key, None)
+        if version is not None:
+            self._floor = max(self._floor, version)
+
+    def bump_all(self) -> None:
+        self._clock += 1
+        self._floor = self._clock
+        self._versions.clear()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+
+class LRUCache:
+    """Cache LRU con versioni per chiave e scadenza opzionale"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()  # valore, scadenza
+        self._versions = KeyVersions(maxsize)
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self._versions.forget(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def version(self, key: Hashable) -> int:
+        """Token da passare a `put` per evitare di salvare valori già vecchi."""
+        with self._lock:
+            return self._versions.get(key)
+
+    def put(self, key: Hashable, value: Any, version: int) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._versions.get(key) != version:
+                return False
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._versions.forget(evicted)
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._versions.bump(key)
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.bump_all()
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
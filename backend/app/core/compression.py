@@ -0,0 +1,181 @@
+"""
+Compressione delle risposte (Brotli o gzip) in base ad Accept-Encoding.
+
+Rispetto a GZipMiddleware di Starlette:
+  - Brotli se il client lo accetta e il modulo `brotli` è installato,
+    altrimenti gzip; i valori q di Accept-Encoding sono rispettati;
+  - livelli configurabili (COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_LEVEL):
+    per JSON generato a ogni richiesta i livelli medi comprimono quasi quanto i
+    massimi con una frazione della CPU;
+  - le risposte sotto COMPRESSION_MINIMUM_SIZE e i formati già compressi
+    (Parquet, immagini, archivi) passano invariati;
+  - le risposte in streaming (esportazioni) sono compresse blocco per blocco
+    con un flush dopo ogni blocco, così il client riceve i dati man mano e la
+    memoria non dipende dalla dimensione della risposta. Usano un livello a
+    parte (COMPRESSION_STREAM_LEVEL), basso per default: su esportazioni di
+    molti MB gzip 6 comprime a circa 20 MB/s e rallenterebbe la trasmissione
+    (vedi benchmarks/bench_compression.py).
+"""
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip soltanto
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+# Formati che non si comprimono ulteriormente
+EXCLUDED_MEDIA_TYPES = (
+    "application/vnd.apache.parquet",
+    "application/zip",
+    "application/gzip",
+    "application/octet-stream",
+    "image/",
+    "audio/",
+    "video/",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        # wbits=31: formato gzip (header e CRC), non zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Codifica da usare per l'header Accept-Encoding: 'br', 'gzip' o None."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    candidates = [BROTLI, GZIP] if brotli is not None else [GZIP]
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_level: int = 4,
+        stream_level: int = 1,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {GZIP: gzip_level, BROTLI: brotli_level}
+        self.stream_level = stream_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+            if coding is not None:
+                responder = _CompressionResponder(
+                    self.app, coding, self.levels[coding], self.stream_level, self.minimum_size
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, coding: str, level: int, stream_level: int, minimum_size: int) -> None:
+        self.app = app
+        self.coding = coding
+        self.level = level
+        self.stream_level = stream_level
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start_message: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _should_compress(self, headers: Headers) -> bool:
+        if "content-encoding" in headers or self.start_message["status"] in (204, 304):
+            return False
+        media_type = headers.get("content-type", "")
+        return not media_type.startswith(EXCLUDED_MEDIA_TYPES)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Gli header vengono inviati con il primo blocco, quando si sa se comprimere
+            self.start_message = message
+            self.passthrough = not self._should_compress(Headers(raw=message["headers"]))
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(body) < self.minimum_size and not more_body:
+                # Risposta piccola: la compressione non ripaga
+                self.passthrough = True
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            encoder = _BrotliEncoder if self.coding == BROTLI else _GzipEncoder
+            self.encoder = encoder(self.stream_level if more_body else self.level)
+            headers["Content-Encoding"] = self.coding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.encoder.compress(body)
+            else:
+                message["body"] = self.encoder.finish(body)
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        message["body"] = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        await self.send(message)
@@ -0,0 +1,436 @@
+"""
+Tempi delle richieste e query SQL per richiesta.
+
+Il middleware apre per ogni richiesta un RequestStats in una ContextVar; i
+listener before/after_cursor_execute sull'Engine sommano lì numero di query,
+tempo passato nel database e le query più lente. La ContextVar arriva anche
+agli endpoint e alle dipendenze sincrone, eseguiti nel threadpool con una
+copia del contesto.
+
+Per ogni richiesta:
+  - l'header Server-Timing (`app` e `db` con il numero di query) è visibile
+    negli strumenti per sviluppatori del browser;
+  - le metriche per metodo e route (template del path, non il path con gli
+    id) sono esposte in formato Prometheus da GET /metrics;
+  - le richieste oltre SLOW_REQUEST_MS o con più di REQUEST_QUERY_WARNING query
+    (tipicamente un N+1) vengono registrate nel log con le query più lente; le
+    singole query oltre SLOW_QUERY_MS sono registrate anche fuori dalle
+    richieste (job e scheduler).
+
+Con più worker gunicorn (METRICS_DIR, impostata da gunicorn.conf.py) ogni
+worker scrive i suoi contatori in un file della directory ogni
+METRICS_FLUSH_SECONDS (thread avviato dal lifespan) e GET /metrics risponde con la somma di tutti i file,
+qualunque sia il worker che riceve lo scrape. Quando un worker esce il master
+ne sposta i contatori nell'archivio (`mark_process_dead`), così i totali non
+calano quando i worker vengono riciclati. Senza METRICS_DIR le metriche sono
+quelle del processo.
+
+GET /metrics risponde solo con `Authorization: Bearer <METRICS_TOKEN>` (in
+Prometheus `authorization: {credentials: ...}` nello scrape_config): senza
+token configurato o con un token diverso risponde 404.
+"""
+import heapq
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SLOWEST_KEPT = 3
+STATEMENT_CHARS = 300
+
+# Chiave di conn.info con gli istanti di inizio delle query in corso
+_QUERY_START = "metrics_query_start"
+
+
+class RequestStats:
+    """Query eseguite durante una richiesta"""
+
+    __slots__ = ("queries", "db_seconds", "slowest")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest: List[Tuple[float, str]] = []  # min-heap (durata, statement)
+
+    def add(self, seconds: float, statement: str) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        item = (seconds, statement[:STATEMENT_CHARS])
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, item)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def slowest_first(self) -> List[Tuple[float, str]]:
+        return sorted(self.slowest, reverse=True)
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START)
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(seconds, statement)
+    if seconds * 1000 >= settings.SLOW_QUERY_MS:
+        metrics.slow_query()
+        logger.warning("Query lenta (%.1f ms): %s", seconds * 1000, " ".join(statement.split())[:STATEMENT_CHARS])
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, buckets: Tuple[float, ...], value: float) -> None:
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def add(self, counts: List[int], total: float, count: int) -> None:
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+        self.count += count
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+class Metrics:
+    """Contatori e istogrammi per (metodo, route), esposti in formato Prometheus"""
+
+    def __init__(self, directory: Optional[str] = None, flush_seconds: float = 1.0):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.durations: Dict[Tuple[str, str], _Histogram] = {}
+        self.queries: Dict[Tuple[str, str], _Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+        self.slow_queries = 0
+        self.slow_requests = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats, slow: bool) -> None:
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.durations.setdefault(key, _Histogram(DURATION_BUCKETS)).observe(DURATION_BUCKETS, seconds)
+            self.queries.setdefault(key, _Histogram(QUERY_BUCKETS)).observe(QUERY_BUCKETS, stats.queries)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+            if slow:
+                self.slow_requests += 1
+
+    def slow_query(self) -> None:
+        with self._lock:
+            self.slow_queries += 1
+
+    def snapshot(self) -> dict:
+        """Contatori in forma serializzabile in JSON"""
+        with self._lock:
+            return {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "durations": [[*key, h.counts, h.total, h.count] for key, h in self.durations.items()],
+                "queries": [[*key, h.counts, h.total, h.count] for key, h in self.queries.items()],
+                "db_seconds": [[*key, seconds] for key, seconds in self.db_seconds.items()],
+                "slow_queries": self.slow_queries,
+                "slow_requests": self.slow_requests,
+            }
+
+    def merge(self, data: dict) -> None:
+        """Somma ai contatori quelli di uno snapshot"""
+        with self._lock:
+            for method, route, status, count in data["requests"]:
+                key = (method, route, status)
+                self.requests[key] = self.requests.get(key, 0) + count
+            for histograms, buckets, rows in (
+                (self.durations, DURATION_BUCKETS, data["durations"]),
+                (self.queries, QUERY_BUCKETS, data["queries"]),
+            ):
+                for method, route, counts, total, count in rows:
+                    histograms.setdefault((method, route), _Histogram(buckets)).add(counts, total, count)
+            for method, route, seconds in data["db_seconds"]:
+                self.db_seconds[(method, route)] = self.db_seconds.get((method, route), 0.0) + seconds
+            self.slow_queries += data["slow_queries"]
+            self.slow_requests += data["slow_requests"]
+
+    def flush(self) -> None:
+        """Scrive i contatori del processo nel suo file di METRICS_DIR"""
+        if self.directory is None:
+            return
+        with self._flush_lock:
+            _write_json(_worker_path(self.directory, os.getpid()), self.snapshot())
+
+    def start(self) -> None:
+        """Avvia la scrittura periodica (nel worker, dopo il fork)"""
+        if self.directory is None or self._flusher is not None:
+            return
+        self._stopping.clear()
+        self._flusher = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        """Ferma la scrittura periodica e scrive gli ultimi contatori"""
+        thread, self._flusher = self._flusher, None
+        self._stopping.set()
+        if thread is not None:
+            thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Scrittura delle metriche in %s non riuscita", self.directory)
+
+    @staticmethod
+    def _histogram(lines: List[str], name: str, buckets, histograms: Dict[Tuple[str, str], _Histogram]) -> None:
+        for (method, route), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{{{_labels(method=method, route=route, le=bound)}}} {cumulative}")
+            lines.append(f"{name}_bucket{{{_labels(method=method, route=route, le='+Inf')}}} {histogram.count}")
+            lines.append(f"{name}_sum{{{_labels(method=method, route=route)}}} {histogram.total:.6f}")
+            lines.append(f"{name}_count{{{_labels(method=method, route=route)}}} {histogram.count}")
+
+    def render(self) -> str:
+        """Formato di esposizione di Prometheus, sommato tra i worker se c'è METRICS_DIR"""
+        if self.directory is None:
+            return self._render()
+        self.flush()
+        return collect(self.directory)._render()
+
+    def _render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Richieste HTTP per metodo, route e stato.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+            lines += [
+                "# HELP http_request_duration_seconds Durata delle richieste HTTP.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            self._histogram(lines, "http_request_duration_seconds", DURATION_BUCKETS, self.durations)
+
+            lines += [
+                "# HELP db_queries_per_request Query SQL eseguite per richiesta.",
+                "# TYPE db_queries_per_request histogram",
+            ]
+            self._histogram(lines, "db_queries_per_request", QUERY_BUCKETS, self.queries)
+
+            lines += [
+                "# HELP db_query_duration_seconds_total Tempo passato nel database dalle richieste.",
+                "# TYPE db_query_duration_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f"db_query_duration_seconds_total{{{_labels(method=method, route=route)}}} {seconds:.6f}")
+
+            lines += [
+                "# HELP db_slow_queries_total Query oltre SLOW_QUERY_MS.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries}",
+                "# HELP http_slow_requests_total Richieste oltre SLOW_REQUEST_MS o REQUEST_QUERY_WARNING query.",
+                "# TYPE http_slow_requests_total counter",
+                f"http_slow_requests_total {self.slow_requests}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+_ARCHIVE = "archive.json"
+
+
+def _worker_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"worker-{pid}.json")
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict) -> None:
+    # Scrittura atomica: chi legge vede il file vecchio o quello nuovo, mai a metà
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _directory_lock(directory: str, exclusive: bool) -> Iterator[None]:
+    """Lock sul file .lock: condiviso per chi somma, esclusivo per chi archivia"""
+    import fcntl  # solo POSIX, come gunicorn
+
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def collect(directory: str) -> Metrics:
+    """Somma dei file dei worker e dell'archivio dei worker usciti"""
+    total = Metrics()
+    with _directory_lock(directory, exclusive=False):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                data = _read_json(os.path.join(directory, name))
+                if data is not None:
+                    total.merge(data)
+    return total
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """Sposta i contatori di un worker uscito nell'archivio (dal master, hook child_exit)"""
+    path = _worker_path(directory, pid)
+    with _directory_lock(directory, exclusive=True):
+        data = _read_json(path)
+        if data is None:
+            return
+        archive = Metrics()
+        previous = _read_json(os.path.join(directory, _ARCHIVE))
+        if previous is not None:
+            archive.merge(previous)
+        archive.merge(data)
+        _write_json(os.path.join(directory, _ARCHIVE), archive.snapshot())
+        os.remove(path)
+
+
+def reset_directory(directory: str) -> None:
+    """Svuota METRICS_DIR all'avvio del master: i file di un'esecuzione precedente non vanno sommati"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+
+
+def authorized(authorization: Optional[str]) -> bool:
+    """True se l'header Authorization porta METRICS_TOKEN"""
+    if not settings.METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+metrics = Metrics(settings.METRICS_DIR, settings.METRICS_FLUSH_SECONDS)
+if settings.METRICS_DIR:
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+
+# Endpoint -> template del path, per etichettare le metriche senza gli id
+_route_templates: Dict[object, str] = {}
+
+
+def _route_template(scope: Scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _route_templates.get(endpoint)
+    if template is None:
+        app = scope.get("app")
+        for route in getattr(app, "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path
+                break
+        else:
+            template = scope.get("path", "unmatched")
+        _route_templates[endpoint] = template
+    return template
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = True) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    # Tempo fino all'invio degli header (per lo streaming non include il corpo)
+                    app_ms = (time.perf_counter() - start) * 1000
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        f'app;dur={app_ms:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            seconds = time.perf_counter() - start
+            route = _route_template(scope)
+            slow = (seconds * 1000 >= settings.SLOW_REQUEST_MS
+                    or stats.queries > settings.REQUEST_QUERY_WARNING)
+            metrics.observe(scope["method"], route, status, seconds, stats, slow)
+            if slow:
+                logger.warning(
+                    "Richiesta lenta o con molte query: %s %s -> %d in %.1f ms, %d query (%.1f ms nel database)%s",
+                    scope["method"], scope["path"], status, seconds * 1000, stats.queries,
+                    stats.db_seconds * 1000,
+                    "".join(
+                        f"\n  {query_seconds * 1000:.1f} ms: {' '.join(statement.split())}"
+                        for query_seconds, statement in stats.slowest_first()
+                    ),
+                )
@@ -0,0 +1,35 @@
+"""
+Risposte JSON.
+
+L'applicazione usa ORJSONResponse come classe di default: il contenuto già
+preparato da FastAPI viene scritto con orjson invece che con json della
+libreria standard.
+
+Per le liste grandi (quiz, utenti) `model_response` fa tutto in pydantic-core:
+valida gli oggetti ORM con from_attributes e li scrive direttamente in bytes
+con TypeAdapter.dump_json, senza passare da dizionari Python intermedi,
+jsonable_encoder e json.dumps. L'endpoint tiene response_model per la
+documentazione OpenAPI; restituendo una Response FastAPI non la serializza di
+nuovo.
+"""
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def model_response(response_model: Any, content: Any, status_code: int = 200) -> Response:
+    """Risposta JSON per `content` (anche oggetti ORM) secondo lo schema `response_model`."""
+    adapter = _adapter(response_model)
+    value = adapter.validate_python(content, from_attributes=True)
+    return Response(
+        adapter.dump_json(value, by_alias=True),
+        status_code=status_code,
+        media_type="application/json",
+    )
@@ -5,7 +5,11 @@ from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 # Create SQLAlchemy engine
-engine = create_engine(settings.DATABASE_URL)
+# pool_pre_ping scarta le connessioni chiuse dal database (es. dopo un riavvio)
+pool_options = {"pool_pre_ping": True}
+if not settings.DATABASE_URL.startswith("sqlite"):
+    pool_options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+engine = create_engine(settings.DATABASE_URL, **pool_options)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
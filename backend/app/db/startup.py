@@ -0,0 +1,54 @@
+"""
+Fase di avvio del database, eseguita dal lifespan dell'applicazione.
+
+Nulla viene fatto all'import dei moduli: ogni worker crea le tabelle solo se
+DB_CREATE_TABLES è attivo (sviluppo; in produzione lo schema è gestito dalle
+migrazioni), attende che il database risponda con qualche tentativo e apre in
+anticipo DB_POOL_WARMUP connessioni, così le prime richieste non pagano la
+connessione.
+"""
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.models import Base
+
+logger = logging.getLogger(__name__)
+
+
+def wait_for_database(engine: Engine) -> bool:
+    """Prova a connettersi fino a DB_STARTUP_RETRIES volte; False se il database non risponde."""
+    delay = settings.DB_STARTUP_RETRY_SECONDS
+    for attempt in range(1, settings.DB_STARTUP_RETRIES + 1):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.warning("Database non raggiungibile (tentativo %d/%d): %s",
+                           attempt, settings.DB_STARTUP_RETRIES, e)
+            if attempt < settings.DB_STARTUP_RETRIES:
+                time.sleep(delay)
+                delay *= 2
+    return False
+
+
+def create_tables(engine: Engine) -> None:
+    if settings.DB_CREATE_TABLES:
+        Base.metadata.create_all(bind=engine)
+
+
+def prefill_pool(engine: Engine) -> None:
+    """Apre insieme DB_POOL_WARMUP connessioni e le restituisce al pool."""
+    connections = []
+    try:
+        for _ in range(settings.DB_POOL_WARMUP):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,14 @@
+"""
+INSERT ... ON CONFLICT indipendente dal database.
+
+PostgreSQL (produzione) e SQLite (sviluppo e test) hanno entrambi
+ON CONFLICT, ma SQLAlchemy lo espone solo dagli insert dei due dialetti.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def insert_for(db: Session, table):
+    """INSERT con supporto a ON CONFLICT per il dialetto della sessione."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
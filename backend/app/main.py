@@ -1,20 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import logging
+from contextlib import asynccontextmanager
+
+from typing import Optional
+
+from fastapi import FastAPI, Depends, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from app.api import auth, users, quizzes, categories, challenges, progress, admin, test, rewards, paths
+from app.api import auth, users, quizzes, categories, challenges, progress, admin, test, rewards, paths, path_quizzes, leaderboard
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
-from app.db.session import engine, get_db
-from app.models import base
+from app.core.metrics import RequestMetricsMiddleware, authorized, metrics
+from app.db.session import engine, get_db, SessionLocal
+from app.db.startup import create_tables, prefill_pool, wait_for_database
+from app.services.leaderboard import leaderboards
+from app.services.challenge_scheduler import challenge_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def startup():
+    # Timer di attivazione/scadenza delle sfide
+    challenge_scheduler.start()
+    # Contatori del worker scritti in METRICS_DIR per /metrics
+    metrics.start()
+    if not wait_for_database(engine):
+        # Il worker parte comunque: gli indici in memoria si caricano alla prima richiesta
+        logger.error("Database non disponibile all'avvio")
+        return
+    create_tables(engine)
+    prefill_pool(engine)
+    try:
+        with SessionLocal() as db:
+            # Classifiche e finestre delle sfide in memoria
+            leaderboards.rebuild(db)
+            challenge_scheduler.rebuild(db)
+    except Exception:
+        logger.exception("Caricamento degli indici in memoria non riuscito; verrà ripetuto alla prima richiesta")
+
+
+def shutdown():
+    challenge_scheduler.stop()
+    # Ultimi contatori del worker, prima che il master li archivi
+    metrics.stop()
+    engine.dispose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup()
+    yield
+    shutdown()
 
-# Create database tables
-base.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Quiz App API",
     description="API per l'applicazione di quiz educativi",
     version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS for development and production
@@ -30,6 +76,19 @@ app.add_middleware(
     expose_headers=["Content-Disposition"]
 )
 
+# Compressione Brotli/gzip delle risposte, anche in streaming (esportazioni)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_level=settings.COMPRESSION_BROTLI_LEVEL,
+    stream_level=settings.COMPRESSION_STREAM_LEVEL,
+)
+
+# Tempi e query SQL per richiesta (Server-Timing, /metrics, log delle richieste lente)
+if settings.METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, server_timing=settings.SERVER_TIMING)
+
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["Authentication"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["Users"])
@@ -41,6 +100,16 @@ app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["A
 app.include_router(test.router, prefix=f"{settings.API_V1_STR}/test", tags=["Test"])
 app.include_router(rewards.router, prefix=f"{settings.API_V1_STR}", tags=["Rewards"])
 app.include_router(paths.router, prefix=f"{settings.API_V1_STR}/paths", tags=["Paths"])
+app.include_router(path_quizzes.router, prefix=f"{settings.API_V1_STR}/path-quizzes", tags=["Path Quizzes"])
+app.include_router(leaderboard.router, prefix=f"{settings.API_V1_STR}/leaderboard", tags=["Leaderboard"])
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(authorization: Optional[str] = Header(None)):
+    # Solo per lo scraper con METRICS_TOKEN: la porta dell'API è pubblica
+    if not authorized(authorization):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    # Formato di esposizione testuale di Prometheus, sommato tra i worker
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
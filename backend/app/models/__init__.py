@@ -1,5 +1,11 @@
 from app.models.base import Base
 from app.models.user import User, UserRole, parent_student_association, user_reward_association
-from app.models.quiz import Quiz, Category, DifficultyLevel, Path, quiz_category_association, quiz_path_association
-from app.models.challenge import Challenge, QuizAttempt, UserChallenge, UserProgress, UserReward
-from app.models.reward import Reward, RewardPurchase, user_reward_shop_association
\ No newline at end of file
+from app.models.quiz import (
+    Quiz, Category, DifficultyLevel, Path, PathQuiz, StudentPath, quiz_category_association, quiz_path_association
+)
+from app.models.challenge import Challenge, QuizAttempt, PathQuizAttempt, UserChallenge, UserProgress, UserReward
+from app.models.reward import Reward, RewardPurchase, user_reward_shop_association
+from app.models.analytics import (
+    daily_activity, daily_active_students, analytics_watermarks, quiz_item_stats, quiz_student_progress
+)
+from app.models.points import points_ledger
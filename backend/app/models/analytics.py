@@ -0,0 +1,60 @@
+from sqlalchemy import JSON, Column, Date, Float, Integer, String, Table
+
+from app.models.base import Base
+
+# Per-day aggregates of quiz attempts and reward purchases, materialized
+# incrementally by app.services.analytics
+daily_activity = Table(
+    "daily_activity",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("correct_answers", Integer, nullable=False, default=0),
+    Column("points_earned", Integer, nullable=False, default=0),  # Points of correct answers
+    Column("purchases", Integer, nullable=False, default=0),
+    Column("points_spent", Integer, nullable=False, default=0),
+)
+
+# Students with at least one attempt on a given day (distinct counts per week/month).
+# No foreign key on user_id: the history survives user deletion
+daily_active_students = Table(
+    "daily_active_students",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+)
+
+# Last source row id already folded into the aggregates, per source table
+analytics_watermarks = Table(
+    "analytics_watermarks",
+    Base.metadata,
+    Column("source", String, primary_key=True),
+    Column("last_id", Integer, nullable=False, default=0),
+)
+
+# Per-quiz item statistics (difficulty and answer distribution), maintained
+# incrementally by app.services.quiz_stats
+quiz_item_stats = Table(
+    "quiz_item_stats",
+    Base.metadata,
+    Column("quiz_id", Integer, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("correct_attempts", Integer, nullable=False, default=0),
+    Column("p_value", Float, nullable=False, default=0, index=True),  # Share of correct attempts
+    Column("students", Integer, nullable=False, default=0),
+    Column("students_completed", Integer, nullable=False, default=0),  # Students with a correct answer
+    Column("attempts_to_completion", Integer, nullable=False, default=0),  # Sum over completed students
+    Column("mean_attempts_to_completion", Float, nullable=True, index=True),
+    Column("answer_counts", JSON, nullable=False, default=dict),  # {answer: count}
+)
+
+# Attempts of each student on each quiz and the attempt number of the first correct one
+quiz_student_progress = Table(
+    "quiz_student_progress",
+    Base.metadata,
+    Column("quiz_id", Integer, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("completed_at_attempt", Integer, nullable=True),
+)
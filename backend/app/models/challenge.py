@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 
 from app.models.base import BaseModel
@@ -24,6 +24,9 @@ class Challenge(BaseModel):
     path = relationship("Path", back_populates="challenges")
     creator = relationship("User")
     user_challenges = relationship("UserChallenge", back_populates="challenge")
+    
+    # Nome usato dagli schemi e dalle API delle sfide
+    is_active = synonym("active")
 
 class QuizAttempt(BaseModel):
     """Model for tracking user attempts at quizzes"""
@@ -38,18 +41,38 @@ class QuizAttempt(BaseModel):
     # Foreign keys
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    challenge_attempt_id = Column(Integer, ForeignKey("user_challenges.id"), nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="quiz_attempts")
     quiz = relationship("Quiz", back_populates="attempts")
+    challenge_attempt = relationship("UserChallenge", back_populates="quiz_attempts")
+    
+    # Nome usato dagli schemi delle sfide
+    is_correct = synonym("correct")
+    
+    __table_args__ = (
+        Index("ix_quiz_attempts_user_quiz", "user_id", "quiz_id"),
+        Index("ix_quiz_attempts_user_created", "user_id", "created_at"),
+        # Ogni quiz può essere risposto una sola volta per tentativo di sfida
+        UniqueConstraint("challenge_attempt_id", "quiz_id", name="uq_quiz_attempts_challenge_quiz"),
+    )
 
 class UserChallenge(BaseModel):
-    """Model for tracking user participation in challenges"""
+    """Model for tracking user participation in challenges (one row per attempt)"""
     
     __tablename__ = "user_challenges"
     
-    completed = Column(Boolean, default=False)
+    completed = Column(Boolean, default=False, nullable=False)
     points_earned = Column(Integer, default=0)
+    start_time = Column(DateTime, nullable=False, default=datetime.utcnow)
+    completed_time = Column(DateTime, nullable=True)
+    
+    # Contatori aggiornati a ogni risposta, al posto di ricalcolare i tentativi
+    total_quizzes = Column(Integer, nullable=False, default=0)  # Quiz del percorso all'inizio
+    attempted_quizzes = Column(Integer, nullable=False, default=0)
+    correct_answers = Column(Integer, nullable=False, default=0)
+    quiz_points = Column(Integer, nullable=False, default=0)
     
     # Foreign keys
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -58,6 +81,53 @@ class UserChallenge(BaseModel):
     # Relationships
     user = relationship("User", back_populates="challenges")
     challenge = relationship("Challenge", back_populates="user_challenges")
+    quiz_attempts = relationship("QuizAttempt", back_populates="challenge_attempt")
+    
+    # Nomi usati dagli schemi e dalle API delle sfide
+    student_id = synonym("user_id")
+    is_completed = synonym("completed")
+    student = relationship("User", viewonly=True)
+    
+    __table_args__ = (
+        Index("ix_user_challenges_user_challenge_completed", "user_id", "challenge_id", "completed"),
+        Index("ix_user_challenges_challenge_completed", "challenge_id", "completed"),
+        Index("ix_user_challenges_user_created", "user_id", "created_at"),
+        # Un solo tentativo in corso per studente e sfida
+        Index("uq_user_challenges_open_attempt", "user_id", "challenge_id", unique=True,
+              postgresql_where=(completed == False), sqlite_where=(completed == False)),
+    )
+    
+    @property
+    def progress(self) -> dict:
+        """Riepilogo calcolato dai contatori"""
+        return {
+            "total_quizzes": self.total_quizzes,
+            "completed_quizzes": self.attempted_quizzes,
+            "correct_answers": self.correct_answers,
+            "quiz_points": self.quiz_points,
+        }
+
+class PathQuizAttempt(BaseModel):
+    """Model for tracking user attempts at the quizzes of a path"""
+    
+    __tablename__ = "path_quiz_attempts"
+    
+    answer = Column(String, nullable=False)
+    correct = Column(Boolean, nullable=False)
+    points_earned = Column(Integer, default=0)
+    completed = Column(Boolean, default=False)
+    
+    # Foreign keys
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    path_quiz_id = Column(Integer, ForeignKey("path_quizzes.id", ondelete="CASCADE"), nullable=False)
+    
+    # Relationships
+    user = relationship("User", back_populates="path_quiz_attempts")
+    path_quiz = relationship("PathQuiz", back_populates="attempts")
+    
+    __table_args__ = (
+        Index("ix_path_quiz_attempts_user_path_quiz", "user_id", "path_quiz_id"),
+    )
 
 class UserProgress(BaseModel):
     """Model for tracking user progress in paths"""
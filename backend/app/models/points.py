@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Table, func
+
+from app.models.base import Base
+
+# Append-only history of every change to users.points, written by
+# app.services.ledger in the same transaction as the balance update.
+# `balance` is the student's balance right after the change.
+points_ledger = Table(
+    "points_ledger",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("balance", Integer, nullable=False),
+    Column("reason", String(32), nullable=False),  # quiz, path_bonus, purchase, manual, ...
+    Column("reference_id", Integer, nullable=True),  # Id of the attempt, path, purchase... (by reason)
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    # History of a student, newest first (keyset pagination on id)
+    Index("ix_points_ledger_user_id_id", "user_id", "id"),
+)
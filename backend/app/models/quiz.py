@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, JSON, Boolean, Table, Float, DateTime, func
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, JSON, Boolean, Table, Float, DateTime, Index, func
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base, BaseModel
@@ -103,6 +103,58 @@ class Path(BaseModel):
     creator = relationship("User", back_populates="created_paths")
     user_progress = relationship("UserProgress", back_populates="path")
     challenges = relationship("Challenge", back_populates="path")
+    path_quizzes = relationship("PathQuiz", back_populates="path", order_by="PathQuiz.order")
 
     def __repr__(self):
         return f"<Path {self.name}, bonus_points={self.bonus_points}>"
+
+class PathQuiz(BaseModel):
+    """Copy of a quiz inside a path, so later edits to the original quiz don't change the path"""
+    
+    __tablename__ = "path_quizzes"
+    
+    question = Column(Text, nullable=False)
+    options = Column(JSON, nullable=False)
+    correct_answer = Column(String, nullable=False)
+    explanation = Column(Text, nullable=True)
+    points = Column(Integer, default=0)
+    order = Column(Integer, nullable=False, default=0)  # Position in the path
+    
+    # Foreign keys
+    original_quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="SET NULL"), nullable=True)
+    path_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), nullable=True, index=True)
+    student_path_id = Column(Integer, ForeignKey("student_paths.id", ondelete="CASCADE"), nullable=True)
+    
+    # Relationships
+    path = relationship("Path", back_populates="path_quizzes")
+    original_quiz = relationship("Quiz")
+    attempts = relationship("PathQuizAttempt", back_populates="path_quiz", cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"<PathQuiz id={self.id}, path_id={self.path_id}, order={self.order}>"
+
+class StudentPath(BaseModel):
+    """Instance of a path template assigned to a student"""
+    
+    __tablename__ = "student_paths"
+    
+    name = Column(String(100), nullable=False)
+    description = Column(Text, nullable=True)
+    bonus_points = Column(Integer, default=10)
+    completed = Column(Boolean, default=False, nullable=False)
+    completed_quizzes = Column(Integer, default=0, nullable=False)
+    
+    # Foreign keys
+    template_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # Relationships
+    template = relationship("Path")
+    user = relationship("User")
+    
+    __table_args__ = (
+        Index("ix_student_paths_user_template", "user_id", "template_id"),
+    )
+    
+    def __repr__(self):
+        return f"<StudentPath {self.name}, user_id={self.user_id}, template_id={self.template_id}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Table, Boolean
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Table, Boolean, Index
 from sqlalchemy.orm import relationship
 
 from app.models.base import BaseModel, Base
@@ -7,10 +7,10 @@ from app.models.base import BaseModel, Base
 user_reward_shop_association = Table(
     "user_reward_shop_association",
     Base.metadata,
-    Column("user_id", Integer, ForeignKey("users.id")),
-    Column("reward_id", Integer, ForeignKey("rewards.id")),
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("reward_id", Integer, ForeignKey("rewards.id"), primary_key=True),
     Column("quantity", Integer, default=1),  # Quantity of this reward available in student's shop
-)
+)  # (user_id, reward_id) is the primary key, so assignments can be upserted
 
 class Reward(BaseModel):
     """Model for rewards that can be purchased by students with points"""
@@ -60,5 +60,9 @@ class RewardPurchase(BaseModel):
     point_cost = Column(Integer, nullable=False)  # Store the point cost at time of purchase
     is_delivered = Column(Boolean, default=False)  # Whether the reward has been delivered
     
+    __table_args__ = (
+        Index("ix_reward_purchases_user_created", "user_id", "created_at"),
+    )
+    
     def __repr__(self):
         return f"<RewardPurchase reward_id={self.reward_id}, user_id={self.user_id}>"
@@ -51,6 +51,7 @@ class User(BaseModel):
     # Relationships
     created_quizzes = relationship("Quiz", back_populates="creator")
     quiz_attempts = relationship("QuizAttempt", back_populates="user")
+    path_quiz_attempts = relationship("PathQuizAttempt", back_populates="user")
     challenges = relationship("UserChallenge", back_populates="user")
     rewards = relationship("Reward", secondary=user_reward_association, back_populates="users")
     purchases = relationship("RewardPurchase", back_populates="user")
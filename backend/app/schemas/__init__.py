@@ -11,3 +11,6 @@ from app.schemas.reward import (
     RewardPurchaseCreate, RewardPurchase, 
     StudentShopReward, RewardPurchaseUpdate
 )
+from app.schemas.leaderboard import (
+    LeaderboardEntry, LeaderboardResponse, MyRankResponse
+)
@@ -1,5 +1,5 @@
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel
 
 
@@ -188,3 +188,70 @@ class ParentChildrenProgressResponse(BaseModel):
     parent: UserResponse
     children: List[StudentProgressSummary]
     total_children: int
+
+
+class ActivityBucket(BaseModel):
+    """Schema for one day/week of activity analytics"""
+    period: date
+    attempts: int
+    correct_answers: int
+    accuracy: float
+    active_students: int
+    points_earned: int
+    points_spent: int
+    purchases: int
+    moving_averages: Optional[Dict[str, float]] = None
+
+
+class ActivityAnalyticsResponse(BaseModel):
+    """Schema for the activity analytics time series"""
+    bucket: str
+    start: date
+    end: date
+    moving_average_window: Optional[int] = None
+    series: List[ActivityBucket]
+
+
+class AnswerOptionStats(BaseModel):
+    """Schema for how often one answer was given to a quiz"""
+    answer: str
+    count: int
+    share: float
+    is_correct: bool
+
+
+class QuizItemStats(BaseModel):
+    """Schema for per-quiz difficulty and answer distribution"""
+    quiz_id: int
+    question: str
+    attempts: int
+    correct_attempts: int
+    p_value: float
+    students: int
+    students_completed: int
+    mean_attempts_to_completion: Optional[float] = None
+    answers: List[AnswerOptionStats]
+    top_distractor: Optional[str] = None
+
+
+class QuizStatsResponse(BaseModel):
+    """Schema for a page of per-quiz statistics"""
+    total: int
+    skip: int
+    limit: int
+    items: List[QuizItemStats]
+
+
+class PointsMismatch(BaseModel):
+    """Schema for a student whose points differ from the points ledger"""
+    user_id: int
+    username: str
+    points: int
+    ledger_points: int
+    difference: int
+
+
+class PointsReconciliationResponse(BaseModel):
+    """Schema for the reconciliation of users.points against the points ledger"""
+    mismatches: List[PointsMismatch]
+    repaired: bool
@@ -0,0 +1,27 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class LeaderboardEntry(BaseModel):
+    """Schema for a single leaderboard row"""
+    rank: int
+    user_id: int
+    username: str
+    points: int
+
+
+class LeaderboardResponse(BaseModel):
+    """Schema for a leaderboard page"""
+    scope: str
+    total: int
+    entries: List[LeaderboardEntry]
+    my_rank: Optional[int] = None
+    my_points: Optional[int] = None
+
+
+class MyRankResponse(BaseModel):
+    """Schema for the current student's positions"""
+    points: int
+    global_rank: Optional[int] = None
+    global_total: int
+    parent_ranks: List[dict] = []
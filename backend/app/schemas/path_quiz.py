@@ -0,0 +1,51 @@
+from typing import Optional, List
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class PathQuizCreate(BaseModel):
+    """Schema for copying a quiz into a path"""
+    path_id: int
+    original_quiz_id: int
+    order: int = 0
+
+
+class PathQuizResponse(BaseModel):
+    """Schema for a quiz of a path"""
+    id: int
+    path_id: Optional[int] = None
+    original_quiz_id: Optional[int] = None
+    question: str
+    options: List[str]
+    correct_answer: str
+    explanation: Optional[str] = None
+    points: int = 0
+    order: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class PathQuizAttemptCreate(BaseModel):
+    """Schema for answering a quiz of a path"""
+    path_quiz_id: int
+    answer: str
+    show_explanation: bool = False
+
+
+class PathQuizAttemptResponse(BaseModel):
+    """Schema for the result of an attempt at a quiz of a path"""
+    id: int
+    path_quiz_id: int
+    user_id: int
+    answer: str
+    correct: bool
+    points_earned: int
+    completed: bool
+    created_at: datetime
+    updated_at: datetime
+    user_points: Optional[int] = None
+    explanation: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -2,6 +2,8 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from pydantic import BaseModel
 
+from app.schemas.admin import StudentProgressSummary
+
 
 class RewardBase(BaseModel):
     """Base schema for reward data"""
@@ -144,3 +146,9 @@ class StudentProgressResponse(BaseModel):
     recent_quiz_attempts: List[RecentQuizAttempt]
     recent_challenge_attempts: List[RecentUserChallenge]
     recent_redemptions: List[RecentRedemption]
+
+
+class ChildrenProgressResponse(BaseModel):
+    """Schema for the progress summary of all of a parent's children"""
+    children: List[StudentProgressSummary]
+    total_children: int
@@ -106,3 +106,29 @@ class CompletedQuizIdResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class RecommendedQuiz(QuizDetailResponse):
+    """Schema for a recommended quiz with the estimated chance of answering it correctly"""
+    predicted_success: float
+
+
+class QuizRecommendationsResponse(BaseModel):
+    """Schema for quiz recommendations response"""
+    quizzes: List[RecommendedQuiz]
+
+
+class QuizSearchResult(BaseModel):
+    """Schema for a quiz search hit, with matches highlighted in the snippet"""
+    id: int
+    question: str
+    difficulty_level_id: Optional[int] = None
+    points: Optional[int] = None
+    snippet: str
+    rank: float
+
+
+class QuizSearchResponse(BaseModel):
+    """Schema for quiz search response"""
+    results: List[QuizSearchResult]
+    total: int
@@ -73,3 +73,21 @@ class ChangePoints(BaseModel):
     """Schema for changing a student's points"""
     student_id: int
     points: int  # Can be positive or negative
+
+
+class PointsLedgerEntry(BaseModel):
+    """Schema for one change to a student's points"""
+    id: int
+    delta: int
+    balance: int
+    reason: str
+    reference_id: Optional[int] = None
+    created_at: datetime
+
+
+class PointsHistoryResponse(BaseModel):
+    """Schema for a page of a student's points history, newest first"""
+    user_id: int
+    balance: int
+    entries: List[PointsLedgerEntry]
+    next_before_id: Optional[int] = None  # Pass as before_id to get the next page
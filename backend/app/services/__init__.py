@@ -0,0 +1 @@
+# Servizi applicativi condivisi tra i router (cache, motori di calcolo, ecc.)
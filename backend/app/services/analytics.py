@@ -0,0 +1,366 @@
+"""
+Andamento dell'attività nel tempo (analytics per l'amministratore).
+
+I tentativi dei quiz e gli acquisti dei premi vengono materializzati in
+aggregati giornalieri (tabella daily_activity) più l'elenco degli studenti
+attivi per giorno (daily_active_students), da cui si ricavano gli studenti
+distinti per settimana. L'aggiornamento è incrementale: per ogni tabella di
+origine un watermark ricorda l'ultimo id già sommato, e `refresh` elabora solo
+le righe successive, a blocchi di ANALYTICS_BATCH_SIZE id, con un GROUP BY
+(giorno, studente). L'avanzamento del watermark è un UPDATE condizionale nella
+stessa transazione degli aggregati: se due worker aggiornano insieme, solo uno
+somma il blocco. Le righe più recenti di ANALYTICS_LAG_SECONDS vengono lasciate
+al giro successivo, così una transazione con id più basso ancora aperta non
+viene saltata.
+
+Dentro le richieste (`ensure_fresh`) l'aggiornamento è limitato: al più
+ANALYTICS_REQUEST_MAX_BATCHES blocchi per tabella, in una sola richiesta per
+volta nel worker; le altre leggono gli aggregati come sono. Un arretrato più
+grande viene smaltito dalle richieste successive, oppure tutto insieme da
+`refresh` senza limite (migrations/add_daily_analytics.py).
+
+Le serie per intervallo leggono solo gli aggregati e restituiscono un bucket
+per ogni giorno o settimana (lunedì), con zero dove non c'è attività. Le medie
+mobili sono calcolate con pandas sulla serie già riempita.
+
+I punti guadagnati sono quelli delle risposte corrette (il bonus dei percorsi
+non è incluso); i giorni sono quelli di created_at nel fuso del database.
+Gli aggregati sono storici: l'eliminazione di tentativi o utenti non li
+modifica, `rebuild` li ricalcola da zero.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.upsert import insert_for
+from app.models.analytics import analytics_watermarks, daily_active_students, daily_activity
+from app.models.challenge import QuizAttempt
+from app.models.reward import RewardPurchase
+
+DAY = "day"
+WEEK = "week"
+
+SERIES_FIELDS = (
+    "attempts", "correct_answers", "accuracy", "active_students",
+    "points_earned", "points_spent", "purchases",
+)
+
+_ATTEMPTS = "quiz_attempts"
+_PURCHASES = "reward_purchases"
+
+UPSERT_CHUNK = 1000
+
+
+def chunked(items: Sequence, size: int = UPSERT_CHUNK) -> Iterator[Sequence]:
+    """Blocchi di righe per INSERT multipli entro il limite di parametri di SQLite."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _as_date(value) -> date:
+    # SQLite restituisce date(...) come stringa
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _rate(part: int, total: int) -> float:
+    return round(part / total * 100, 2) if total else 0
+
+
+# Materializzazione
+
+def claim_batch(db: Session, source: str, model) -> Optional[tuple]:
+    """
+    Riserva il prossimo blocco di id (lo, hi] di una tabella di origine
+    avanzando il watermark; None se non ci sono righe nuove o se un'altra
+    transazione ha già avanzato il watermark.
+    """
+    db.execute(
+        insert_for(db, analytics_watermarks)
+        .values(source=source, last_id=0)
+        .on_conflict_do_nothing(index_elements=[analytics_watermarks.c.source])
+    )
+    lo = db.execute(
+        select(analytics_watermarks.c.last_id).where(analytics_watermarks.c.source == source)
+    ).scalar()
+
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.ANALYTICS_LAG_SECONDS)
+    newest = db.execute(
+        select(func.max(model.id)).where(model.id > lo, model.created_at <= cutoff)
+    ).scalar()
+    if newest is None:
+        return None
+    hi = min(newest, lo + settings.ANALYTICS_BATCH_SIZE)
+
+    claimed = db.execute(
+        update(analytics_watermarks)
+        .where(analytics_watermarks.c.source == source, analytics_watermarks.c.last_id == lo)
+        .values(last_id=hi)
+    ).rowcount
+    return (lo, hi) if claimed else None
+
+
+def _upsert_days(db: Session, totals: Dict[date, Dict[str, int]]) -> None:
+    if not totals:
+        return
+    columns = next(iter(totals.values())).keys()
+    stmt = insert_for(db, daily_activity).values([
+        {"day": day, **values} for day, values in totals.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[daily_activity.c.day],
+        set_={column: daily_activity.c[column] + stmt.excluded[column] for column in columns},
+    ))
+
+
+def _fold_attempts(db: Session) -> bool:
+    batch = claim_batch(db, _ATTEMPTS, QuizAttempt)
+    if batch is None:
+        return False
+    lo, hi = batch
+    day = func.date(QuizAttempt.created_at)
+    rows = db.execute(
+        select(
+            day,
+            QuizAttempt.user_id,
+            func.count(QuizAttempt.id),
+            func.coalesce(func.sum(case((QuizAttempt.correct == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((QuizAttempt.correct == True, QuizAttempt.points_earned), else_=0)), 0),
+        )
+        .where(QuizAttempt.id > lo, QuizAttempt.id <= hi)
+        .group_by(day, QuizAttempt.user_id)
+    ).all()
+
+    totals: Dict[date, Dict[str, int]] = {}
+    students = []
+    for raw_day, user_id, attempts, correct, points in rows:
+        day_totals = totals.setdefault(
+            _as_date(raw_day), {"attempts": 0, "correct_answers": 0, "points_earned": 0}
+        )
+        day_totals["attempts"] += attempts
+        day_totals["correct_answers"] += correct
+        day_totals["points_earned"] += points or 0
+        students.append({"day": _as_date(raw_day), "user_id": user_id, "attempts": attempts})
+
+    _upsert_days(db, totals)
+    for chunk in chunked(students):
+        stmt = insert_for(db, daily_active_students).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[daily_active_students.c.day, daily_active_students.c.user_id],
+            set_={"attempts": daily_active_students.c.attempts + stmt.excluded.attempts},
+        ))
+    return True
+
+
+def _fold_purchases(db: Session) -> bool:
+    batch = claim_batch(db, _PURCHASES, RewardPurchase)
+    if batch is None:
+        return False
+    lo, hi = batch
+    day = func.date(RewardPurchase.created_at)
+    rows = db.execute(
+        select(day, func.count(RewardPurchase.id), func.coalesce(func.sum(RewardPurchase.point_cost), 0))
+        .where(RewardPurchase.id > lo, RewardPurchase.id <= hi)
+        .group_by(day)
+    ).all()
+    _upsert_days(db, {
+        _as_date(raw_day): {"purchases": purchases, "points_spent": spent}
+        for raw_day, purchases, spent in rows
+    })
+    return True
+
+
+class IncrementalRefresh:
+    """
+    Aggiornamento incrementale di un worker: esegue le funzioni `folds` (una
+    per tabella di origine, ognuna somma un blocco e restituisce False quando
+    non ci sono righe nuove), una sola volta per volta nel processo.
+    """
+
+    def __init__(self, folds: Sequence[Callable[[Session], bool]]):
+        self.folds = tuple(folds)
+        self._lock = threading.Lock()
+        self._refreshed_at: Optional[float] = None
+
+    def refresh(self, db: Session, max_batches: Optional[int] = None) -> int:
+        """
+        Al più `max_batches` blocchi per ogni fold (tutti se None). Ogni blocco
+        è una transazione a sé; restituisce il numero di blocchi elaborati.
+        """
+        with self._lock:
+            return self._refresh(db, max_batches)
+
+    def _refresh(self, db: Session, max_batches: Optional[int]) -> int:
+        processed, drained = 0, True
+        for fold in self.folds:
+            batches = 0
+            while True:
+                if max_batches is not None and batches >= max_batches:
+                    drained = False
+                    break
+                try:
+                    folded = fold(db)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                if not folded:
+                    break
+                batches += 1
+            processed += batches
+        # Con un arretrato ancora da smaltire la richiesta successiva continua
+        if drained:
+            self._refreshed_at = time.monotonic()
+        return processed
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Aggiorna, entro ANALYTICS_REQUEST_MAX_BATCHES blocchi per fold, se
+        l'ultimo aggiornamento completo è più vecchio di ANALYTICS_REFRESH_SECONDS.
+        Se un'altra richiesta sta già aggiornando, restituisce subito.
+        """
+        if not self._due():
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._due():
+                self._refresh(db, settings.ANALYTICS_REQUEST_MAX_BATCHES)
+        finally:
+            self._lock.release()
+
+    def _due(self) -> bool:
+        refreshed_at = self._refreshed_at
+        return refreshed_at is None or time.monotonic() - refreshed_at >= settings.ANALYTICS_REFRESH_SECONDS
+
+
+_refresher = IncrementalRefresh((_fold_attempts, _fold_purchases))
+
+
+def refresh(db: Session, max_batches: Optional[int] = None) -> int:
+    """
+    Somma agli aggregati le righe nuove di tentativi e acquisti, al più
+    `max_batches` blocchi per tabella; restituisce il numero di blocchi elaborati.
+    """
+    return _refresher.refresh(db, max_batches)
+
+
+def ensure_fresh(db: Session) -> None:
+    """Aggiornamento limitato degli aggregati prima di una lettura (vedi IncrementalRefresh.ensure_fresh)."""
+    _refresher.ensure_fresh(db)
+
+
+def rebuild(db: Session) -> int:
+    """Cancella gli aggregati e i watermark e li ricalcola da tutto lo storico."""
+    db.execute(delete(daily_activity))
+    db.execute(delete(daily_active_students))
+    db.execute(delete(analytics_watermarks).where(analytics_watermarks.c.source.in_([_ATTEMPTS, _PURCHASES])))
+    db.commit()
+    return refresh(db)
+
+
+# Serie per intervallo
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _week_expr(db: Session, column):
+    """Lunedì della settimana di una colonna DATE, nel dialetto della sessione."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.date_trunc("week", column))
+    return func.date(column, "weekday 0", "-6 days")
+
+
+def _periods(start: date, end: date, bucket: str) -> List[date]:
+    step = timedelta(days=7 if bucket == WEEK else 1)
+    period = week_start(start) if bucket == WEEK else start
+    periods = []
+    while period <= end:
+        periods.append(period)
+        period += step
+    return periods
+
+
+def activity_series(db: Session, start: date, end: date, bucket: str = DAY) -> List[Dict[str, Any]]:
+    """
+    Un bucket per giorno o per settimana tra start ed end (inclusi), con zero
+    dove non c'è attività. Due query sugli aggregati: totali e studenti attivi.
+    """
+    if bucket == WEEK:
+        # Le settimane al bordo vengono contate per intero
+        start, end = week_start(start), week_start(end) + timedelta(days=6)
+    periods = _periods(start, end, bucket)
+    series = {
+        period: {"period": period, **{field: 0 for field in SERIES_FIELDS}}
+        for period in periods
+    }
+
+    day_period = _week_expr(db, daily_activity.c.day) if bucket == WEEK else daily_activity.c.day
+    totals = db.execute(
+        select(
+            day_period,
+            func.sum(daily_activity.c.attempts),
+            func.sum(daily_activity.c.correct_answers),
+            func.sum(daily_activity.c.points_earned),
+            func.sum(daily_activity.c.purchases),
+            func.sum(daily_activity.c.points_spent),
+        )
+        .where(daily_activity.c.day >= start, daily_activity.c.day <= end)
+        .group_by(day_period)
+    )
+    for period, attempts, correct, earned, purchases, spent in totals:
+        bucket_row = series.get(_as_date(period))
+        if bucket_row is None:
+            continue
+        bucket_row.update(
+            attempts=attempts or 0,
+            correct_answers=correct or 0,
+            points_earned=earned or 0,
+            purchases=purchases or 0,
+            points_spent=spent or 0,
+        )
+
+    student_period = (
+        _week_expr(db, daily_active_students.c.day) if bucket == WEEK else daily_active_students.c.day
+    )
+    active = db.execute(
+        select(student_period, func.count(func.distinct(daily_active_students.c.user_id)))
+        .where(daily_active_students.c.day >= start, daily_active_students.c.day <= end)
+        .group_by(student_period)
+    )
+    for period, students in active:
+        bucket_row = series.get(_as_date(period))
+        if bucket_row is not None:
+            bucket_row["active_students"] = students
+
+    for bucket_row in series.values():
+        bucket_row["accuracy"] = _rate(bucket_row["correct_answers"], bucket_row["attempts"])
+    return [series[period] for period in periods]
+
+
+def with_moving_averages(series: List[Dict[str, Any]], window: int,
+                         fields: Sequence[str] = SERIES_FIELDS) -> List[Dict[str, Any]]:
+    """
+    Aggiunge a ogni bucket `moving_averages`, la media mobile degli ultimi
+    `window` bucket per ogni campo (sui primi bucket la media è sui disponibili).
+    """
+    if not series or window <= 1:
+        return series
+    import pandas as pd  # importato solo qui: pesa sull'avvio dell'applicazione
+
+    frame = pd.DataFrame.from_records(series, columns=list(fields))
+    rolling = frame.rolling(window, min_periods=1)
+    averages = rolling.mean()
+    if "accuracy" in averages:
+        # Accuratezza della finestra, non media delle percentuali dei singoli bucket
+        sums = rolling.sum()
+        averages["accuracy"] = (sums["correct_answers"] / sums["attempts"] * 100).fillna(0)
+    averages = averages.round(2)
+    for bucket_row, row in zip(series, averages.to_dict("records")):
+        bucket_row["moving_averages"] = row
+    return series
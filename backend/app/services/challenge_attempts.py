@@ -0,0 +1,178 @@
+"""
+Tentativi di sfida degli studenti.
+
+Ogni tentativo (UserChallenge) tiene dei contatori aggiornati a ogni risposta
+con un UPDATE atomico: quiz risposti, risposte corrette e punti. Il completamento
+controlla solo i contatori (tempo costante), senza rileggere i tentativi dei
+quiz né l'elenco dei quiz del percorso. Un vincolo univoco su
+(challenge_attempt_id, quiz_id) garantisce che ogni quiz conti una sola volta
+anche con richieste concorrenti, e un indice univoco parziale su
+(user_id, challenge_id) dei tentativi non completati che ogni studente abbia
+un solo tentativo in corso per sfida.
+"""
+from datetime import datetime
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.challenge import Challenge, QuizAttempt, UserChallenge
+from app.models.quiz import Path, quiz_path_association
+from app.services import ledger
+from app.services.leaderboard import record_challenge_points
+
+
+class ChallengeAttemptError(Exception):
+    """Operazione sul tentativo rifiutata; status_code e detail vanno al client"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _open_attempt(db: Session, student_id: int, challenge_id: int):
+    return db.query(UserChallenge).filter(
+        UserChallenge.user_id == student_id,
+        UserChallenge.challenge_id == challenge_id,
+        UserChallenge.completed == False
+    ).first()
+
+
+def start_attempt(db: Session, student_id: int, challenge: Challenge) -> UserChallenge:
+    """
+    Restituisce il tentativo in corso dello studente o ne crea uno nuovo,
+    fissando il numero di quiz del percorso. Se due richieste concorrenti
+    creano il tentativo insieme, l'indice univoco ne lascia passare una e
+    l'altra restituisce il tentativo appena creato.
+    """
+    existing_attempt = _open_attempt(db, student_id, challenge.id)
+    if existing_attempt:
+        return existing_attempt
+
+    total_quizzes = db.execute(
+        select(func.count()).select_from(quiz_path_association).where(
+            quiz_path_association.c.path_id == challenge.path_id
+        )
+    ).scalar()
+    if not total_quizzes:
+        # Un tentativo senza quiz sarebbe completato (con il bonus) subito
+        raise ChallengeAttemptError(400, "Challenge path has no quizzes")
+
+    db_attempt = UserChallenge(
+        user_id=student_id,
+        challenge_id=challenge.id,
+        completed=False,
+        points_earned=0,
+        start_time=datetime.utcnow(),
+        total_quizzes=total_quizzes,
+    )
+    db.add(db_attempt)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing_attempt = _open_attempt(db, student_id, challenge.id)
+        if existing_attempt is None:
+            raise
+        return existing_attempt
+    db.refresh(db_attempt)
+    return db_attempt
+
+
+def record_quiz_attempt(db: Session, quiz_attempt: QuizAttempt, student_id: int,
+                        challenge_attempt_id: int) -> None:
+    """
+    Collega una risposta a un tentativo di sfida e ne aggiorna i contatori.
+    Non esegue il commit: la risposta e i contatori vengono salvati insieme.
+    """
+    row = db.execute(
+        select(UserChallenge.user_id, UserChallenge.completed, Challenge.path_id)
+        .join(Challenge, Challenge.id == UserChallenge.challenge_id)
+        .where(UserChallenge.id == challenge_attempt_id)
+    ).first()
+    if row is None:
+        raise ChallengeAttemptError(404, "Challenge attempt not found")
+    if row.user_id != student_id:
+        raise ChallengeAttemptError(403, "Not enough permissions")
+    if row.completed:
+        raise ChallengeAttemptError(400, "Challenge attempt is already completed")
+
+    in_path = db.execute(select(exists().where(
+        quiz_path_association.c.path_id == row.path_id,
+        quiz_path_association.c.quiz_id == quiz_attempt.quiz_id,
+    ))).scalar()
+    if not in_path:
+        raise ChallengeAttemptError(400, "Quiz is not part of this challenge")
+
+    quiz_attempt.challenge_attempt_id = challenge_attempt_id
+    try:
+        db.flush()
+    except IntegrityError:
+        raise ChallengeAttemptError(400, "Quiz already answered in this challenge attempt")
+
+    # Per le risposte sbagliate points_earned è il punteggio ridotto per il
+    # prossimo tentativo, non punti accreditati: contano solo quelle corrette
+    earned = (quiz_attempt.points_earned or 0) if quiz_attempt.correct else 0
+    updated = db.execute(
+        update(UserChallenge)
+        .where(UserChallenge.id == challenge_attempt_id, UserChallenge.completed == False)
+        .values(
+            attempted_quizzes=UserChallenge.attempted_quizzes + 1,
+            correct_answers=UserChallenge.correct_answers + (1 if quiz_attempt.correct else 0),
+            quiz_points=UserChallenge.quiz_points + earned,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        # Completato da un'altra richiesta nel frattempo
+        raise ChallengeAttemptError(400, "Challenge attempt is already completed")
+
+
+def complete_attempt(db: Session, attempt: UserChallenge) -> UserChallenge:
+    """
+    Chiude il tentativo se tutti i quiz sono stati risposti.
+    I punti dei quiz sono già stati accreditati a ogni risposta corretta, quindi
+    al saldo dello studente si aggiunge solo il bonus del percorso; points_earned
+    del tentativo registra il totale (quiz + bonus) per la classifica della sfida.
+    """
+    if attempt.completed:
+        raise ChallengeAttemptError(400, "Challenge attempt is already completed")
+    if attempt.total_quizzes <= 0:
+        # Tentativi creati prima del controllo sui percorsi vuoti
+        raise ChallengeAttemptError(400, "Challenge path has no quizzes")
+    if attempt.attempted_quizzes < attempt.total_quizzes:
+        raise ChallengeAttemptError(400, "Not all quizzes in the challenge have been attempted")
+
+    all_correct = attempt.correct_answers >= attempt.total_quizzes
+    bonus_points = 0
+    if all_correct:
+        bonus_points = db.execute(
+            select(Path.bonus_points)
+            .join(Challenge, Challenge.path_id == Path.id)
+            .where(Challenge.id == attempt.challenge_id)
+        ).scalar() or 0
+
+    # Chiusura condizionale: una sola richiesta concorrente può completarlo
+    closed = db.execute(
+        update(UserChallenge)
+        .where(UserChallenge.id == attempt.id, UserChallenge.completed == False)
+        .values(
+            completed=True,
+            completed_time=datetime.utcnow(),
+            points_earned=UserChallenge.quiz_points + bonus_points,
+        )
+        .returning(UserChallenge.points_earned)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if closed is None:
+        db.rollback()
+        raise ChallengeAttemptError(400, "Challenge attempt is already completed")
+    record_challenge_points(db, attempt.challenge_id, attempt.user_id, closed)
+
+    if bonus_points:
+        ledger.add_points(db, attempt.user_id, bonus_points, ledger.CHALLENGE_BONUS, attempt.id)
+
+    db.commit()
+    db.refresh(attempt)
+    return attempt
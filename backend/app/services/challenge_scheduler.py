@@ -0,0 +1,295 @@
+"""
+Scheduler delle sfide attive.
+
+Tiene in memoria la finestra temporale (start_date, end_date) di ogni sfida,
+raggruppata per creatore, e l'insieme delle sfide attive per creatore già
+calcolato. Un heap di eventi ordinati per orario attiva e fa scadere le sfide:
+un thread in background li elabora allo scoccare dell'orario e avvisa i
+sottoscrittori con un ChallengeEvent ("activated" / "expired"). Le letture
+elaborano comunque gli eventi già scaduti, quindi il risultato è corretto
+anche se il thread non è in esecuzione.
+
+Gli endpoint di creazione, modifica ed eliminazione aggiornano lo scheduler
+dopo il commit; poiché ogni worker ha il proprio indice, viene comunque
+ricaricato dal database ogni CHALLENGE_SCHEDULE_REFRESH_SECONDS. La ricarica
+avviene in una sola richiesta per volta, mentre le altre leggono l'indice
+precedente; gli aggiornamenti arrivati durante la lettura dal database vengono
+riapplicati sul nuovo indice, così nessuno va perso.
+Gli orari sono confrontati con datetime.now(), come negli endpoint.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.challenge import Challenge
+from app.schemas.challenge import ChallengeResponse
+
+logger = logging.getLogger(__name__)
+
+ACTIVATED = "activated"
+EXPIRED = "expired"
+
+
+@dataclass(frozen=True)
+class ChallengeEvent:
+    """Attivazione o scadenza di una sfida"""
+    kind: str
+    challenge_id: int
+    creator_id: int
+    at: datetime
+
+
+@dataclass
+class _Window:
+    challenge: ChallengeResponse
+    version: int
+    is_live: bool = False
+
+    @property
+    def creator_id(self) -> int:
+        return self.challenge.creator_id
+
+
+class ChallengeScheduler:
+    """Indice delle finestre delle sfide per creatore, con attivazione a tempo"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        # Una sola ricarica per volta; non è preso da chi legge o aggiorna l'indice
+        self._rebuild_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._windows: Dict[int, _Window] = {}
+        self._active_by_creator: Dict[int, Set[int]] = {}
+        self._events: List[Tuple[datetime, int, str, int, int]] = []  # (orario, seq, tipo, id, versione)
+        self._seq = itertools.count()
+        self._versions = itertools.count(1)
+        self._subscribers: List[Callable[[ChallengeEvent], None]] = []
+        self._loaded_at: Optional[float] = None
+        self._stale_at = 0.0
+        # Aggiornamenti arrivati durante una ricarica, da riapplicare dopo
+        self._journal: Optional[List[Tuple[str, Any]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # Caricamento e aggiornamenti
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def rebuild(self, db: Session) -> None:
+        """Ricarica tutte le sfide dal database."""
+        with self._rebuild_lock:
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> None:
+        with self._lock:
+            self._journal = []
+        try:
+            challenges = [ChallengeResponse.model_validate(challenge) for challenge in db.query(Challenge).all()]
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            self._windows.clear()
+            self._active_by_creator.clear()
+            self._events.clear()
+            for challenge in challenges:
+                self._upsert(challenge, notify=False)
+            # Gli aggiornamenti già notificati non generano nuovi eventi
+            for kind, value in self._journal:
+                if kind == "upsert":
+                    self._upsert(value, notify=False)
+                else:
+                    self._remove(value)
+            self._journal = None
+            self._loaded_at = time.monotonic()
+            self._stale_at = self._loaded_at + self.refresh_seconds * random.uniform(1.0, 1.2)
+            self._wakeup.notify()
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Ricarica l'indice se non è mai stato caricato o se è troppo vecchio.
+        Se un'altra richiesta sta già ricaricando un indice scaduto, restituisce
+        subito e si continua a leggere quello precedente; solo senza indice si
+        attende la fine del caricamento.
+        """
+        if self._loaded_at is None:
+            with self._rebuild_lock:
+                if self._loaded_at is None:
+                    self._rebuild(db)
+            return
+        if time.monotonic() < self._stale_at:
+            return
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() >= self._stale_at:
+                self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def upsert(self, challenge: Challenge) -> None:
+        """Da chiamare dopo il commit di una sfida creata o modificata."""
+        challenge = ChallengeResponse.model_validate(challenge)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("upsert", challenge))
+            events = self._upsert(challenge, notify=True)
+            self._wakeup.notify()
+        self._emit(events)
+
+    def remove(self, challenge_id: int) -> None:
+        """Da chiamare dopo l'eliminazione di una sfida."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("remove", challenge_id))
+            self._remove(challenge_id)
+
+    def _remove(self, challenge_id: int) -> None:
+        window = self._windows.pop(challenge_id, None)
+        if window is not None and window.is_live:
+            self._active_by_creator.get(window.creator_id, set()).discard(challenge_id)
+
+    def _upsert(self, challenge: ChallengeResponse, notify: bool) -> List[ChallengeEvent]:
+        now = datetime.now()
+        previous = self._windows.get(challenge.id)
+        window = _Window(challenge=challenge, version=next(self._versions))
+        self._windows[challenge.id] = window
+
+        if previous is not None and previous.is_live:
+            self._active_by_creator.get(previous.creator_id, set()).discard(challenge.id)
+
+        start, end = window.challenge.start_date, window.challenge.end_date
+        events = []
+        if window.challenge.is_active and (end is None or end >= now):
+            if start is None or start <= now:
+                self._set_live(window, True)
+                if not (previous and previous.is_live):
+                    events.append(ChallengeEvent(ACTIVATED, challenge.id, window.creator_id, now))
+            else:
+                self._schedule(start, ACTIVATED, window)
+            if end is not None:
+                self._schedule(end, EXPIRED, window)
+        elif previous is not None and previous.is_live:
+            events.append(ChallengeEvent(EXPIRED, challenge.id, window.creator_id, now))
+        return events if notify else []
+
+    def _schedule(self, when: datetime, kind: str, window: _Window) -> None:
+        heapq.heappush(self._events, (when, next(self._seq), kind, window.challenge.id, window.version))
+
+    def _set_live(self, window: _Window, live: bool) -> None:
+        window.is_live = live
+        active = self._active_by_creator.setdefault(window.creator_id, set())
+        if live:
+            active.add(window.challenge.id)
+        else:
+            active.discard(window.challenge.id)
+
+    def _advance(self, now: datetime) -> List[ChallengeEvent]:
+        """Applica gli eventi con orario <= now; restituisce quelli da notificare."""
+        fired = []
+        while self._events and self._events[0][0] <= now:
+            when, _, kind, challenge_id, version = heapq.heappop(self._events)
+            window = self._windows.get(challenge_id)
+            if window is None or window.version != version:
+                continue  # sfida modificata o eliminata dopo la programmazione
+            live = kind == ACTIVATED
+            if window.is_live == live:
+                continue
+            if live and window.challenge.end_date is not None and window.challenge.end_date < now:
+                continue  # attivazione e scadenza entrambe passate
+            self._set_live(window, live)
+            fired.append(ChallengeEvent(kind, challenge_id, window.creator_id, when))
+        return fired
+
+    # Letture
+
+    def active_for_creators(self, creator_ids: Optional[Iterable[int]] = None) -> List[ChallengeResponse]:
+        """
+        Sfide attive create dagli utenti indicati (tutte se None),
+        ordinate per data di inizio.
+        """
+        with self._lock:
+            fired = self._advance(datetime.now())
+            if creator_ids is None:
+                ids = set().union(*self._active_by_creator.values()) if self._active_by_creator else set()
+            else:
+                ids = set()
+                for creator_id in creator_ids:
+                    ids |= self._active_by_creator.get(creator_id, set())
+            challenges = [self._windows[challenge_id].challenge for challenge_id in ids]
+        self._emit(fired)
+        challenges.sort(key=lambda c: (c.start_date or datetime.min, c.id))
+        return challenges
+
+    # Eventi
+
+    def subscribe(self, callback: Callable[[ChallengeEvent], None]) -> Callable[[], None]:
+        """Registra una funzione chiamata a ogni attivazione/scadenza; restituisce la funzione per annullare."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _emit(self, events: List[ChallengeEvent]) -> None:
+        if not events:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception("Errore nel sottoscrittore dell'evento %s", event)
+
+    # Thread dei timer
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="challenge-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                timeout = None
+                if self._events:
+                    timeout = max(0.0, (self._events[0][0] - datetime.now()).total_seconds())
+                self._wakeup.wait(timeout)
+                if self._stopping:
+                    return
+                fired = self._advance(datetime.now())
+            self._emit(fired)
+
+
+challenge_scheduler = ChallengeScheduler(refresh_seconds=settings.CHALLENGE_SCHEDULE_REFRESH_SECONDS)
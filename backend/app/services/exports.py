@@ -0,0 +1,317 @@
+"""
+Esportazione dei dati per l'analisi offline (CSV, NDJSON, Parquet).
+
+Le righe sono lette con yield_per, che su PostgreSQL apre un cursore lato
+server: il database restituisce EXPORT_CHUNK_SIZE righe alla volta e ogni
+blocco viene serializzato e inviato prima di leggere il successivo, quindi la
+memoria usata non dipende dalla dimensione della tabella. La sessione è aperta
+dal generatore stesso e chiusa a fine trasmissione (o se il client si
+disconnette), perché la risposta viene inviata dopo l'uscita dall'endpoint.
+
+Il formato Parquet (colonnare, per pandas / Spark / DuckDB) usa pyarrow (in
+requirements.txt), importato solo quando richiesto per non allungare l'avvio
+dei worker: ogni blocco diventa un row group scritto su un file temporaneo,
+poi trasmesso a pezzi. Lo schema di ogni dataset è dichiarato in
+`parquet_schema`, non dedotto dal primo blocco: una colonna tutta nulla
+all'inizio (challenge_attempt_id, full_name, reward_name) resta del suo tipo.
+"""
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Numeric, Select, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.challenge import QuizAttempt, UserChallenge
+from app.models.reward import Reward, RewardPurchase
+from app.models.user import User, UserRole
+
+CSV = "csv"
+NDJSON = "ndjson"
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    CSV: "text/csv",
+    NDJSON: "application/x-ndjson",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+# Dimensione dei pezzi con cui viene trasmesso il file Parquet
+_FILE_CHUNK = 1024 * 1024
+
+
+class ExportError(Exception):
+    """Esportazione non disponibile; status_code e detail vanno al client"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _attempts(date_from: Optional[datetime], date_to: Optional[datetime]) -> Select:
+    stmt = (
+        select(
+            QuizAttempt.id,
+            QuizAttempt.user_id,
+            User.username,
+            QuizAttempt.quiz_id,
+            QuizAttempt.challenge_attempt_id,
+            QuizAttempt.answer,
+            QuizAttempt.correct,
+            QuizAttempt.points_earned,
+            QuizAttempt.created_at,
+        )
+        .join(User, User.id == QuizAttempt.user_id)
+        .order_by(QuizAttempt.id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(QuizAttempt.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(QuizAttempt.created_at <= date_to)
+    return stmt
+
+
+def _purchases(date_from: Optional[datetime], date_to: Optional[datetime]) -> Select:
+    stmt = (
+        select(
+            RewardPurchase.id,
+            RewardPurchase.user_id,
+            User.username,
+            RewardPurchase.reward_id,
+            Reward.name.label("reward_name"),
+            RewardPurchase.point_cost,
+            RewardPurchase.is_delivered,
+            RewardPurchase.created_at,
+        )
+        .join(User, User.id == RewardPurchase.user_id)
+        .outerjoin(Reward, Reward.id == RewardPurchase.reward_id)
+        .order_by(RewardPurchase.id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(RewardPurchase.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(RewardPurchase.created_at <= date_to)
+    return stmt
+
+
+def _progress(date_from: Optional[datetime], date_to: Optional[datetime]) -> Select:
+    """Una riga per studente; l'intervallo di date limita i tentativi, le sfide e gli acquisti contati."""
+    def in_range(column):
+        conditions = []
+        if date_from is not None:
+            conditions.append(column >= date_from)
+        if date_to is not None:
+            conditions.append(column <= date_to)
+        return conditions
+
+    attempts = (
+        select(
+            QuizAttempt.user_id,
+            func.count(QuizAttempt.id).label("total"),
+            func.sum(case((QuizAttempt.correct == True, 1), else_=0)).label("correct"),
+        )
+        .where(*in_range(QuizAttempt.created_at))
+        .group_by(QuizAttempt.user_id)
+        .subquery()
+    )
+    challenges = (
+        select(
+            UserChallenge.user_id,
+            func.count(UserChallenge.id).label("total"),
+            func.sum(case((UserChallenge.completed == True, 1), else_=0)).label("completed"),
+        )
+        .where(*in_range(UserChallenge.created_at))
+        .group_by(UserChallenge.user_id)
+        .subquery()
+    )
+    purchases = (
+        select(RewardPurchase.user_id, func.sum(RewardPurchase.point_cost).label("spent"))
+        .where(*in_range(RewardPurchase.created_at))
+        .group_by(RewardPurchase.user_id)
+        .subquery()
+    )
+
+    total = func.coalesce(attempts.c.total, 0)
+    correct = func.coalesce(attempts.c.correct, 0)
+    return (
+        select(
+            User.id.label("user_id"),
+            User.username,
+            User.full_name,
+            func.coalesce(User.points, 0).label("points"),
+            total.label("total_attempts"),
+            correct.label("correct_answers"),
+            func.round(
+                case((total > 0, cast(correct, Numeric) * 100 / total), else_=0), 2
+            ).label("accuracy"),
+            func.coalesce(challenges.c.total, 0).label("challenges_attempted"),
+            func.coalesce(challenges.c.completed, 0).label("challenges_completed"),
+            func.coalesce(purchases.c.spent, 0).label("points_spent"),
+        )
+        .outerjoin(attempts, attempts.c.user_id == User.id)
+        .outerjoin(challenges, challenges.c.user_id == User.id)
+        .outerjoin(purchases, purchases.c.user_id == User.id)
+        .where(User.role == UserRole.STUDENT)
+        .order_by(User.id)
+    )
+
+
+DATASETS: Dict[str, Callable[[Optional[datetime], Optional[datetime]], Select]] = {
+    "attempts": _attempts,
+    "progress": _progress,
+    "purchases": _purchases,
+}
+
+
+def parquet_schema(dataset: str):
+    """Schema Parquet del dataset, con le colonne nell'ordine della query."""
+    import pyarrow as pa
+
+    timestamp = pa.timestamp("us", tz="UTC")
+    fields = {
+        "attempts": [
+            ("id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("username", pa.string()),
+            ("quiz_id", pa.int64()),
+            ("challenge_attempt_id", pa.int64()),
+            ("answer", pa.string()),
+            ("correct", pa.bool_()),
+            ("points_earned", pa.int64()),
+            ("created_at", timestamp),
+        ],
+        "progress": [
+            ("user_id", pa.int64()),
+            ("username", pa.string()),
+            ("full_name", pa.string()),
+            ("points", pa.int64()),
+            ("total_attempts", pa.int64()),
+            ("correct_answers", pa.int64()),
+            # Percentuale arrotondata a 2 decimali, float come in CSV e NDJSON
+            ("accuracy", pa.float64()),
+            ("challenges_attempted", pa.int64()),
+            ("challenges_completed", pa.int64()),
+            ("points_spent", pa.int64()),
+        ],
+        "purchases": [
+            ("id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("username", pa.string()),
+            ("reward_id", pa.int64()),
+            ("reward_name", pa.string()),
+            ("point_cost", pa.int64()),
+            ("is_delivered", pa.bool_()),
+            ("created_at", timestamp),
+        ],
+    }
+    return pa.schema(fields[dataset])
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _chunks(session_factory: Callable[[], Session], stmt: Select) -> Iterator[Tuple[List[str], list]]:
+    """Blocchi di righe (colonne, righe) letti con un cursore lato server."""
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+        columns = list(result.keys())
+        for rows in result.partitions():
+            yield columns, rows
+    finally:
+        db.close()
+
+
+def _csv(chunks) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = True
+    for columns, rows in chunks:
+        if header:
+            writer.writerow(columns)
+            header = False
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _ndjson(chunks) -> Iterator[str]:
+    for columns, rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def _arrow_value(value):
+    # Decimal (round su PostgreSQL) nelle colonne float64
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _parquet(chunks, dataset: str) -> Iterator[bytes]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError(400, "Parquet export requires pyarrow")
+
+    schema = parquet_schema(dataset)
+    spool = tempfile.TemporaryFile()
+    try:
+        with pq.ParquetWriter(spool, schema) as writer:
+            for columns, rows in chunks:
+                table = pa.Table.from_pylist(
+                    [dict(zip(columns, map(_arrow_value, row))) for row in rows], schema=schema
+                )
+                writer.write_table(table)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+
+    def stream():
+        with spool:
+            while True:
+                data = spool.read(_FILE_CHUNK)
+                if not data:
+                    return
+                yield data
+    return stream()
+
+
+def export(
+    dataset: str,
+    fmt: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> Iterator:
+    """
+    Iteratore dei pezzi da trasmettere per il dataset e il formato indicati.
+    CSV e NDJSON vengono letti mentre la risposta è in trasmissione; il
+    Parquet viene scritto su file temporaneo prima di iniziare a trasmettere,
+    così un errore arriva al client come risposta di errore.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(404, "Export not found")
+    chunks = _chunks(session_factory, DATASETS[dataset](date_from, date_to))
+    if fmt == CSV:
+        return _csv(chunks)
+    if fmt == NDJSON:
+        return _ndjson(chunks)
+    if fmt == PARQUET:
+        return _parquet(chunks, dataset)
+    raise ExportError(400, "Unsupported export format")
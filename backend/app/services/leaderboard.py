@@ -0,0 +1,345 @@
+"""
+Classifiche degli studenti tenute in memoria.
+
+Ogni classifica (scope) è un array ordinato di coppie (-punti, user_id)
+gestito con bisect: posizione e aggiornamento costano O(log n) per la ricerca
+più lo spostamento dell'array, la top-K è una semplice slice. Gli scope sono:
+
+  - GLOBAL: tutti gli studenti, per punti totali;
+  - ("parent", parent_id): i figli di un genitore, per punti totali;
+  - ("challenge", challenge_id): i partecipanti a una sfida, per punti
+    guadagnati nella sfida (vale il tentativo migliore).
+
+L'indice viene ricostruito dal database all'avvio e poi aggiornato a ogni
+commit: un listener sulla sessione raccoglie, a ogni flush, le variazioni di
+punti e ruolo degli utenti, dei legami genitore-studente e dei punti delle
+sfide, e le applica solo se la transazione va a buon fine. Gli UPDATE scritti
+in SQL (es. l'acquisto di un premio) registrano il nuovo saldo con
+`record_points`. Poiché ogni worker ha il proprio indice, le classifiche
+vengono comunque ricaricate ogni LEADERBOARD_REFRESH_SECONDS (più un ritardo
+casuale fino al 20%, così i worker avviati insieme non ricaricano tutti nello
+stesso momento). La ricarica è fatta da una sola richiesta per volta; le
+altre intanto leggono l'indice precedente.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.challenge import UserChallenge
+from app.models.user import User, UserRole, parent_student_association
+
+GLOBAL = ("global",)
+
+# Chiave di session.info con le variazioni in attesa del commit
+_PENDING = "leaderboard_changes"
+
+
+def parent_scope(parent_id: int) -> tuple:
+    return ("parent", parent_id)
+
+
+def challenge_scope(challenge_id: int) -> tuple:
+    return ("challenge", challenge_id)
+
+
+class SortedScores:
+    """Punteggi ordinati in modo decrescente, con rank e top-K"""
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []  # (-punti, user_id)
+        self._scores: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, member: int) -> bool:
+        return member in self._scores
+
+    def score(self, member: int) -> Optional[int]:
+        return self._scores.get(member)
+
+    def set(self, member: int, score: int) -> None:
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, member))]
+        self._scores[member] = score
+        insort(self._keys, (-score, member))
+
+    def discard(self, member: int) -> None:
+        old = self._scores.pop(member, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, member))]
+
+    def rank(self, member: int) -> Optional[int]:
+        """Posizione (1 = primo); a parità di punti la posizione è condivisa."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score,)) + 1
+
+    def top(self, k: int, offset: int = 0) -> List[Tuple[int, int, int]]:
+        """Restituisce fino a k tuple (rank, user_id, punti) a partire da offset."""
+        entries = self._keys[offset:offset + k]
+        if not entries:
+            return []
+        result = []
+        rank = bisect_left(self._keys, (entries[0][0],)) + 1
+        previous = entries[0][0]
+        for position, (neg_score, member) in enumerate(entries, start=offset + 1):
+            if neg_score != previous:
+                rank, previous = position, neg_score
+            result.append((rank, member, -neg_score))
+        return result
+
+
+class LeaderboardIndex:
+    """Insieme delle classifiche per scope, condiviso dal processo"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        # Una sola ricarica per volta; non è preso da chi legge o aggiorna l'indice
+        self._rebuild_lock = threading.Lock()
+        self._boards: Dict[Hashable, SortedScores] = {}
+        self._parents_of: Dict[int, Set[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def rebuild(self, db: Session) -> None:
+        """Ricarica tutte le classifiche dal database (3 query)."""
+        with self._rebuild_lock:
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> None:
+        boards: Dict[Hashable, SortedScores] = {GLOBAL: SortedScores()}
+        parents_of: Dict[int, Set[int]] = {}
+
+        points = dict(db.execute(
+            select(User.id, func.coalesce(User.points, 0)).where(User.role == UserRole.STUDENT)
+        ).all())
+        for user_id, user_points in points.items():
+            boards[GLOBAL].set(user_id, user_points)
+
+        links = db.execute(select(
+            parent_student_association.c.parent_id,
+            parent_student_association.c.student_id,
+        ))
+        for parent_id, student_id in links:
+            if student_id not in points:
+                continue
+            parents_of.setdefault(student_id, set()).add(parent_id)
+            boards.setdefault(parent_scope(parent_id), SortedScores()).set(student_id, points[student_id])
+
+        challenge_points = db.execute(
+            select(
+                UserChallenge.challenge_id,
+                UserChallenge.user_id,
+                func.max(func.coalesce(UserChallenge.points_earned, 0)),
+            ).group_by(UserChallenge.challenge_id, UserChallenge.user_id)
+        )
+        for challenge_id, user_id, best in challenge_points:
+            boards.setdefault(challenge_scope(challenge_id), SortedScores()).set(user_id, best)
+
+        with self._lock:
+            self._boards = boards
+            self._parents_of = parents_of
+            self._loaded_at = time.monotonic()
+            self._stale_at = self._loaded_at + self.refresh_seconds * random.uniform(1.0, 1.2)
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Ricostruisce l'indice se non è mai stato caricato o se è troppo vecchio.
+        Se un'altra richiesta sta già ricaricando un indice scaduto, restituisce
+        subito e si continua a leggere quello precedente; solo senza indice si
+        attende la fine del caricamento.
+        """
+        if self._loaded_at is None:
+            with self._rebuild_lock:
+                if self._loaded_at is None:
+                    self._rebuild(db)
+            return
+        if time.monotonic() < self._stale_at:
+            return
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() >= self._stale_at:
+                self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    # Aggiornamenti
+
+    def set_points(self, user_id: int, points: Optional[int]) -> None:
+        """Aggiorna i punti di uno studente; None lo toglie dalle classifiche."""
+        with self._lock:
+            if points is None:
+                self._boards[GLOBAL].discard(user_id)
+                for parent_id in self._parents_of.pop(user_id, ()):
+                    self._board(parent_scope(parent_id)).discard(user_id)
+                return
+            self._boards[GLOBAL].set(user_id, points)
+            for parent_id in self._parents_of.get(user_id, ()):
+                self._board(parent_scope(parent_id)).set(user_id, points)
+
+    def link(self, parent_id: int, student_id: int) -> None:
+        with self._lock:
+            points = self._boards[GLOBAL].score(student_id)
+            if points is None:
+                return
+            self._parents_of.setdefault(student_id, set()).add(parent_id)
+            self._board(parent_scope(parent_id)).set(student_id, points)
+
+    def unlink(self, parent_id: int, student_id: int) -> None:
+        with self._lock:
+            self._parents_of.get(student_id, set()).discard(parent_id)
+            board = self._boards.get(parent_scope(parent_id))
+            if board is not None:
+                board.discard(student_id)
+
+    def remove_user(self, user_id: int) -> None:
+        """Elimina un utente da tutte le classifiche (e la classifica dei figli, se genitore)."""
+        with self._lock:
+            self.set_points(user_id, None)
+            if self._boards.pop(parent_scope(user_id), None) is not None:
+                for parents in self._parents_of.values():
+                    parents.discard(user_id)
+            for scope, board in self._boards.items():
+                if scope[0] == "challenge":
+                    board.discard(user_id)
+
+    def set_challenge_points(self, challenge_id: int, user_id: int, points: int) -> None:
+        with self._lock:
+            board = self._board(challenge_scope(challenge_id))
+            best = board.score(user_id)
+            if best is None or points > best:
+                board.set(user_id, points)
+
+    def apply(self, changes: List[tuple]) -> None:
+        if not self.loaded:
+            return
+        with self._lock:
+            for change in changes:
+                kind, args = change[0], change[1:]
+                if kind == "points":
+                    self.set_points(*args)
+                elif kind == "link":
+                    self.link(*args)
+                elif kind == "unlink":
+                    self.unlink(*args)
+                elif kind == "delete":
+                    self.remove_user(*args)
+                elif kind == "challenge":
+                    self.set_challenge_points(*args)
+
+    # Letture
+
+    def rank(self, scope: Hashable, user_id: int) -> Optional[int]:
+        with self._lock:
+            board = self._boards.get(scope)
+            return board.rank(user_id) if board is not None else None
+
+    def score(self, scope: Hashable, user_id: int) -> Optional[int]:
+        with self._lock:
+            board = self._boards.get(scope)
+            return board.score(user_id) if board is not None else None
+
+    def top(self, scope: Hashable, k: int, offset: int = 0) -> List[Tuple[int, int, int]]:
+        with self._lock:
+            board = self._boards.get(scope)
+            return board.top(k, offset) if board is not None else []
+
+    def size(self, scope: Hashable) -> int:
+        with self._lock:
+            board = self._boards.get(scope)
+            return len(board) if board is not None else 0
+
+    def _board(self, scope: Hashable) -> SortedScores:
+        board = self._boards.get(scope)
+        if board is None:
+            board = self._boards[scope] = SortedScores()
+        return board
+
+
+leaderboards = LeaderboardIndex(refresh_seconds=settings.LEADERBOARD_REFRESH_SECONDS)
+
+
+def record_points(db: Session, user_id: int, points: int) -> None:
+    """
+    Registra il nuovo saldo di uno studente modificato con un UPDATE SQL
+    (non visibile al listener ORM). Viene applicato al commit della sessione.
+    """
+    db.info.setdefault(_PENDING, []).append(("points", user_id, points))
+
+
+def record_challenge_points(db: Session, challenge_id: int, user_id: int, points: int) -> None:
+    """Come record_points, per i punti di un tentativo di sfida."""
+    db.info.setdefault(_PENDING, []).append(("challenge", challenge_id, user_id, points))
+
+
+def _student_points(user: User) -> Optional[int]:
+    return (user.points or 0) if user.role == UserRole.STUDENT else None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault(_PENDING, [])
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            changes.append(("points", obj.id, _student_points(obj)))
+        elif isinstance(obj, UserChallenge):
+            changes.append(("challenge", obj.challenge_id, obj.user_id, obj.points_earned or 0))
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if attrs.points.history.has_changes() or attrs.role.history.has_changes():
+                changes.append(("points", obj.id, _student_points(obj)))
+        elif isinstance(obj, UserChallenge):
+            if inspect(obj).attrs.points_earned.history.has_changes():
+                changes.append(("challenge", obj.challenge_id, obj.user_id, obj.points_earned or 0))
+
+    # Legami genitore-studente modificati tramite le relazioni di User
+    for obj in session.new | session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        students = attrs.students.history
+        for student in students.added or ():
+            changes.append(("link", obj.id, student.id))
+        for student in students.deleted or ():
+            changes.append(("unlink", obj.id, student.id))
+        for relation in (attrs.parents.history, attrs.children.history):
+            for parent in relation.added or ():
+                changes.append(("link", parent.id, obj.id))
+            for parent in relation.deleted or ():
+                changes.append(("unlink", parent.id, obj.id))
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changes.append(("delete", obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop(_PENDING, None)
+    if changes:
+        leaderboards.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
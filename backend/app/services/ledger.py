@@ -0,0 +1,161 @@
+"""
+Registro dei punti degli studenti (tabella points_ledger).
+
+Ogni variazione di users.points passa da qui. Il saldo viene aggiornato con
+un UPDATE atomico (`points = points + delta ... RETURNING points`) e nella
+stessa transazione si aggiunge al registro una riga con variazione, saldo
+risultante, motivo e id dell'oggetto che l'ha causata. Rispetto al
+`current_user.points += ...` fatto sull'oggetto ORM:
+  - nessun aggiornamento perso: le richieste concorrenti dello stesso
+    studente (risposte, bonus, acquisti) non si sovrascrivono a vicenda, il
+    database applica gli incrementi uno dopo l'altro;
+  - il lock sulla riga dell'utente è preso dall'UPDATE subito prima del
+    commit, invece di dipendere da una lettura fatta all'inizio della
+    richiesta;
+  - i prelievi possono essere condizionali (`min_balance`): un acquisto non
+    porta mai il saldo sotto zero.
+
+Il saldo resta in users.points: leggerlo costa una lettura per chiave
+primaria. Lo storico si legge dal registro con paginazione per id
+(indice user_id, id). `reconcile` confronta users.points con la somma del
+registro per ogni studente e, se richiesto, registra la differenza come
+rettifica: serve dopo gli script che modificano users.points direttamente e
+per il saldo iniziale (migrations/add_points_ledger.py).
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from app.models.points import points_ledger
+from app.models.user import User, UserRole
+from app.services.leaderboard import record_points
+
+# Motivi delle variazioni
+QUIZ = "quiz"
+PATH_QUIZ = "path_quiz"
+PATH_BONUS = "path_bonus"
+CHALLENGE_BONUS = "challenge_bonus"
+PURCHASE = "purchase"
+REDEMPTION = "redemption"
+MANUAL = "manual"  # Modifica di un genitore o dell'amministratore
+ROLE_CHANGE = "role_change"
+ADJUSTMENT = "adjustment"
+OPENING_BALANCE = "opening_balance"
+
+_balance = func.coalesce(User.points, 0)
+
+
+def _record(db: Session, user_id: int, delta: int, points: int, reason: str, reference_id: Optional[int]) -> None:
+    if delta:
+        db.execute(insert(points_ledger).values(
+            user_id=user_id, delta=delta, balance=points, reason=reason, reference_id=reference_id,
+        ))
+    # Allinea l'oggetto User già caricato nella sessione senza segnarlo come modificato
+    user = db.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        set_committed_value(user, "points", points)
+    record_points(db, user_id, points)
+
+
+def add_points(
+    db: Session,
+    user_id: int,
+    delta: int,
+    reason: str,
+    reference_id: Optional[int] = None,
+    min_balance: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Aggiunge `delta` punti (anche negativi) al saldo e registra la variazione;
+    restituisce il nuovo saldo. Con `min_balance` il saldo viene modificato
+    solo se non scende sotto quel valore, altrimenti restituisce None senza
+    modificare nulla. Il commit è a carico del chiamante.
+    """
+    stmt = update(User).where(User.id == user_id)
+    if min_balance is not None:
+        stmt = stmt.where(_balance + delta >= min_balance)
+    points = db.execute(
+        stmt.values(points=_balance + delta)
+        .returning(User.points)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if points is None:
+        return None
+    _record(db, user_id, delta, points, reason, reference_id)
+    return points
+
+
+def set_points(db: Session, user_id: int, points: int, reason: str, reference_id: Optional[int] = None) -> Optional[int]:
+    """
+    Imposta il saldo a `points` registrando la differenza; restituisce None se
+    l'utente non esiste. Legge il saldo con SELECT ... FOR UPDATE: è pensata
+    per le modifiche manuali, non per i percorsi frequenti.
+    """
+    row = db.execute(select(_balance).where(User.id == user_id).with_for_update()).first()
+    if row is None:
+        return None
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(points=points)
+        .execution_options(synchronize_session=False)
+    )
+    _record(db, user_id, points - row[0], points, reason, reference_id)
+    return points
+
+
+def get_balance(db: Session, user_id: int) -> Optional[int]:
+    """Saldo corrente (users.points), None se l'utente non esiste."""
+    row = db.execute(select(_balance).where(User.id == user_id)).first()
+    return row[0] if row is not None else None
+
+
+def history(db: Session, user_id: int, limit: int = 50, before_id: Optional[int] = None) -> List[Dict]:
+    """Variazioni dello studente dalla più recente; `before_id` per la pagina successiva."""
+    stmt = select(points_ledger).where(points_ledger.c.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(points_ledger.c.id < before_id)
+    return [dict(row) for row in db.execute(stmt.order_by(points_ledger.c.id.desc()).limit(limit)).mappings()]
+
+
+def _mismatches():
+    totals = (
+        select(points_ledger.c.user_id, func.sum(points_ledger.c.delta).label("total"))
+        .group_by(points_ledger.c.user_id)
+        .subquery()
+    )
+    ledger_total = func.coalesce(totals.c.total, 0)
+    return (
+        select(
+            User.id.label("user_id"),
+            User.username,
+            _balance.label("points"),
+            ledger_total.label("ledger_points"),
+            (_balance - ledger_total).label("difference"),
+        )
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .where(User.role == UserRole.STUDENT, _balance != ledger_total)
+    )
+
+
+def reconcile(db: Session, repair: bool = False, reason: str = ADJUSTMENT) -> List[Dict]:
+    """
+    Studenti il cui saldo non coincide con la somma del registro. Con
+    `repair` registra per ognuno la differenza come variazione `reason`, con
+    un solo INSERT ... SELECT: saldo e registro sono letti nello stesso
+    snapshot, quindi gli incrementi concorrenti non falsano la rettifica.
+    """
+    mismatches = [dict(row) for row in db.execute(_mismatches().order_by(User.id)).mappings()]
+    if repair and mismatches:
+        query = _mismatches().subquery()
+        db.execute(
+            insert(points_ledger).from_select(
+                ["user_id", "delta", "balance", "reason"],
+                select(query.c.user_id, query.c.difference, query.c.points, literal(reason)),
+            )
+        )
+        db.commit()
+    return mismatches
@@ -0,0 +1,158 @@
+"""
+Snapshot immutabili del contenuto dei percorsi.
+
+Gli studenti che giocano un percorso richiamano di continuo
+`GET /path-quizzes/path/{id}` e `GET /path-quizzes/{id}`. I PathQuiz di un
+percorso cambiano raramente, quindi vengono serializzati una sola volta in uno
+snapshot versionato e tenuto in memoria (LRU). Lo snapshot contiene anche
+l'insieme degli studenti assegnati, così il controllo dei permessi diventa un
+semplice lookup in un frozenset.
+
+Ogni modifica al percorso (quiz, assegnazioni, eliminazione) deve chiamare
+`invalidate_path` dopo il commit. La cache è locale al processo e
+l'invalidazione raggiunge solo il worker che ha servito la modifica: negli
+altri worker lo snapshot resta valido al massimo PATH_SNAPSHOT_TTL_SECONDS,
+poi viene ricostruito dal database.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import KeyVersions
+from app.core.config import settings
+from app.models.quiz import Path, PathQuiz
+from app.models.challenge import UserProgress
+from app.schemas.path_quiz import PathQuizResponse
+
+
+@dataclass(frozen=True)
+class PathSnapshot:
+    """Contenuto serializzato di un percorso in una specifica versione"""
+    path_id: int
+    version: int
+    creator_id: int
+    bonus_points: int
+    student_ids: FrozenSet[int]
+    quizzes: Tuple[Any, ...]  # PathQuizResponse già validati
+    quizzes_by_id: Dict[int, Any] = field(compare=False)
+    loaded_at: float = field(default_factory=time.monotonic, compare=False)
+
+    def is_assigned_to(self, user_id: int) -> bool:
+        return user_id in self.student_ids
+
+
+class PathSnapshotCache:
+    """Cache LRU thread-safe degli snapshot dei percorsi"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, PathSnapshot]" = OrderedDict()
+        self._versions = KeyVersions(maxsize)
+        # Indice path_quiz_id -> path_id per risolvere GET /path-quizzes/{id}
+        self._path_quiz_index: Dict[int, int] = {}
+
+    def get(self, db: Session, path_id: int) -> Optional[PathSnapshot]:
+        """Restituisce lo snapshot del percorso, costruendolo se necessario."""
+        with self._lock:
+            snapshot = self._snapshots.get(path_id)
+            if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+                self._snapshots.move_to_end(path_id)
+                return snapshot
+            version = self._versions.get(path_id)
+
+        snapshot = self._build(db, path_id, version)
+        if snapshot is None:
+            return None
+
+        with self._lock:
+            # Se il percorso è stato invalidato durante la costruzione,
+            # lo snapshot è già vecchio: lo restituiamo senza metterlo in cache
+            if self._versions.get(path_id) != version:
+                return snapshot
+            # Un eventuale snapshot scaduto viene sostituito: i suoi PathQuiz escono dall'indice
+            expired = self._snapshots.pop(path_id, None)
+            if expired is not None:
+                for path_quiz_id in expired.quizzes_by_id:
+                    self._path_quiz_index.pop(path_quiz_id, None)
+            self._snapshots[path_id] = snapshot
+            for path_quiz_id in snapshot.quizzes_by_id:
+                self._path_quiz_index[path_quiz_id] = path_id
+            while len(self._snapshots) > self.maxsize:
+                evicted_id, evicted = self._snapshots.popitem(last=False)
+                self._versions.forget(evicted_id)
+                for path_quiz_id in evicted.quizzes_by_id:
+                    self._path_quiz_index.pop(path_quiz_id, None)
+        return snapshot
+
+    def get_for_path_quiz(self, db: Session, path_quiz_id: int) -> Optional[PathSnapshot]:
+        """Restituisce lo snapshot del percorso che contiene il PathQuiz indicato."""
+        with self._lock:
+            path_id = self._path_quiz_index.get(path_quiz_id)
+
+        if path_id is None:
+            row = db.query(PathQuiz.path_id).filter(PathQuiz.id == path_quiz_id).first()
+            if not row:
+                return None
+            path_id = row[0]
+
+        snapshot = self.get(db, path_id)
+        if snapshot is None or path_quiz_id not in snapshot.quizzes_by_id:
+            return None
+        return snapshot
+
+    def invalidate_path(self, path_id: int) -> None:
+        """Scarta lo snapshot del percorso e ne incrementa la versione."""
+        with self._lock:
+            self._versions.bump(path_id)
+            snapshot = self._snapshots.pop(path_id, None)
+            if snapshot is not None:
+                for path_quiz_id in snapshot.quizzes_by_id:
+                    self._path_quiz_index.pop(path_quiz_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+            self._path_quiz_index.clear()
+            self._versions.bump_all()
+
+    def _build(self, db: Session, path_id: int, version: int) -> Optional[PathSnapshot]:
+        path_row = db.query(Path.creator_id, Path.bonus_points).filter(Path.id == path_id).first()
+        if not path_row:
+            return None
+
+        path_quizzes = db.query(PathQuiz).filter(
+            PathQuiz.path_id == path_id
+        ).order_by(PathQuiz.order).all()
+        quizzes = tuple(PathQuizResponse.model_validate(pq) for pq in path_quizzes)
+
+        student_ids = frozenset(
+            user_id for (user_id,) in db.query(UserProgress.user_id).filter(
+                UserProgress.path_id == path_id
+            )
+        )
+
+        return PathSnapshot(
+            path_id=path_id,
+            version=version,
+            creator_id=path_row.creator_id,
+            bonus_points=path_row.bonus_points or 0,
+            student_ids=student_ids,
+            quizzes=quizzes,
+            quizzes_by_id={quiz.id: quiz for quiz in quizzes},
+        )
+
+
+path_snapshots = PathSnapshotCache(
+    maxsize=settings.PATH_SNAPSHOT_CACHE_SIZE, ttl=settings.PATH_SNAPSHOT_TTL_SECONDS
+)
+
+
+def invalidate_path(path_id: int) -> None:
+    """Hook da chiamare dopo ogni commit che modifica un percorso."""
+    path_snapshots.invalidate_path(path_id)
@@ -0,0 +1,313 @@
+"""
+Report dei progressi degli studenti calcolati in SQL.
+
+Le statistiche vengono da aggregati (COUNT / SUM(CASE ...)) e le attività
+recenti da subquery ORDER BY created_at DESC LIMIT 5, così il costo non cresce
+con lo storico dello studente: nessuna riga di tentativo viene caricata in
+Python per contare o ordinare. I riepiloghi di più studenti (figli di un
+genitore) usano un'unica query GROUP BY user_id sull'insieme degli id.
+Lo storico dei tentativi è paginato a cursore, con la domanda troncata in SQL.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Row, and_, case, func, literal, or_, select, true, union_all
+from sqlalchemy.orm import Session
+
+from app.models.challenge import QuizAttempt, UserChallenge
+from app.models.quiz import Quiz
+from app.models.reward import RewardPurchase
+from app.models.user import User, parent_student_association
+
+RECENT_LIMIT = 5
+
+
+def _rate(part: int, total: int) -> float:
+    return round(part / total * 100, 2) if total else 0
+
+
+def student_report(db: Session, student: User) -> Dict[str, Any]:
+    """Report completo di uno studente in due query (aggregati + attività recenti)."""
+    student_id = student.id
+
+    # Ogni tabella viene letta una volta; le tre subquery restituiscono una riga
+    # ciascuna e sono unite esplicitamente (JOIN ... ON true)
+    quiz_agg = select(
+        func.count(QuizAttempt.id).label("total"),
+        func.coalesce(func.sum(case((QuizAttempt.correct == True, 1), else_=0)), 0).label("correct"),
+    ).where(QuizAttempt.user_id == student_id).subquery()
+    challenge_agg = select(
+        func.count(UserChallenge.id).label("total"),
+        func.coalesce(func.sum(case((UserChallenge.completed == True, 1), else_=0)), 0).label("completed"),
+    ).where(UserChallenge.user_id == student_id).subquery()
+    purchase_agg = select(
+        func.coalesce(func.sum(RewardPurchase.point_cost), 0).label("spent"),
+    ).where(RewardPurchase.user_id == student_id).subquery()
+
+    totals = db.execute(select(
+        quiz_agg.c.total, quiz_agg.c.correct,
+        challenge_agg.c.total, challenge_agg.c.completed,
+        purchase_agg.c.spent,
+    ).select_from(
+        quiz_agg.join(challenge_agg, true()).join(purchase_agg, true())
+    )).one()
+    quiz_total, quiz_correct, challenge_total, challenge_completed, points_spent = totals
+
+    # Le tre liste recenti in un'unica UNION ALL di subquery con LIMIT
+    recent_quizzes = (
+        select(
+            literal("quiz").label("kind"),
+            QuizAttempt.id,
+            QuizAttempt.quiz_id.label("ref_id"),
+            QuizAttempt.correct.label("flag"),
+            QuizAttempt.points_earned.label("points"),
+            QuizAttempt.created_at,
+        )
+        .where(QuizAttempt.user_id == student_id)
+        .order_by(QuizAttempt.created_at.desc(), QuizAttempt.id.desc())
+        .limit(RECENT_LIMIT)
+    )
+    recent_challenges = (
+        select(
+            literal("challenge"),
+            UserChallenge.id,
+            UserChallenge.challenge_id,
+            UserChallenge.completed,
+            UserChallenge.points_earned,
+            UserChallenge.created_at,
+        )
+        .where(UserChallenge.user_id == student_id)
+        .order_by(UserChallenge.created_at.desc(), UserChallenge.id.desc())
+        .limit(RECENT_LIMIT)
+    )
+    recent_purchases = (
+        select(
+            literal("purchase"),
+            RewardPurchase.id,
+            RewardPurchase.reward_id,
+            RewardPurchase.is_delivered,
+            RewardPurchase.point_cost,
+            RewardPurchase.created_at,
+        )
+        .where(RewardPurchase.user_id == student_id)
+        .order_by(RewardPurchase.created_at.desc(), RewardPurchase.id.desc())
+        .limit(RECENT_LIMIT)
+    )
+    recent = union_all(
+        recent_quizzes.subquery().select(),
+        recent_challenges.subquery().select(),
+        recent_purchases.subquery().select(),
+    )
+
+    recent_quiz_attempts, recent_challenge_attempts, recent_redemptions = [], [], []
+    for kind, row_id, ref_id, flag, points, created_at in db.execute(recent):
+        if kind == "quiz":
+            recent_quiz_attempts.append({
+                "id": row_id,
+                "quiz_id": ref_id,
+                "is_correct": bool(flag),
+                "points_earned": points or 0,
+                "created_at": created_at,
+            })
+        elif kind == "challenge":
+            recent_challenge_attempts.append({
+                "id": row_id,
+                "challenge_id": ref_id,
+                "is_completed": bool(flag),
+                "points_earned": points or 0,
+                "created_at": created_at,
+            })
+        else:
+            recent_redemptions.append({
+                "id": row_id,
+                "reward_id": ref_id,
+                "points_spent": points or 0,
+                "status": "delivered" if flag else "pending",
+                "created_at": created_at,
+            })
+
+    # UNION ALL non garantisce l'ordine: ogni lista è al massimo di RECENT_LIMIT elementi
+    for items in (recent_quiz_attempts, recent_challenge_attempts, recent_redemptions):
+        items.sort(key=lambda item: (item["created_at"], item["id"]), reverse=True)
+
+    balance = student.points or 0
+    return {
+        "student": {
+            "id": student.id,
+            "username": student.username,
+            "full_name": student.full_name,
+            "points": balance,
+        },
+        "quiz_stats": {
+            "total_attempted": quiz_total,
+            "correct_answers": quiz_correct,
+            "success_rate": _rate(quiz_correct, quiz_total),
+        },
+        "challenge_stats": {
+            "total_attempted": challenge_total,
+            "completed": challenge_completed,
+            "completion_rate": _rate(challenge_completed, challenge_total),
+        },
+        "points_stats": {
+            "total_earned": balance + points_spent,
+            "total_spent": points_spent,
+            "current_balance": balance,
+        },
+        "recent_quiz_attempts": recent_quiz_attempts,
+        "recent_challenge_attempts": recent_challenge_attempts,
+        "recent_redemptions": recent_redemptions,
+    }
+
+
+def attempt_stats(db: Session, student_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """
+    Tentativi totali e risposte corrette per ogni studente, con una sola
+    query GROUP BY user_id. Gli studenti senza tentativi non compaiono.
+    """
+    student_ids = list(student_ids)
+    if not student_ids:
+        return {}
+    rows = db.execute(
+        select(
+            QuizAttempt.user_id,
+            func.count(QuizAttempt.id),
+            func.coalesce(func.sum(case((QuizAttempt.correct == True, 1), else_=0)), 0),
+        )
+        .where(QuizAttempt.user_id.in_(student_ids))
+        .group_by(QuizAttempt.user_id)
+    )
+    return {user_id: (total, correct) for user_id, total, correct in rows}
+
+
+def linked_users(db: Session, user_id: int, children: bool) -> List[Row]:
+    """
+    Figli (children=True) o genitori di un utente, letti con un join sulla
+    tabella di associazione invece che dalle relazioni lazy.
+    """
+    own, other = (
+        (parent_student_association.c.parent_id, parent_student_association.c.student_id)
+        if children else
+        (parent_student_association.c.student_id, parent_student_association.c.parent_id)
+    )
+    return db.execute(
+        select(User.id, User.username, User.email, User.points)
+        .join(parent_student_association, other == User.id)
+        .where(own == user_id)
+        .order_by(User.id)
+    ).all()
+
+
+def summarize(student, stats: Dict[int, Tuple[int, int]]) -> Dict[str, Any]:
+    """Riepilogo (punti, tentativi, accuratezza) di uno studente."""
+    total, correct = stats.get(student.id, (0, 0))
+    return {
+        "id": student.id,
+        "username": student.username,
+        "points": student.points or 0,
+        "total_attempts": total,
+        "correct_answers": correct,
+        "accuracy": _rate(correct, total),
+    }
+
+
+def children_progress(db: Session, parent_id: int) -> List[Dict[str, Any]]:
+    """Riepilogo di tutti i figli di un genitore in due query."""
+    children = linked_users(db, parent_id, children=True)
+    stats = attempt_stats(db, [child.id for child in children])
+    return [summarize(child, stats) for child in children]
+
+
+def encode_cursor(created_at: datetime, attempt_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{attempt_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Solleva ValueError se il cursore non è valido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, attempt_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(attempt_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+def attempt_history(
+    db: Session,
+    student_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    question_chars: int = 120,
+) -> Dict[str, Any]:
+    """
+    Pagina dello storico dei tentativi, dal più recente, con paginazione a
+    cursore su (created_at, id) e il testo della domanda troncato in SQL.
+    I totali sono calcolati con un aggregato sullo stesso intervallo di date.
+    """
+    filters = [QuizAttempt.user_id == student_id]
+    if date_from is not None:
+        filters.append(QuizAttempt.created_at >= date_from)
+    if date_to is not None:
+        filters.append(QuizAttempt.created_at <= date_to)
+
+    total_attempts, correct_answers, total_points = db.execute(
+        select(
+            func.count(QuizAttempt.id),
+            func.coalesce(func.sum(case((QuizAttempt.correct == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(QuizAttempt.points_earned), 0),
+        ).where(*filters)
+    ).one()
+
+    page_filters = list(filters)
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        page_filters.append(or_(
+            QuizAttempt.created_at < cursor_created_at,
+            and_(QuizAttempt.created_at == cursor_created_at, QuizAttempt.id < cursor_id),
+        ))
+
+    question = func.substr(Quiz.question, 1, question_chars)
+    rows = db.execute(
+        select(
+            QuizAttempt.id,
+            QuizAttempt.quiz_id,
+            question.label("question"),
+            (func.length(Quiz.question) > question_chars).label("truncated"),
+            QuizAttempt.answer,
+            QuizAttempt.correct,
+            QuizAttempt.points_earned,
+            QuizAttempt.created_at,
+        )
+        .outerjoin(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .where(*page_filters)
+        .order_by(QuizAttempt.created_at.desc(), QuizAttempt.id.desc())
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    attempts = [
+        {
+            "id": row.id,
+            "quiz_id": row.quiz_id,
+            "quiz_title": (row.question + "…" if row.truncated else row.question) if row.question else "Unknown Quiz",
+            "answer": row.answer,
+            "correct": row.correct,
+            "points_earned": row.points_earned,
+            "created_at": row.created_at.isoformat(),
+        }
+        for row in rows
+    ]
+
+    return {
+        "attempts": attempts,
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "has_more": has_more,
+        "total_attempts": total_attempts,
+        "correct_answers": correct_answers,
+        "total_points": total_points,
+    }
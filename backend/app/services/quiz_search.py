@@ -0,0 +1,346 @@
+"""
+Ricerca testuale dei quiz (domanda e spiegazione).
+
+Su PostgreSQL la colonna quizzes.search_vector (tsvector con i dizionari
+'italian' e 'simple', pesi A/B per domanda e spiegazione) è mantenuta da un
+trigger e indicizzata con GIN (migrations/add_quiz_search_vector.py): la
+ricerca è una query con websearch_to_tsquery, ordinata con ts_rank_cd, e lo
+snippet evidenziato viene da ts_headline.
+
+Lo snippet è HTML: il testo dei quiz viene sempre passato da html.escape e
+solo i tag <mark> aggiunti qui restano markup. ts_headline evidenzia con due
+caratteri segnaposto (tolti prima dal testo), sostituiti con <mark> dopo
+l'escape.
+
+Su SQLite (test e sviluppo locale), o se la colonna non esiste ancora, si usa
+un indice invertito in memoria con ranking BM25: parole normalizzate (minuscole,
+senza accenti, senza parole vuote) più una radice italiana approssimata. Viene
+costruito alla prima ricerca, aggiornato dopo ogni commit che crea, modifica o
+elimina quiz e ricaricato ogni QUIZ_SEARCH_REFRESH_SECONDS.
+"""
+import html
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, inspect, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.quiz import Quiz, quiz_category_association
+
+logger = logging.getLogger(__name__)
+
+MARK_START = "<mark>"
+MARK_END = "</mark>"
+# Segnaposto usati da ts_headline (caratteri Unicode a uso privato)
+_SEL_START = "\ue000"
+_SEL_END = "\ue001"
+
+# Chiave di session.info con i quiz modificati in attesa del commit
+_PENDING = "quiz_search_changes"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+    a ad al alla alle allo agli ai anche che chi ci con come cosa da dal dalla dalle dei del della delle
+    dello di e ed gli ha hanno ho i il in la le lo ma mi ne nei nel nella nelle non o per piu quale
+    quali quando questo questa se si sono su sul sulla tra tu un una uno vi
+""".split())
+
+# Desinenze rimosse per ottenere una radice approssimata (dalla più lunga)
+_SUFFIXES = (
+    "azioni", "azione", "amente", "mente", "issimi", "issimo", "issima", "issime",
+    "ando", "endo", "are", "ere", "ire", "ato", "ata", "ati", "ate", "uto", "uta", "ito", "ita",
+    "a", "e", "i", "o",
+)
+
+
+def normalize(word: str) -> str:
+    """Minuscolo e senza accenti."""
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(token: str) -> str:
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """Termini indicizzati di un testo."""
+    result = []
+    for word in _WORD.findall(text or ""):
+        token = normalize(word)
+        if token in STOPWORDS:
+            continue
+        result.append(stem(token))
+    return result
+
+
+def highlight(text: str, query_terms: Set[str], max_words: int = 30) -> str:
+    """Frammento del testo intorno alla prima parola trovata, con le parole della ricerca evidenziate."""
+    words = list(_WORD.finditer(text))
+    if not words:
+        return html.escape(text, quote=False)
+    hits = [i for i, match in enumerate(words) if stem(normalize(match.group())) in query_terms]
+    first = max(0, hits[0] - max_words // 3) if hits else 0
+    hits = set(hits)
+    window = words[first:first + max_words]
+    start, end = window[0].start(), window[-1].end()
+    parts, cursor = [], start
+    for i, match in enumerate(window, start=first):
+        if i in hits:
+            parts.append(html.escape(text[cursor:match.start()], quote=False))
+            parts.append(f"{MARK_START}{html.escape(match.group(), quote=False)}{MARK_END}")
+            cursor = match.end()
+    parts.append(html.escape(text[cursor:end], quote=False))
+    snippet = "".join(parts)
+    if first > 0:
+        snippet = "…" + snippet
+    if first + max_words < len(words):
+        snippet += "…"
+    return snippet
+
+
+def mark_headline(headline: str) -> str:
+    """Escape HTML di uno snippet di ts_headline e segnaposto sostituiti con <mark>."""
+    escaped = html.escape(headline or "", quote=False)
+    return escaped.replace(_SEL_START, MARK_START).replace(_SEL_END, MARK_END)
+
+
+class InvertedIndex:
+    """Indice invertito termine -> {quiz_id: frequenza}, con ranking BM25"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._texts: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._total_length = 0
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def rebuild(self, db: Session) -> None:
+        rows = db.execute(select(Quiz.id, Quiz.question, Quiz.explanation)).all()
+        with self._lock:
+            self._postings, self._lengths, self._texts, self._total_length = {}, {}, {}, 0
+            for quiz_id, question, explanation in rows:
+                self._add(quiz_id, question, explanation)
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.refresh_seconds:
+            self.rebuild(db)
+
+    def upsert(self, quiz_id: int, question: str, explanation: Optional[str]) -> None:
+        with self._lock:
+            self._remove(quiz_id)
+            self._add(quiz_id, question, explanation)
+
+    def remove(self, quiz_id: int) -> None:
+        with self._lock:
+            self._remove(quiz_id)
+
+    def _add(self, quiz_id: int, question: str, explanation: Optional[str]) -> None:
+        counts = Counter(terms(question) + terms(explanation))
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[quiz_id] = count
+        length = sum(counts.values())
+        self._lengths[quiz_id] = length
+        self._total_length += length
+        self._texts[quiz_id] = (question, explanation)
+
+    def _remove(self, quiz_id: int) -> None:
+        question, explanation = self._texts.pop(quiz_id, (None, None))
+        if question is None and explanation is None:
+            return
+        for term in set(terms(question) + terms(explanation)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(quiz_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(quiz_id, 0)
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """Quiz che contengono tutti i termini della ricerca, ordinati per punteggio BM25."""
+        query_terms = set(terms(query))
+        if not query_terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in query_terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            matches = set(postings[0]).intersection(*postings[1:])
+            n = len(self._lengths)
+            average = self._total_length / n if n else 0
+            scores = []
+            for quiz_id in matches:
+                length_norm = self.K1 * (1 - self.B + self.B * self._lengths[quiz_id] / (average or 1))
+                score = 0.0
+                for term_postings in postings:
+                    tf = term_postings[quiz_id]
+                    idf = math.log(1 + (n - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                    score += idf * tf * (self.K1 + 1) / (tf + length_norm)
+                scores.append((quiz_id, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores
+
+    def text(self, quiz_id: int) -> Tuple[str, Optional[str]]:
+        with self._lock:
+            return self._texts.get(quiz_id, ("", None))
+
+
+search_index = InvertedIndex(refresh_seconds=settings.QUIZ_SEARCH_REFRESH_SECONDS)
+
+_has_vector: Dict[str, bool] = {}
+
+
+def uses_tsvector(db: Session) -> bool:
+    """True su PostgreSQL con la colonna search_vector (verificato una volta per database)."""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    key = str(bind.url)
+    if key not in _has_vector:
+        columns = {column["name"] for column in inspect(bind).get_columns("quizzes")}
+        _has_vector[key] = "search_vector" in columns
+        if not _has_vector[key]:
+            logger.warning("quizzes.search_vector mancante: eseguire migrations/add_quiz_search_vector.py; "
+                           "uso l'indice in memoria")
+    return _has_vector[key]
+
+
+def _filters(category_id: Optional[int], difficulty_level_id: Optional[int]) -> list:
+    filters = []
+    if category_id is not None:
+        filters.append(Quiz.id.in_(
+            select(quiz_category_association.c.quiz_id).where(quiz_category_association.c.category_id == category_id)
+        ))
+    if difficulty_level_id is not None:
+        filters.append(Quiz.difficulty_level_id == difficulty_level_id)
+    return filters
+
+
+def _search_tsvector(db: Session, query: str, skip: int, limit: int, filters: list) -> Dict[str, Any]:
+    vector = literal_column("quizzes.search_vector")
+    tsquery = func.websearch_to_tsquery("italian", query).op("||")(func.websearch_to_tsquery("simple", query))
+    conditions = [vector.op("@@")(tsquery), *filters]
+
+    total = db.execute(select(func.count()).select_from(Quiz).where(*conditions)).scalar()
+    rank = func.ts_rank_cd(vector, tsquery).label("rank")
+    # Segnaposto tolti dal testo: nello snippet indicano solo le parole evidenziate
+    document = func.translate(func.concat_ws(" — ", Quiz.question, Quiz.explanation), _SEL_START + _SEL_END, "")
+    snippet = func.ts_headline(
+        "italian", document, tsquery,
+        f'StartSel="{_SEL_START}", StopSel="{_SEL_END}", MaxWords=30, MinWords=10, MaxFragments=1',
+    ).label("snippet")
+    rows = db.execute(
+        select(Quiz.id, Quiz.question, Quiz.difficulty_level_id, Quiz.points, snippet, rank)
+        .where(*conditions)
+        .order_by(rank.desc(), Quiz.id)
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+    return {
+        "total": total,
+        "results": [{**row, "snippet": mark_headline(row["snippet"])} for row in rows],
+    }
+
+
+def _search_index(db: Session, query: str, skip: int, limit: int, filters: list) -> Dict[str, Any]:
+    search_index.ensure_fresh(db)
+    ranked = search_index.search(query)
+    if filters and ranked:
+        allowed = set(db.execute(
+            select(Quiz.id).where(Quiz.id.in_([quiz_id for quiz_id, _ in ranked]), *filters)
+        ).scalars())
+        ranked = [(quiz_id, score) for quiz_id, score in ranked if quiz_id in allowed]
+
+    page = ranked[skip:skip + limit]
+    details = {
+        row.id: row for row in db.execute(
+            select(Quiz.id, Quiz.difficulty_level_id, Quiz.points).where(Quiz.id.in_([quiz_id for quiz_id, _ in page]))
+        )
+    } if page else {}
+    query_terms = set(terms(query))
+    results = []
+    for quiz_id, score in page:
+        if quiz_id not in details:
+            continue
+        question, explanation = search_index.text(quiz_id)
+        document = question if not explanation else f"{question} — {explanation}"
+        results.append({
+            "id": quiz_id,
+            "question": question,
+            "difficulty_level_id": details[quiz_id].difficulty_level_id,
+            "points": details[quiz_id].points,
+            "snippet": highlight(document, query_terms),
+            "rank": round(score, 4),
+        })
+    return {"total": len(ranked), "results": results}
+
+
+def search(
+    db: Session,
+    query: str,
+    skip: int = 0,
+    limit: int = 20,
+    category_id: Optional[int] = None,
+    difficulty_level_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Quiz che corrispondono alla ricerca, dal più rilevante, con lo snippet evidenziato."""
+    filters = _filters(category_id, difficulty_level_id)
+    if uses_tsvector(db):
+        return _search_tsvector(db, query, skip, limit, filters)
+    return _search_index(db, query, skip, limit, filters)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    if not search_index.loaded:
+        return
+    changes = session.info.setdefault(_PENDING, [])
+    for obj in session.new:
+        if isinstance(obj, Quiz):
+            changes.append((obj.id, obj.question, obj.explanation))
+    for obj in session.dirty:
+        if isinstance(obj, Quiz):
+            attrs = inspect(obj).attrs
+            if attrs.question.history.has_changes() or attrs.explanation.history.has_changes():
+                changes.append((obj.id, obj.question, obj.explanation))
+    for obj in session.deleted:
+        if isinstance(obj, Quiz):
+            changes.append((obj.id, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop(_PENDING, None)
+    for quiz_id, question, explanation in changes or ():
+        if question is None:
+            search_index.remove(quiz_id)
+        else:
+            search_index.upsert(quiz_id, question, explanation)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,217 @@
+"""
+Statistiche per quiz (item analysis): difficoltà e distribuzione delle risposte.
+
+Per ogni quiz la tabella quiz_item_stats tiene tentativi, risposte corrette,
+p-value (quota di risposte corrette: vicino a 1 il quiz è facile, vicino a 0
+difficile), studenti che lo hanno provato e completato, numero medio di
+tentativi fino alla prima risposta corretta e l'istogramma delle risposte date,
+da cui si vedono le opzioni sbagliate che attirano più studenti (distrattori).
+
+Il job è incrementale come gli aggregati giornalieri (app.services.analytics):
+un watermark su quiz_attempts ricorda l'ultimo tentativo elaborato e ogni
+blocco legge solo i tentativi nuovi, in ordine di id. Il numero di tentativi
+di ogni studente su ogni quiz è tenuto in quiz_student_progress, così la prima
+risposta corretta è riconosciuta anche se arriva in un blocco successivo.
+Dentro le richieste l'aggiornamento è limitato e in una sola richiesta per
+volta, come per gli aggregati (IncrementalRefresh).
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.upsert import insert_for
+from app.models.analytics import analytics_watermarks, quiz_item_stats, quiz_student_progress
+from app.models.challenge import QuizAttempt
+from app.models.quiz import Quiz
+from app.services.analytics import IncrementalRefresh, chunked, claim_batch
+
+_SOURCE = "quiz_item_stats"
+
+SORT_COLUMNS = {
+    "p_value": quiz_item_stats.c.p_value,
+    "attempts": quiz_item_stats.c.attempts,
+    "students": quiz_item_stats.c.students,
+    "mean_attempts_to_completion": quiz_item_stats.c.mean_attempts_to_completion,
+    "quiz_id": quiz_item_stats.c.quiz_id,
+}
+
+_STAT_FIELDS = ("attempts", "correct_attempts", "students", "students_completed", "attempts_to_completion")
+
+def _empty_stats() -> Dict[str, Any]:
+    return {**{field: 0 for field in _STAT_FIELDS}, "answer_counts": {}}
+
+
+def _fold_batch(db: Session) -> bool:
+    batch = claim_batch(db, _SOURCE, QuizAttempt)
+    if batch is None:
+        return False
+    lo, hi = batch
+    attempts = db.execute(
+        select(QuizAttempt.quiz_id, QuizAttempt.user_id, QuizAttempt.answer, QuizAttempt.correct)
+        .where(QuizAttempt.id > lo, QuizAttempt.id <= hi)
+        .order_by(QuizAttempt.id)
+    ).all()
+    if not attempts:
+        return True
+
+    pairs = {(quiz_id, user_id) for quiz_id, user_id, _, _ in attempts}
+    quiz_ids = {quiz_id for quiz_id, _ in pairs}
+
+    # Stato precedente di ogni coppia (quiz, studente) e dei quiz toccati dal blocco
+    progress: Dict[Tuple[int, int], List[Optional[int]]] = {}
+    for chunk in chunked(sorted(pairs)):
+        for quiz_id, user_id, count, completed_at in db.execute(
+            select(quiz_student_progress).where(
+                tuple_(quiz_student_progress.c.quiz_id, quiz_student_progress.c.user_id).in_(chunk)
+            )
+        ):
+            progress[(quiz_id, user_id)] = [count, completed_at]
+    stats: Dict[int, Dict[str, Any]] = {}
+    for chunk in chunked(sorted(quiz_ids)):
+        for row in db.execute(select(quiz_item_stats).where(quiz_item_stats.c.quiz_id.in_(chunk))).mappings():
+            stats[row["quiz_id"]] = {
+                **{field: row[field] for field in _STAT_FIELDS},
+                "answer_counts": dict(row["answer_counts"] or {}),
+            }
+
+    for quiz_id, user_id, answer, correct in attempts:
+        quiz = stats.setdefault(quiz_id, _empty_stats())
+        quiz["attempts"] += 1
+        quiz["answer_counts"][answer] = quiz["answer_counts"].get(answer, 0) + 1
+
+        pair = progress.get((quiz_id, user_id))
+        if pair is None:
+            pair = progress[(quiz_id, user_id)] = [0, None]
+            quiz["students"] += 1
+        pair[0] += 1
+        if correct:
+            quiz["correct_attempts"] += 1
+            if pair[1] is None:
+                pair[1] = pair[0]
+                quiz["students_completed"] += 1
+                quiz["attempts_to_completion"] += pair[0]
+
+    progress_rows = [
+        {"quiz_id": quiz_id, "user_id": user_id, "attempts": count, "completed_at_attempt": completed_at}
+        for (quiz_id, user_id), (count, completed_at) in progress.items()
+    ]
+    for chunk in chunked(progress_rows):
+        stmt = insert_for(db, quiz_student_progress).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[quiz_student_progress.c.quiz_id, quiz_student_progress.c.user_id],
+            set_={"attempts": stmt.excluded.attempts, "completed_at_attempt": stmt.excluded.completed_at_attempt},
+        ))
+
+    rows = []
+    for quiz_id, quiz in stats.items():
+        rows.append({
+            "quiz_id": quiz_id,
+            **quiz,
+            "p_value": round(quiz["correct_attempts"] / quiz["attempts"], 4) if quiz["attempts"] else 0,
+            "mean_attempts_to_completion": (
+                round(quiz["attempts_to_completion"] / quiz["students_completed"], 2)
+                if quiz["students_completed"] else None
+            ),
+        })
+    for chunk in chunked(rows):
+        stmt = insert_for(db, quiz_item_stats).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[quiz_item_stats.c.quiz_id],
+            set_={column: stmt.excluded[column] for column in chunk[0] if column != "quiz_id"},
+        ))
+    return True
+
+
+_refresher = IncrementalRefresh((_fold_batch,))
+
+
+def refresh(db: Session, max_batches: Optional[int] = None) -> int:
+    """
+    Elabora i tentativi registrati dopo l'ultimo aggiornamento, al più
+    `max_batches` blocchi; restituisce il numero di blocchi elaborati.
+    """
+    return _refresher.refresh(db, max_batches)
+
+
+def ensure_fresh(db: Session) -> None:
+    """Aggiornamento limitato delle statistiche prima di una lettura (vedi IncrementalRefresh.ensure_fresh)."""
+    _refresher.ensure_fresh(db)
+
+
+def rebuild(db: Session) -> int:
+    """Cancella le statistiche e le ricalcola da tutti i tentativi."""
+    db.execute(delete(quiz_item_stats))
+    db.execute(delete(quiz_student_progress))
+    db.execute(delete(analytics_watermarks).where(analytics_watermarks.c.source == _SOURCE))
+    db.commit()
+    return refresh(db)
+
+
+def _answer_stats(options, correct_answer: str, counts: Dict[str, int], total: int) -> List[Dict[str, Any]]:
+    """Istogramma delle risposte: prima le opzioni del quiz (anche mai scelte), poi le altre risposte date."""
+    answers = list(options or [])
+    answers += sorted(answer for answer in counts if answer not in answers)
+    return [
+        {
+            "answer": answer,
+            "count": counts.get(answer, 0),
+            "share": round(counts.get(answer, 0) / total, 4) if total else 0,
+            "is_correct": answer == correct_answer,
+        }
+        for answer in answers
+    ]
+
+
+def list_stats(
+    db: Session,
+    sort: str = "p_value",
+    descending: bool = False,
+    skip: int = 0,
+    limit: int = 50,
+    min_attempts: int = 0,
+    question_chars: int = 120,
+) -> Dict[str, Any]:
+    """Pagina delle statistiche per quiz ordinata per la colonna indicata (vedi SORT_COLUMNS)."""
+    column = SORT_COLUMNS[sort]
+    filters = [quiz_item_stats.c.attempts >= min_attempts]
+
+    total = db.execute(
+        select(func.count())
+        .select_from(quiz_item_stats.join(Quiz, Quiz.id == quiz_item_stats.c.quiz_id))
+        .where(*filters)
+    ).scalar()
+
+    order = column.desc() if descending else column.asc()
+    rows = db.execute(
+        select(
+            quiz_item_stats,
+            func.substr(Quiz.question, 1, question_chars).label("question"),
+            Quiz.options,
+            Quiz.correct_answer,
+        )
+        .join(Quiz, Quiz.id == quiz_item_stats.c.quiz_id)
+        .where(*filters)
+        # I NULL (nessuno studente ha completato) vanno in fondo in entrambi i dialetti
+        .order_by(column.is_(None), order, quiz_item_stats.c.quiz_id)
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+
+    items = []
+    for row in rows:
+        answers = _answer_stats(row["options"], row["correct_answer"], row["answer_counts"] or {}, row["attempts"])
+        distractors = [answer for answer in answers if not answer["is_correct"] and answer["count"]]
+        items.append({
+            "quiz_id": row["quiz_id"],
+            "question": row["question"],
+            "attempts": row["attempts"],
+            "correct_attempts": row["correct_attempts"],
+            "p_value": row["p_value"],
+            "students": row["students"],
+            "students_completed": row["students_completed"],
+            "mean_attempts_to_completion": row["mean_attempts_to_completion"],
+            "answers": answers,
+            "top_distractor": max(distractors, key=lambda answer: answer["count"])["answer"] if distractors else None,
+        })
+    return {"total": total, "skip": skip, "limit": limit, "items": items}
@@ -0,0 +1,338 @@
+"""
+Raccomandazione dei prossimi quiz per uno studente.
+
+Il catalogo dei quiz è tenuto in memoria come array NumPy allineati (id,
+indice della categoria principale, indice della difficoltà, facilità del quiz
+in logit), ricaricato ogni RECOMMENDATION_REFRESH_SECONDS da una sola
+richiesta per volta, mentre le altre usano il catalogo precedente. La categoria
+principale è quella con id più basso; la facilità viene da quiz_item_stats
+(p-value), 0.5 se il quiz non ha ancora tentativi.
+
+Per ogni studente si tiene il vettore di padronanza: tentativi e risposte
+corrette per quiz, e da questi per categoria e per difficoltà, più i quiz già
+risolti. Viene calcolato con una query GROUP BY quiz_id alla prima richiesta,
+tenuto in una cache LRU per studente e poi aggiornato a ogni tentativo
+registrato (un listener sulla sessione applica i nuovi tentativi dopo il
+commit). Quando il catalogo viene ricaricato la padronanza in cache non viene
+scartata: alla lettura successiva le somme per categoria e difficoltà sono
+ricalcolate in memoria dai conteggi per quiz. I tentativi registrati da altri
+worker arrivano con la scadenza della cache, RECOMMENDATION_MASTERY_TTL_SECONDS
+dopo il calcolo di ogni studente.
+
+Il punteggio è calcolato in blocco su tutti i candidati: la probabilità di
+risposta corretta stimata combina la padronanza dello studente (media di
+categoria e difficoltà, con prior Beta(1, 1)) e la facilità del quiz sommando
+i logit; vengono preferiti i quiz con probabilità vicina a TARGET_SUCCESS,
+con un piccolo bonus per le categorie poco esplorate e per i quiz sbagliati in
+passato. I quiz già risolti sono esclusi; i primi k sono scelti con
+argpartition.
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.analytics import quiz_item_stats
+from app.models.challenge import QuizAttempt
+from app.models.quiz import Quiz, quiz_category_association
+
+TARGET_SUCCESS = 0.7
+EXPLORATION_BONUS = 0.1
+RETRY_BONUS = 0.05
+
+# Chiave di session.info con i tentativi in attesa del commit
+_PENDING = "recommendation_attempts"
+
+
+def _logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, 0.01, 0.99)
+    return np.log(p / (1 - p))
+
+
+class QuizCatalog:
+    """Caratteristiche dei quiz in array NumPy; l'indice 0 di categoria e difficoltà vale 'nessuna'"""
+
+    def __init__(self):
+        self.quiz_ids = np.empty(0, dtype=np.int64)
+        self.category = np.empty(0, dtype=np.int32)
+        self.difficulty = np.empty(0, dtype=np.int32)
+        self.easiness = np.empty(0, dtype=np.float32)
+        self.category_ids: List[Optional[int]] = [None]
+        self.difficulty_ids: List[Optional[int]] = [None]
+        self.position: Dict[int, int] = {}
+
+    @classmethod
+    def load(cls, db: Session) -> "QuizCatalog":
+        catalog = cls()
+        primary_category = (
+            select(quiz_category_association.c.quiz_id, func.min(quiz_category_association.c.category_id).label("category_id"))
+            .group_by(quiz_category_association.c.quiz_id)
+            .subquery()
+        )
+        rows = db.execute(
+            select(
+                Quiz.id,
+                primary_category.c.category_id,
+                Quiz.difficulty_level_id,
+                quiz_item_stats.c.attempts,
+                quiz_item_stats.c.correct_attempts,
+            )
+            .outerjoin(primary_category, primary_category.c.quiz_id == Quiz.id)
+            .outerjoin(quiz_item_stats, quiz_item_stats.c.quiz_id == Quiz.id)
+            .order_by(Quiz.id)
+        ).all()
+
+        category_index: Dict[Optional[int], int] = {None: 0}
+        difficulty_index: Dict[Optional[int], int] = {None: 0}
+        n = len(rows)
+        quiz_ids = np.empty(n, dtype=np.int64)
+        category = np.empty(n, dtype=np.int32)
+        difficulty = np.empty(n, dtype=np.int32)
+        attempts = np.zeros(n, dtype=np.float32)
+        correct = np.zeros(n, dtype=np.float32)
+        for i, (quiz_id, category_id, difficulty_id, quiz_attempts, quiz_correct) in enumerate(rows):
+            quiz_ids[i] = quiz_id
+            category[i] = category_index.setdefault(category_id, len(category_index))
+            difficulty[i] = difficulty_index.setdefault(difficulty_id, len(difficulty_index))
+            attempts[i] = quiz_attempts or 0
+            correct[i] = quiz_correct or 0
+
+        catalog.quiz_ids = quiz_ids
+        catalog.category = category
+        catalog.difficulty = difficulty
+        # Facilità con prior Beta(1, 1): 0.5 per i quiz senza tentativi
+        catalog.easiness = _logit((correct + 1) / (attempts + 2)).astype(np.float32)
+        catalog.category_ids = list(category_index)
+        catalog.difficulty_ids = list(difficulty_index)
+        catalog.position = {int(quiz_id): i for i, quiz_id in enumerate(quiz_ids)}
+        return catalog
+
+    def features(self, quiz_id: int) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """(categoria principale, difficoltà) di un quiz, None se non è nel catalogo."""
+        i = self.position.get(quiz_id)
+        if i is None:
+            return None
+        return self.category_ids[self.category[i]], self.difficulty_ids[self.difficulty[i]]
+
+
+@dataclass
+class StudentMastery:
+    """Tentativi e risposte corrette dello studente per quiz e, secondo `catalog`, per categoria e per difficoltà"""
+    catalog: QuizCatalog
+    quizzes: Dict[int, List[int]] = field(default_factory=dict)  # quiz_id -> [tentativi, corrette]
+    categories: Dict[Optional[int], List[int]] = field(default_factory=dict)  # id -> [tentativi, corrette]
+    difficulties: Dict[Optional[int], List[int]] = field(default_factory=dict)
+    attempted: Set[int] = field(default_factory=set)
+    solved: Set[int] = field(default_factory=set)
+
+    def add(self, quiz_id: int, attempts: int, correct: int) -> None:
+        counts = self.quizzes.setdefault(quiz_id, [0, 0])
+        counts[0] += attempts
+        counts[1] += correct
+        self.attempted.add(quiz_id)
+        if correct:
+            self.solved.add(quiz_id)
+        self._aggregate(quiz_id, attempts, correct)
+
+    def remap(self, catalog: QuizCatalog) -> None:
+        """Ricalcola le somme per categoria e difficoltà sul catalogo indicato, senza query."""
+        self.catalog = catalog
+        self.categories = {}
+        self.difficulties = {}
+        for quiz_id, (attempts, correct) in self.quizzes.items():
+            self._aggregate(quiz_id, attempts, correct)
+
+    def _aggregate(self, quiz_id: int, attempts: int, correct: int) -> None:
+        # I quiz non (ancora) nel catalogo contano solo come tentati o risolti
+        features = self.catalog.features(quiz_id)
+        if features is None:
+            return
+        category_id, difficulty_id = features
+        for counts in (self.categories.setdefault(category_id, [0, 0]),
+                       self.difficulties.setdefault(difficulty_id, [0, 0])):
+            counts[0] += attempts
+            counts[1] += correct
+
+
+def _mastery_array(counts: Dict[Optional[int], List[int]], ids: List[Optional[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Padronanza (prior Beta(1, 1)) e numero di tentativi allineati agli indici del catalogo."""
+    attempts = np.array([counts.get(key, (0, 0))[0] for key in ids], dtype=np.float32)
+    correct = np.array([counts.get(key, (0, 0))[1] for key in ids], dtype=np.float32)
+    return (correct + 1) / (attempts + 2), attempts
+
+
+class Recommender:
+    """Catalogo condiviso dal processo e padronanza degli studenti in cache"""
+
+    def __init__(self, refresh_seconds: float, cache_size: int, mastery_ttl: Optional[float] = None):
+        self.refresh_seconds = refresh_seconds
+        self.mastery_cache = LRUCache(maxsize=cache_size, ttl=mastery_ttl)
+        self._catalog = QuizCatalog()
+        self._loaded_at: Optional[float] = None
+        self._stale_at = 0.0
+        self._lock = threading.Lock()
+        # Una sola ricarica del catalogo per volta; non è preso da chi legge
+        self._rebuild_lock = threading.Lock()
+
+    @property
+    def catalog(self) -> QuizCatalog:
+        return self._catalog
+
+    def rebuild(self, db: Session) -> None:
+        with self._rebuild_lock:
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> None:
+        catalog = QuizCatalog.load(db)
+        with self._lock:
+            self._catalog = catalog
+            self._loaded_at = time.monotonic()
+            self._stale_at = self._loaded_at + self.refresh_seconds * random.uniform(1.0, 1.2)
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Ricarica il catalogo se non è mai stato caricato o se è troppo vecchio.
+        Se un'altra richiesta lo sta già ricaricando, restituisce subito e si
+        usa quello precedente; solo senza catalogo si attende il caricamento.
+        """
+        if self._loaded_at is None:
+            with self._rebuild_lock:
+                if self._loaded_at is None:
+                    self._rebuild(db)
+            return
+        if time.monotonic() < self._stale_at:
+            return
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() >= self._stale_at:
+                self._rebuild(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def mastery(self, db: Session, student_id: int) -> StudentMastery:
+        """Padronanza dello studente, dalla cache o con una query GROUP BY quiz_id."""
+        mastery = self.mastery_cache.get(student_id)
+        if mastery is not None:
+            catalog = self._catalog
+            if mastery.catalog is not catalog:
+                with self._lock:
+                    if mastery.catalog is not catalog:
+                        mastery.remap(catalog)
+            return mastery
+
+        version = self.mastery_cache.version(student_id)
+        catalog = self._catalog
+        mastery = StudentMastery(catalog)
+        rows = db.execute(
+            select(
+                QuizAttempt.quiz_id,
+                func.count(QuizAttempt.id),
+                func.coalesce(func.sum(case((QuizAttempt.correct == True, 1), else_=0)), 0),
+            )
+            .where(QuizAttempt.user_id == student_id)
+            .group_by(QuizAttempt.quiz_id)
+        )
+        for quiz_id, attempts, correct in rows:
+            mastery.add(quiz_id, attempts, correct)
+        self.mastery_cache.put(student_id, mastery, version)
+        return mastery
+
+    def apply(self, attempts: List[Tuple[int, int, bool]]) -> None:
+        """Aggiorna la padronanza in cache con i tentativi (studente, quiz, corretto) appena salvati."""
+        for student_id, quiz_id, correct in attempts:
+            mastery = self.mastery_cache.get(student_id)
+            if mastery is None:
+                # Invalida eventuali calcoli in corso, che non includono questo tentativo
+                self.mastery_cache.invalidate(student_id)
+                continue
+            with self._lock:
+                mastery.add(quiz_id, 1, 1 if correct else 0)
+
+    def recommend(
+        self,
+        db: Session,
+        student_id: int,
+        limit: int = 10,
+        category_id: Optional[int] = None,
+        difficulty_level_id: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """Restituisce fino a `limit` coppie (quiz_id, probabilità stimata di risposta corretta)."""
+        self.ensure_fresh(db)
+        catalog = self._catalog
+        mastery = self.mastery(db, student_id)
+        if not len(catalog.quiz_ids):
+            return []
+
+        with self._lock:
+            # Copia coerente: la padronanza in cache può essere aggiornata da altri thread
+            category_mastery, category_attempts = _mastery_array(mastery.categories, catalog.category_ids)
+            difficulty_mastery, _ = _mastery_array(mastery.difficulties, catalog.difficulty_ids)
+            solved = [catalog.position[quiz_id] for quiz_id in mastery.solved if quiz_id in catalog.position]
+            retry = [catalog.position[quiz_id] for quiz_id in mastery.attempted - mastery.solved
+                     if quiz_id in catalog.position]
+
+        candidates = np.ones(len(catalog.quiz_ids), dtype=bool)
+        candidates[solved] = False
+        if category_id is not None:
+            if category_id not in catalog.category_ids:
+                return []
+            candidates &= catalog.category == catalog.category_ids.index(category_id)
+        if difficulty_level_id is not None:
+            if difficulty_level_id not in catalog.difficulty_ids:
+                return []
+            candidates &= catalog.difficulty == catalog.difficulty_ids.index(difficulty_level_id)
+        index = np.flatnonzero(candidates)
+        if not len(index):
+            return []
+
+        category = catalog.category[index]
+        ability = (category_mastery[category] + difficulty_mastery[catalog.difficulty[index]]) / 2
+        predicted = 1 / (1 + np.exp(-(_logit(ability) + catalog.easiness[index])))
+        score = -np.abs(predicted - TARGET_SUCCESS)
+        score += EXPLORATION_BONUS / np.sqrt(1 + category_attempts[category])
+        if retry:
+            retried = np.zeros(len(catalog.quiz_ids), dtype=bool)
+            retried[retry] = True
+            score += RETRY_BONUS * retried[index]
+
+        k = min(limit, len(index))
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.lexsort((index[top], -score[top]))]
+        return [(int(catalog.quiz_ids[index[i]]), round(float(predicted[i]), 4)) for i in top]
+
+
+recommender = Recommender(
+    refresh_seconds=settings.RECOMMENDATION_REFRESH_SECONDS,
+    cache_size=settings.RECOMMENDATION_CACHE_SIZE,
+    mastery_ttl=settings.RECOMMENDATION_MASTERY_TTL_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_attempts(session, flush_context):
+    attempts = [
+        (obj.user_id, obj.quiz_id, bool(obj.correct))
+        for obj in session.new if isinstance(obj, QuizAttempt)
+    ]
+    if attempts:
+        session.info.setdefault(_PENDING, []).extend(attempts)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_attempts(session):
+    attempts = session.info.pop(_PENDING, None)
+    if attempts:
+        recommender.apply(attempts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_attempts(session):
+    session.info.pop(_PENDING, None)
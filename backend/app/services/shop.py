@@ -0,0 +1,208 @@
+"""
+Vista del negozio premi di uno studente.
+
+Il negozio è una delle schermate interrogate più spesso. La lettura usa una
+sola query di proiezione (solo le colonne necessarie, nessun oggetto Reward
+caricato dall'ORM) e valida l'intera lista di modelli di risposta in un solo
+passaggio. Il risultato viene tenuto in una cache per studente, invalidata da
+assegnazione, acquisto e rimozione dei premi nel worker che li esegue; negli
+altri worker scade dopo SHOP_CACHE_TTL_SECONDS.
+"""
+from typing import Iterable, List, Sequence, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.db.upsert import insert_for
+from app.models.reward import Reward, RewardPurchase, user_reward_shop_association
+from app.models.user import User, UserRole
+from app.services import ledger
+from app.schemas.reward import StudentShopReward, ParentStudentShopReward
+
+# Colonne lette per ogni premio del negozio
+SHOP_COLUMNS = (
+    Reward.id,
+    Reward.name,
+    Reward.description,
+    Reward.image_url,
+    Reward.point_cost,
+    Reward.is_active,
+    Reward.creator_id,
+    Reward.created_at,
+    Reward.updated_at,
+    user_reward_shop_association.c.quantity,
+)
+_SHOP_FIELDS = tuple(column.key for column in SHOP_COLUMNS)
+
+# Validazione dell'intera lista in un solo passaggio (pydantic-core)
+_shop_adapter = TypeAdapter(Tuple[StudentShopReward, ...])
+
+shop_cache = LRUCache(maxsize=settings.SHOP_CACHE_SIZE, ttl=settings.SHOP_CACHE_TTL_SECONDS)
+
+
+def _query_shop(db: Session, student_id: int) -> Tuple[StudentShopReward, ...]:
+    stmt = select(*SHOP_COLUMNS).join(
+        user_reward_shop_association,
+        Reward.id == user_reward_shop_association.c.reward_id
+    ).where(
+        user_reward_shop_association.c.user_id == student_id,
+        Reward.is_active == True
+    ).order_by(Reward.id)
+
+    fields = _SHOP_FIELDS
+    return _shop_adapter.validate_python(
+        [dict(zip(fields, row)) for row in db.execute(stmt)]
+    )
+
+
+def get_student_shop(db: Session, student_id: int) -> Tuple[StudentShopReward, ...]:
+    """Restituisce i premi nel negozio dello studente, dalla cache se possibile."""
+    shop = shop_cache.get(student_id)
+    if shop is not None:
+        return shop
+
+    version = shop_cache.version(student_id)
+    shop = _query_shop(db, student_id)
+    shop_cache.put(student_id, shop, version)
+    return shop
+
+
+def get_parent_view(db: Session, student_id: int) -> List[ParentStudentShopReward]:
+    """Versione ridotta del negozio mostrata ai genitori."""
+    return [
+        ParentStudentShopReward.model_construct(
+            id=reward.id,
+            name=reward.name,
+            description=reward.description,
+            image_url=reward.image_url,
+            point_cost=reward.point_cost,
+            quantity=reward.quantity,
+        )
+        for reward in get_student_shop(db, student_id)
+    ]
+
+
+def existing_students(db: Session, user_ids: Iterable[int]) -> List[int]:
+    """Filtra gli id passati tenendo solo gli utenti esistenti con ruolo studente (una query)."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return []
+    return sorted(
+        user_id for (user_id,) in db.execute(
+            select(User.id).where(User.id.in_(user_ids), User.role == UserRole.STUDENT)
+        )
+    )
+
+
+def assign_to_shops(db: Session, reward_id: int, student_ids: Sequence[int], quantity: int) -> None:
+    """
+    Aggiunge `quantity` pezzi del premio al negozio di ogni studente con un
+    solo INSERT ... ON CONFLICT (user_id, reward_id) DO UPDATE.
+    Non esegue il commit; le cache vanno invalidate dopo il commit.
+    """
+    if not student_ids:
+        return
+    stmt = insert_for(db, user_reward_shop_association).values([
+        {"user_id": student_id, "reward_id": reward_id, "quantity": quantity}
+        for student_id in student_ids
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[user_reward_shop_association.c.user_id,
+                        user_reward_shop_association.c.reward_id],
+        set_={"quantity": func.coalesce(user_reward_shop_association.c.quantity, 0)
+                          + stmt.excluded.quantity},
+    ))
+
+
+class PurchaseError(Exception):
+    """Acquisto rifiutato; status_code e detail vengono restituiti al client"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def purchase(db: Session, student_id: int, reward_id: int) -> RewardPurchase:
+    """
+    Acquista un premio dal negozio dello studente.
+
+    Punti e quantità vengono scalati con UPDATE condizionali (`points >= costo`
+    tramite ledger.add_points, `quantity > 0`) nella stessa breve transazione:
+    il database garantisce che acquisti concorrenti non vadano mai sotto zero,
+    senza SELECT ... FOR UPDATE. Il prelievo è registrato nel registro dei
+    punti con l'id dell'acquisto.
+    In caso di errore la transazione viene annullata e si solleva PurchaseError.
+    """
+    shop_row = user_reward_shop_association.c
+    point_cost = db.execute(
+        select(Reward.point_cost).where(Reward.id == reward_id, Reward.is_active == True)
+    ).scalar()
+    if point_cost is None:
+        db.rollback()
+        raise PurchaseError(404, "Reward not available")
+
+    remaining = db.execute(
+        update(user_reward_shop_association)
+        .where(
+            shop_row.user_id == student_id,
+            shop_row.reward_id == reward_id,
+            shop_row.quantity > 0,
+        )
+        .values(quantity=shop_row.quantity - 1)
+        .returning(shop_row.quantity)
+    ).scalar()
+    if remaining is None:
+        db.rollback()
+        raise PurchaseError(404, "Reward not found in your shop")
+
+    purchase_record = RewardPurchase(
+        user_id=student_id,
+        reward_id=reward_id,
+        point_cost=point_cost,
+        is_delivered=False
+    )
+    db.add(purchase_record)
+    db.flush()
+
+    points = ledger.add_points(db, student_id, -point_cost, ledger.PURCHASE, purchase_record.id, min_balance=0)
+    if points is None:
+        db.rollback()
+        available = ledger.get_balance(db, student_id) or 0
+        raise PurchaseError(
+            400,
+            f"Not enough points. You need {point_cost} points but have {available}"
+        )
+
+    if remaining == 0:
+        # Il premio esaurito sparisce dal negozio (solo se nessuno l'ha rifornito nel frattempo)
+        db.execute(
+            delete(user_reward_shop_association).where(
+                shop_row.user_id == student_id,
+                shop_row.reward_id == reward_id,
+                shop_row.quantity <= 0,
+            )
+        )
+
+    db.commit()
+    db.refresh(purchase_record)
+    invalidate_shop(student_id)
+    return purchase_record
+
+
+def invalidate_shop(student_id: int) -> None:
+    """Da chiamare dopo ogni commit che modifica il negozio dello studente."""
+    shop_cache.invalidate(student_id)
+
+
+def invalidate_shops(student_ids: Iterable[int]) -> None:
+    for student_id in student_ids:
+        shop_cache.invalidate(student_id)
+
+
+def invalidate_all_shops() -> None:
+    """Da chiamare quando cambia un premio che può comparire in più negozi."""
+    shop_cache.clear()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark della compressione delle risposte (banda e CPU).
+
+Payload rappresentativi:
+  - elenco quiz (GET /quizzes/) da 100 e 1000 quiz, serializzato come
+    dall'endpoint;
+  - esportazione CSV dei tentativi, compressa in streaming a blocchi di
+    EXPORT_CHUNK_SIZE righe con un flush dopo ogni blocco, come fa il
+    middleware.
+
+Per ogni codifica e livello stampa dimensione compressa, rapporto, tempo di
+CPU e throughput. Brotli è misurato solo se il modulo brotli è installato.
+
+Uso:
+    python benchmarks/bench_compression.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_serialization import build_quizzes
+
+from app.core import compression
+from app.core.config import settings
+from app.core.responses import model_response
+from app.schemas.quiz import QuizListResponse
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_LEVELS = (1, 4, 6, 11)
+
+
+def quiz_listing(n):
+    return model_response(QuizListResponse, {"quizzes": build_quizzes(n), "total": n}).body
+
+
+def attempts_csv_chunks(rows, chunk_size):
+    rng = random.Random(3)
+    start = datetime(2024, 9, 1)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["id", "user_id", "username", "quiz_id", "challenge_attempt_id",
+                     "answer", "correct", "points_earned", "created_at"])
+    chunks = []
+    for i in range(1, rows + 1):
+        user_id = rng.randint(1, 2000)
+        correct = rng.random() < 0.6
+        writer.writerow([i, user_id, f"studente{user_id}", rng.randint(1, 5000), "",
+                         str(rng.randint(1, 200)), correct, rng.randint(1, 10) if correct else 0,
+                         (start + timedelta(seconds=i * 37)).isoformat()])
+        if i % chunk_size == 0 or i == rows:
+            chunks.append(buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate()
+    return chunks
+
+
+def encoders():
+    for level in GZIP_LEVELS:
+        yield f"gzip {level}", lambda level=level: compression._GzipEncoder(level)
+    if compression.brotli is not None:
+        for level in BROTLI_LEVELS:
+            yield f"br {level}", lambda level=level: compression._BrotliEncoder(level)
+
+
+def compress(make_encoder, chunks):
+    encoder = make_encoder()
+    parts = [encoder.compress(chunk) for chunk in chunks[:-1]]
+    parts.append(encoder.finish(chunks[-1]))
+    return sum(len(part) for part in parts)
+
+
+def report(name, chunks, repeat):
+    size = sum(len(chunk) for chunk in chunks)
+    print(f"\n{name}: {size / 1024:.0f} KiB in {len(chunks)} blocchi")
+    print(f"{'codifica':<10}{'KiB':>10}{'rapporto':>10}{'ms':>10}{'MB/s':>10}")
+    for label, make_encoder in encoders():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compressed = compress(make_encoder, chunks)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<10}{compressed / 1024:>10.1f}{size / compressed:>10.1f}"
+              f"{best * 1000:>10.1f}{size / best / 1e6:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if compression.brotli is None:
+        print("Modulo brotli non installato: solo gzip")
+    report("Elenco di 100 quiz", [quiz_listing(100)], args.repeat)
+    report("Elenco di 1000 quiz", [quiz_listing(1000)], args.repeat)
+    chunks = attempts_csv_chunks(args.rows, settings.EXPORT_CHUNK_SIZE)
+    report(f"Esportazione CSV di {args.rows} tentativi (streaming)", chunks, args.repeat)
+    report(f"Esportazione CSV di {args.rows} tentativi (in un blocco)", [b"".join(chunks)], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
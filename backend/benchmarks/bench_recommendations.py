@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark delle raccomandazioni di quiz (GET /quizzes/recommended).
+
+Crea un catalogo di 100.000 quiz distribuiti su categorie e livelli di
+difficoltà e uno studente con qualche migliaio di tentativi, poi misura:
+  - il caricamento del catalogo in array NumPy (una volta per worker);
+  - la prima raccomandazione dello studente (calcolo della padronanza);
+  - le raccomandazioni successive, con la padronanza in cache;
+  - l'aggiornamento incrementale dopo un nuovo tentativo.
+
+Uso:
+    python benchmarks/bench_recommendations.py [--quizzes 100000] [--attempts 5000] [--repeat 200]
+
+Per default usa un database SQLite in memoria; impostare BENCH_DATABASE_URL
+per eseguirlo su PostgreSQL (le tabelle vengono create se mancano).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User
+from app.models.challenge import QuizAttempt
+from app.models.quiz import Category, DifficultyLevel, Quiz, quiz_category_association
+from app.services.recommendations import recommender
+
+
+def seed(db, n_quizzes, n_attempts, n_categories=40):
+    rng = random.Random(11)
+    admin = User(username="bench_admin", email="bench_admin@example.com",
+                 hashed_password="x", role="admin")
+    student = User(username="bench_student", email="bench_student@example.com",
+                   hashed_password="x", role="student", points=0)
+    categories = [Category(name=f"Categoria {i}") for i in range(n_categories)]
+    levels = [DifficultyLevel(name=f"Livello {i}", value=i) for i in range(1, 6)]
+    db.add_all([admin, student] + categories + levels)
+    db.commit()
+
+    db.execute(Quiz.__table__.insert(), [
+        {"question": f"Domanda {i}", "options": ["a", "b", "c"], "correct_answer": "a", "points": 10,
+         "creator_id": admin.id, "difficulty_level_id": levels[i % len(levels)].id}
+        for i in range(n_quizzes)
+    ])
+    quiz_ids = [quiz_id for (quiz_id,) in db.query(Quiz.id)]
+    db.execute(quiz_category_association.insert(), [
+        {"quiz_id": quiz_id, "category_id": categories[rng.randrange(n_categories)].id}
+        for quiz_id in quiz_ids
+    ])
+    db.execute(QuizAttempt.__table__.insert(), [
+        {"user_id": student.id, "quiz_id": rng.choice(quiz_ids), "answer": "a",
+         "correct": rng.random() < 0.6, "points_earned": 10, "completed": False}
+        for _ in range(n_attempts)
+    ])
+    db.commit()
+    return student.id, quiz_ids
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    print(f"{label:<40} {elapsed_ms:9.2f} ms")
+    return elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quizzes", type=int, default=100000)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("BENCH_DATABASE_URL", "sqlite://"))
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    student_id, quiz_ids = seed(db, args.quizzes, args.attempts)
+    print(f"{args.quizzes} quiz, studente con {args.attempts} tentativi\n")
+
+    timed("caricamento del catalogo", lambda: recommender.rebuild(db), 1)
+
+    def cold():
+        recommender.mastery_cache.invalidate(student_id)
+        recommender.recommend(db, student_id, limit=10)
+
+    timed("prima richiesta (padronanza da SQL)", cold, 5)
+    recommended = recommender.recommend(db, student_id, limit=10)
+    warm = timed("richiesta con padronanza in cache", lambda: recommender.recommend(db, student_id, limit=10),
+                 args.repeat)
+    timed("con filtro per categoria", lambda: recommender.recommend(db, student_id, limit=10, category_id=1),
+          args.repeat)
+
+    # Un tentativo corretto sul primo consigliato lo toglie dalle raccomandazioni
+    solved = recommended[0][0]
+    db.add(QuizAttempt(user_id=student_id, quiz_id=solved, answer="a", correct=True, points_earned=10))
+    db.commit()
+    after = recommender.recommend(db, student_id, limit=10)
+    assert recommender.mastery_cache.get(student_id) is not None, "padronanza non più in cache"
+    assert solved not in [quiz_id for quiz_id, _ in after], "quiz risolto ancora consigliato"
+    print("\nAggiornamento incrementale dopo un tentativo: OK")
+    print(f"Obiettivo < 10 ms con padronanza in cache: {'OK' if warm < 10 else 'NO'}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark della serializzazione delle liste di quiz (GET /quizzes/).
+
+Costruisce 10.000 oggetti Quiz ORM (non salvati) con categorie e livello di
+difficoltà e misura la produzione del corpo JSON di QuizListResponse:
+  - percorso standard di FastAPI: validazione del response_model, dump in
+    dizionari Python e json.dumps (JSONResponse);
+  - stesso percorso con ORJSONResponse (la classe di default dell'applicazione);
+  - model_response: validazione e dump_json direttamente in bytes.
+Viene stampato anche il tempo della sola validazione degli oggetti ORM, comune
+a tutti i percorsi.
+
+Uso:
+    python benchmarks/bench_serialization.py [--quizzes 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from app.core.responses import model_response
+from app.models.quiz import Category, DifficultyLevel, Quiz
+from app.schemas.quiz import QuizListResponse
+
+
+def build_quizzes(n):
+    rng = random.Random(5)
+    categories = [Category(id=i, name=f"Categoria {i}", color="#3366cc") for i in range(1, 41)]
+    levels = [DifficultyLevel(id=i, name=f"Livello {i}", value=i) for i in range(1, 6)]
+    start = datetime(2024, 1, 1)
+    quizzes = []
+    for i in range(1, n + 1):
+        level = rng.choice(levels)
+        quizzes.append(Quiz(
+            id=i,
+            question=f"Domanda {i}: quanto fa {rng.randint(1, 99)} + {rng.randint(1, 99)}?",
+            options=[str(rng.randint(1, 200)) for _ in range(4)],
+            correct_answer="42",
+            explanation="Spiegazione della risposta corretta " * 2,
+            points=rng.randint(1, 10),
+            creator_id=1,
+            difficulty_level_id=level.id,
+            difficulty_level=level,
+            categories=rng.sample(categories, rng.randint(1, 3)),
+            created_at=start + timedelta(minutes=i),
+        ))
+    return quizzes
+
+
+def timed(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quizzes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    content = {"quizzes": build_quizzes(args.quizzes), "total": args.quizzes}
+    field = create_response_field(name="response", type_=QuizListResponse)
+
+    def fastapi_path(response_class):
+        def render():
+            value = asyncio.run(serialize_response(field=field, response_content=content))
+            return response_class(value).body
+        return render
+
+    results = [
+        ("FastAPI + JSONResponse", *timed(args.repeat, fastapi_path(JSONResponse))),
+        ("FastAPI + ORJSONResponse", *timed(args.repeat, fastapi_path(ORJSONResponse))),
+        ("model_response", *timed(args.repeat, lambda: model_response(QuizListResponse, content).body)),
+    ]
+
+    adapter = TypeAdapter(QuizListResponse)
+    validation_ms, _ = timed(args.repeat, lambda: adapter.validate_python(content, from_attributes=True))
+
+    reference = json.loads(results[0][2])
+    baseline = results[0][1]
+    print(f"{args.quizzes} quiz, migliore di {args.repeat} esecuzioni\n")
+    for name, ms, body in results:
+        assert json.loads(body) == reference, f"{name}: corpo diverso"
+        print(f"{name:<28}{ms:>9.1f} ms{baseline / ms:>8.2f}x  {len(body) / 1024:>8.0f} KiB")
+    print(f"{'(sola validazione ORM)':<28}{validation_ms:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
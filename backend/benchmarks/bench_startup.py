@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark dell'avvio a freddo di un worker.
+
+Esegue in processi separati (per non avere moduli già importati):
+  1. `python -X importtime -c "import app.main"` e riassume il tempo di import
+     per pacchetto e i moduli più lenti;
+  2. import di app.main più il lifespan dell'applicazione (attesa del database,
+     creazione delle tabelle se abilitata, pre-riempimento del pool e
+     caricamento degli indici in memoria), fino a quando il worker è pronto.
+
+Ogni misura è ripetuta e viene tenuto il minimo. Esce con codice 1 se l'avvio
+supera il budget.
+
+Con gunicorn (preload_app in gunicorn.conf.py) l'import avviene una volta sola
+nel master: ogni worker, dopo il fork, paga solo il lifespan. L'import è
+dominato dalla costruzione dei modelli di FastAPI (fastapi.openapi.models e i
+campi di risposta delle route, app.api.admin in testa).
+
+Uso:
+    python benchmarks/bench_startup.py [--repeat 3] [--budget-ms 2000] [--module app.main] [--top 15]
+
+Per default usa un file SQLite temporaneo; impostare BENCH_DATABASE_URL per
+misurare l'avvio su PostgreSQL (con ENVIRONMENT=production le tabelle non
+vengono create e devono esistere).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READY_SCRIPT = """
+import asyncio
+import time
+start = time.perf_counter()
+from {module} import app
+import_done = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(f"{{(import_done - start) * 1000:.1f}} {{(ready - start) * 1000:.1f}}")
+"""
+
+
+def run(args, env):
+    return subprocess.run([sys.executable, *args], cwd=BACKEND, env=env, capture_output=True, text=True)
+
+
+def import_profile(module, env):
+    """Righe di -X importtime: (modulo, tempo proprio µs, cumulativo µs, profondità)."""
+    result = run(["-X", "importtime", "-c", f"import {module}"], env)
+    if result.returncode != 0:
+        sys.exit(f"Import di {module} non riuscito:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=2000)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    env["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or (
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_startup.db")
+    )
+
+    # 1. Profilo degli import (minimo su più esecuzioni)
+    profiles = [import_profile(args.module, env) for _ in range(args.repeat)]
+    best = min(profiles, key=lambda rows: sum(cumulative for _, _, cumulative, depth in rows if depth == 1))
+    total_ms = sum(cumulative for _, _, cumulative, depth in best if depth == 1) / 1000
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in best:
+        by_package[name.split(".")[0]] += self_us
+    print(f"Import di {args.module}: {total_ms:.0f} ms\n")
+    print(f"{'pacchetto':<24}{'ms':>10}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<24}{self_us / 1000:>10.1f}")
+    print(f"\n{'modulo (tempo proprio)':<48}{'ms':>10}")
+    for name, self_us, _, _ in sorted(best, key=lambda row: -row[1])[:args.top]:
+        print(f"{name:<48}{self_us / 1000:>10.1f}")
+
+    # 2. Import + lifespan fino al worker pronto
+    timings = []
+    for _ in range(args.repeat):
+        result = run(["-c", READY_SCRIPT.format(module=args.module)], env)
+        if result.returncode != 0:
+            sys.exit(f"Avvio non riuscito:\n{result.stderr[-2000:]}")
+        timings.append(tuple(map(float, result.stdout.split()[-2:])))
+    import_ms, ready_ms = min(timings, key=lambda t: t[1])
+    print(f"\nimport: {import_ms:.0f} ms, lifespan: {ready_ms - import_ms:.0f} ms, "
+          f"worker pronto in {ready_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    sys.exit(0 if ready_ms <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
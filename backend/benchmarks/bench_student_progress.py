@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark del report dei progressi di uno studente.
+
+Confronta il calcolo originale di GET /progress/student/{id} (tutti i
+tentativi, le sfide e gli acquisti caricati in Python, contati con list
+comprehension e ordinati per prendere i 5 più recenti) con il report di
+app.services.progress (aggregati SQL + subquery LIMIT 5), per uno studente
+con 50.000 tentativi di quiz.
+
+Uso:
+    python benchmarks/bench_student_progress.py [--attempts 50000] [--repeat 20]
+
+Per default usa un database SQLite in memoria; impostare BENCH_DATABASE_URL
+per eseguirlo su PostgreSQL (le tabelle vengono create se mancano).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User
+from app.models.challenge import QuizAttempt, UserChallenge
+from app.models.quiz import Quiz
+from app.models.reward import Reward, RewardPurchase
+from app.services import progress
+
+
+def legacy_report(db, student):
+    """Calcolo precedente (con user_id al posto dell'inesistente student_id)"""
+    quiz_attempts = db.query(QuizAttempt).filter(QuizAttempt.user_id == student.id).all()
+    challenge_attempts = db.query(UserChallenge).filter(UserChallenge.user_id == student.id).all()
+    purchases = db.query(RewardPurchase).filter(RewardPurchase.user_id == student.id).all()
+
+    total = len(quiz_attempts)
+    correct = len([qa for qa in quiz_attempts if qa.correct])
+    completed = len([ca for ca in challenge_attempts if ca.completed])
+    spent = sum(p.point_cost for p in purchases)
+    recent = (
+        sorted(quiz_attempts, key=lambda x: x.created_at, reverse=True)[:5],
+        sorted(challenge_attempts, key=lambda x: x.created_at, reverse=True)[:5],
+        sorted(purchases, key=lambda x: x.created_at, reverse=True)[:5],
+    )
+    return total, correct, completed, spent, recent
+
+
+def seed(db, n_attempts):
+    rng = random.Random(7)
+    admin = User(username="bench_admin", email="bench_admin@example.com",
+                 hashed_password="x", role="admin")
+    student = User(username="bench_student", email="bench_student@example.com",
+                   hashed_password="x", role="student", points=1000)
+    db.add_all([admin, student])
+    db.commit()
+
+    quizzes = [
+        Quiz(question=f"Domanda {i}", options=["a", "b"], correct_answer="a", points=10, creator_id=admin.id)
+        for i in range(200)
+    ]
+    reward = Reward(name="Premio", point_cost=50, creator_id=admin.id)
+    db.add_all(quizzes + [reward])
+    db.commit()
+
+    start = datetime(2024, 1, 1)
+    db.execute(QuizAttempt.__table__.insert(), [
+        {
+            "user_id": student.id,
+            "quiz_id": quizzes[i % len(quizzes)].id,
+            "answer": "a",
+            "correct": rng.random() < 0.7,
+            "points_earned": 10,
+            "completed": True,
+            "created_at": start + timedelta(minutes=i),
+            "updated_at": start + timedelta(minutes=i),
+        }
+        for i in range(n_attempts)
+    ])
+    db.execute(RewardPurchase.__table__.insert(), [
+        {"user_id": student.id, "reward_id": reward.id, "point_cost": 50, "is_delivered": i % 2 == 0,
+         "created_at": start + timedelta(days=i), "updated_at": start + timedelta(days=i)}
+        for i in range(200)
+    ])
+    db.commit()
+    return student.id
+
+
+def timed(label, fn, repeat):
+    fn()  # riscaldamento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    print(f"{label:<34} {elapsed_ms:9.2f} ms/richiesta")
+    return elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attempts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("BENCH_DATABASE_URL", "sqlite://"))
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    student_id = seed(db, args.attempts)
+    student = db.get(User, student_id)
+
+    report = progress.student_report(db, student)
+    total, correct, completed, spent, _ = legacy_report(db, student)
+    assert report["quiz_stats"]["total_attempted"] == total
+    assert report["quiz_stats"]["correct_answers"] == correct
+    assert report["points_stats"]["total_spent"] == spent
+
+    print(f"Studente con {args.attempts} tentativi, {args.repeat} ripetizioni\n")
+
+    def legacy():
+        db.expunge_all()
+        legacy_report(db, db.get(User, student_id))
+
+    def aggregated():
+        progress.student_report(db, student)
+
+    base = timed("righe in Python (precedente)", legacy, max(1, args.repeat // 4))
+    new = timed("aggregati SQL + LIMIT 5", aggregated, args.repeat)
+    print(f"\nSpeedup: {base / new:.0f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
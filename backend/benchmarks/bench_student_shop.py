@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark della lettura del negozio di uno studente.
+
+Confronta la lettura originale (oggetti Reward caricati dall'ORM e dizionari
+ricostruiti campo per campo) con la query di proiezione di app.services.shop,
+a cache fredda e calda, con 1000 premi nel negozio. In tutti i casi viene
+inclusa la validazione della risposta con List[StudentShopReward], come fa
+FastAPI con response_model.
+
+Uso:
+    python benchmarks/bench_student_shop.py [--rewards 1000] [--repeat 50]
+
+Per default usa un database SQLite in memoria; impostare BENCH_DATABASE_URL
+per eseguirlo su PostgreSQL (le tabelle vengono create se mancano).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User
+from app.models.reward import Reward, user_reward_shop_association
+from app.schemas.reward import StudentShopReward
+from app.services import shop
+
+response_adapter = TypeAdapter(List[StudentShopReward])
+
+
+def legacy_student_shop(db, student_id):
+    """Implementazione precedente di GET /student/shop/"""
+    shop_rewards = db.query(
+        Reward,
+        user_reward_shop_association.c.quantity.label("quantity")
+    ).join(
+        user_reward_shop_association,
+        Reward.id == user_reward_shop_association.c.reward_id
+    ).filter(
+        user_reward_shop_association.c.user_id == student_id,
+        Reward.is_active == True
+    ).all()
+
+    result = []
+    for reward, quantity in shop_rewards:
+        result.append({
+            "id": reward.id,
+            "name": reward.name,
+            "description": reward.description,
+            "image_url": reward.image_url,
+            "point_cost": reward.point_cost,
+            "is_active": reward.is_active,
+            "creator_id": reward.creator_id,
+            "created_at": reward.created_at,
+            "updated_at": reward.updated_at,
+            "quantity": quantity,
+        })
+    return result
+
+
+def seed(db, n_rewards):
+    admin = User(username="bench_admin", email="bench_admin@example.com",
+                 hashed_password="x", role="admin")
+    student = User(username="bench_student", email="bench_student@example.com",
+                   hashed_password="x", role="student", points=0)
+    db.add_all([admin, student])
+    db.commit()
+
+    rewards = [
+        Reward(name=f"Premio {i}", description=f"Descrizione del premio {i}",
+               image_url=f"/img/{i}.png", point_cost=10 + i % 90, creator_id=admin.id)
+        for i in range(n_rewards)
+    ]
+    db.add_all(rewards)
+    db.commit()
+
+    db.execute(user_reward_shop_association.insert(), [
+        {"user_id": student.id, "reward_id": reward.id, "quantity": 1 + i % 3}
+        for i, reward in enumerate(rewards)
+    ])
+    db.commit()
+    return student.id
+
+
+def timed(label, fn, repeat):
+    fn()  # riscaldamento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    print(f"{label:<34} {elapsed_ms:9.3f} ms/richiesta")
+    return elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rewards", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("BENCH_DATABASE_URL", "sqlite://"))
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    student_id = seed(db, args.rewards)
+
+    print(f"Negozio con {args.rewards} premi, {args.repeat} ripetizioni\n")
+
+    def legacy():
+        db.expunge_all()
+        response_adapter.validate_python(legacy_student_shop(db, student_id))
+
+    def projection_cold():
+        shop.invalidate_shop(student_id)
+        response_adapter.validate_python(list(shop.get_student_shop(db, student_id)))
+
+    def projection_cached():
+        response_adapter.validate_python(list(shop.get_student_shop(db, student_id)))
+
+    base = timed("ORM + dict (precedente)", legacy, args.repeat)
+    cold = timed("proiezione, cache fredda", projection_cold, args.repeat)
+    warm = timed("proiezione, cache calda", projection_cached, args.repeat)
+
+    print(f"\nSpeedup cache fredda: {base / cold:.1f}x, cache calda: {base / warm:.0f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Generatore di dati sintetici di dimensione realistica per benchmark e tuning
+degli indici.
+
+Crea un admin, genitori, studenti (ognuno con un genitore), quiz con
+categorie e difficoltà, percorsi con i loro quiz (anche copiati in
+path_quizzes, usati da /path-quizzes), premi, e per ogni studente
+percorsi assegnati (user_progress), negozio, storico dei tentativi e acquisti.
+Le distribuzioni sono sbilanciate come quelle reali:
+  - attività degli studenti a coda lunga (Pareto): una parte è inattiva,
+    pochi studenti fanno la maggior parte dei tentativi;
+  - popolarità dei quiz e dei percorsi secondo Zipf;
+  - risposta corretta con probabilità logistica (abilità dello studente meno
+    difficoltà del quiz);
+  - tentativi concentrati negli ultimi giorni e nelle ore pomeridiane.
+I punti degli studenti sono coerenti con lo storico: punti dei tentativi
+corretti più i bonus dei percorsi completati meno gli acquisti. Il registro
+dei punti (points_ledger) ha per ogni studente con punti una riga
+opening_balance pari al saldo, come dopo migrations/add_points_ledger.py.
+
+I dati sono generati a blocchi di --chunk-size righe, ognuno con un
+generatore casuale derivato da (--seed, tabella, numero del blocco): a parità
+di parametri (compresi --until e --chunk-size) il contenuto è identico
+qualunque sia --workers. Gli id di utenti, quiz, percorsi e premi sono
+assegnati dal generatore a partire dal massimo già presente; quelli di
+tentativi, acquisti e progressi dalle sequenze del database.
+
+Su PostgreSQL ogni blocco è caricato con COPY in una transazione propria e i
+blocchi sono eseguiti in parallelo da --workers processi; alla fine le
+sequenze vengono riallineate ed è eseguito ANALYZE. Sugli altri database i
+blocchi sono inseriti con executemany di insert() a lotti, e su SQLite da un
+solo processo.
+
+Gli utenti hanno password "load" e nomi {prefix}_student_N / {prefix}_parent_N,
+gli stessi usati da benchmarks/loadgen.py.
+
+Uso:
+    python benchmarks/generate_data.py [--students 100000] [--parents N] [--quizzes 20000] [--paths N]
+                                       [--rewards 500] [--attempts 40] [--days 365] [--until 2024-06-30]
+                                       [--seed 49] [--chunk-size 5000] [--workers 4] [--prefix load]
+                                       [--create-tables]
+
+Il database è quello di BENCH_DATABASE_URL, o di DATABASE_URL se non è impostato.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.pool import NullPool
+
+from app.core.security import get_password_hash
+from app.models import (
+    Base, Category, DifficultyLevel, Path, PathQuiz, Quiz, QuizAttempt, Reward, RewardPurchase, User, UserProgress,
+    parent_student_association, points_ledger, quiz_category_association, quiz_path_association,
+    user_reward_shop_association,
+)
+from app.services import ledger
+
+PASSWORD = "load"
+
+# Identificativi delle tabelle per i semi dei generatori casuali
+CATALOG, PARENTS, QUIZZES, PATHS, STUDENTS = range(5)
+
+ZIPF_EXPONENT = 1.1
+INACTIVE_STUDENTS = 0.15
+MAX_ACTIVITY = 25  # tentativi massimi come multiplo di --attempts
+QUIZ_POINTS = (1, 2, 5, 10)
+QUIZ_POINTS_P = (0.2, 0.4, 0.3, 0.1)
+PATH_BONUS = (10, 20, 50)
+PATH_SIZES = (5, 16)  # quiz per percorso, estremo superiore escluso
+PATHS_PER_STUDENT_P = (0.3, 0.35, 0.25, 0.1)  # 0, 1, 2 o 3 percorsi assegnati
+SHOP_SIZES = (3, 9)
+MAX_PURCHASES = 20
+# Ore dei tentativi: soprattutto pomeriggio e prima sera
+HOUR_WEIGHTS = np.array([0, 0, 0, 0, 0, 0, 0, 1, 2, 2, 2, 2, 2, 3, 6, 8, 9, 9, 8, 7, 5, 3, 1, 0], dtype=float)
+WRONG_DELTAS = np.array([1, -1, 10])
+
+DEFAULT_CATEGORIES = ("Matematica", "Italiano", "Scienze", "Storia", "Geografia", "Inglese")
+DEFAULT_LEVELS = (("Facile", 1), ("Medio", 2), ("Difficile", 3))
+
+# Righe per executemany fuori da PostgreSQL
+INSERT_BATCH = 10000
+
+
+@dataclass
+class Plan:
+    """Parametri della generazione, condivisi con i processi worker"""
+    url: str
+    seed: int
+    until: datetime
+    days: int
+    chunk_size: int
+    students: int
+    parents: int
+    quizzes: int
+    paths: int
+    rewards: int
+    attempts: int
+    prefix: str
+    password_hash: str
+    first_ids: Dict[str, int] = field(default_factory=dict)
+    categories: List[int] = field(default_factory=list)
+    levels: List[int] = field(default_factory=list)  # id ordinati per difficoltà crescente
+
+    @property
+    def admin_id(self) -> int:
+        return self.first_ids["users"]
+
+    def parent_id(self, index: int) -> int:
+        return self.first_ids["users"] + 1 + index
+
+    def student_id(self, index: int) -> int:
+        return self.first_ids["users"] + 1 + self.parents + index
+
+
+def zipf_cdf(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Distribuzione cumulativa Zipf su n elementi, con i ranghi assegnati a caso."""
+    if not n:
+        return np.ones(0)
+    weights = 1.0 / (rng.permutation(n) + 1) ** ZIPF_EXPONENT
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample(cdf: np.ndarray, rng: np.random.Generator, size: int) -> np.ndarray:
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side="right"), len(cdf) - 1)
+
+
+class Catalog:
+    """Caratteristiche di quiz, percorsi e premi, ricalcolate identiche in ogni processo"""
+
+    def __init__(self, plan: Plan):
+        rng = np.random.default_rng([plan.seed, CATALOG])
+        n = plan.quizzes
+        self.a = rng.integers(1, 100, n)
+        self.b = rng.integers(1, 100, n)
+        self.points = rng.choice(QUIZ_POINTS, n, p=QUIZ_POINTS_P)
+        self.level = rng.integers(0, len(plan.levels), n)
+        # Difficoltà in logit: da -1 (livello più facile) a +1 (più difficile)
+        self.difficulty = (self.level / max(len(plan.levels) - 1, 1)) * 2 - 1
+        self.category = rng.integers(0, len(plan.categories), n)
+        self.quiz_cdf = zipf_cdf(rng, n)
+
+        self.path_sizes = np.minimum(rng.integers(*PATH_SIZES, plan.paths), n)
+        self.path_bonus = rng.choice(PATH_BONUS, plan.paths)
+        self.path_cdf = zipf_cdf(rng, plan.paths)
+
+        self.reward_costs = rng.integers(1, 21, plan.rewards) * 10
+
+
+_catalog: Optional[Catalog] = None
+_engine = None
+
+
+def _init_worker(plan: Plan) -> None:
+    global _catalog, _engine
+    _catalog = Catalog(plan)
+    _engine = create_engine(plan.url, poolclass=NullPool)
+
+
+def _timestamps(plan: Plan, rng: np.random.Generator, size: int) -> List[datetime]:
+    """Istanti negli ultimi plan.days giorni, più frequenti di recente e nelle ore pomeridiane."""
+    days_back = np.floor(plan.days * rng.random(size) ** 2).astype("int64") + 1
+    hours = rng.choice(24, size, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    seconds = days_back * -86400 + hours * 3600 + rng.integers(0, 3600, size)
+    return (np.datetime64(plan.until, "s") + seconds.astype("timedelta64[s]")).astype("datetime64[us]").tolist()
+
+
+def _signup_times(plan: Plan, rng: np.random.Generator, size: int) -> List[datetime]:
+    """Iscrizioni nei due mesi precedenti lo storico dei tentativi."""
+    days_back = plan.days + 1 + rng.integers(0, 60, size)
+    return [plan.until - timedelta(days=int(days)) for days in days_back]
+
+
+def _user_row(plan: Plan, user_id: int, kind: str, index: int, points: int, created: datetime) -> tuple:
+    username = f"{plan.prefix}_{kind}_{index + 1}"
+    full_name = f"{'Studente' if kind == 'student' else 'Genitore'} {index + 1}"
+    return (user_id, username, f"{username}@example.com", plan.password_hash, full_name,
+            kind, True, points, created, created)
+
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "full_name", "role", "is_active", "points",
+                "created_at", "updated_at")
+
+
+def copy_rows(conn, table, columns: Sequence[str], rows: List[tuple]) -> None:
+    """Inserisce le righe con COPY su PostgreSQL, con executemany sugli altri database."""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (list, dict)) else value for value in row
+            ])
+        buffer.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        # Valori vuoti non quotati = NULL nel formato csv
+        # Nomi quotati: path_quizzes ha la colonna "order"
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        cursor.copy_expert(f"COPY {table.name} ({quoted}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return
+    for start in range(0, len(rows), INSERT_BATCH):
+        conn.execute(insert(table), [dict(zip(columns, row)) for row in rows[start:start + INSERT_BATCH]])
+
+
+def _parents_chunk(plan: Plan, chunk: int, start: int, stop: int) -> Dict[str, int]:
+    rng = np.random.default_rng([plan.seed, PARENTS, chunk])
+    created = _signup_times(plan, rng, stop - start)
+    rows = [_user_row(plan, plan.parent_id(i), "parent", i, 0, created[i - start]) for i in range(start, stop)]
+    with _engine.begin() as conn:
+        copy_rows(conn, User.__table__, USER_COLUMNS, rows)
+    return {"users": len(rows)}
+
+
+def _quiz_text(i: int) -> Tuple[str, List[str], str, str]:
+    """Domanda, opzioni, risposta corretta e spiegazione dell'i-esimo quiz generato."""
+    a, b = int(_catalog.a[i]), int(_catalog.b[i])
+    total = a + b
+    options = sorted({str(total), str(total + 1), str(total - 1), str(total + 10)})
+    return f"Quanto fa {a} + {b}?", options, str(total), f"{a} + {b} = {total}"
+
+
+def _quizzes_chunk(plan: Plan, chunk: int, start: int, stop: int) -> Dict[str, int]:
+    rng = np.random.default_rng([plan.seed, QUIZZES, chunk])
+    cat = _catalog
+    created = _timestamps(plan, rng, stop - start)
+    second_category = rng.random(stop - start) < 0.2
+    quizzes, categories = [], []
+    for i in range(start, stop):
+        quiz_id = plan.first_ids["quizzes"] + i
+        quizzes.append((quiz_id, *_quiz_text(i), int(cat.points[i]), plan.admin_id, plan.levels[cat.level[i]],
+                         created[i - start], created[i - start]))
+        category = int(cat.category[i])
+        categories.append((quiz_id, plan.categories[category]))
+        if second_category[i - start] and len(plan.categories) > 1:
+            categories.append((quiz_id, plan.categories[(category + 1) % len(plan.categories)]))
+    with _engine.begin() as conn:
+        copy_rows(conn, Quiz.__table__, ("id", "question", "options", "correct_answer", "explanation", "points",
+                                         "creator_id", "difficulty_level_id", "created_at", "updated_at"), quizzes)
+        copy_rows(conn, quiz_category_association, ("quiz_id", "category_id"), categories)
+    return {"quizzes": len(quizzes), "quiz_category_association": len(categories)}
+
+
+def _paths_chunk(plan: Plan, chunk: int, start: int, stop: int) -> Dict[str, int]:
+    rng = np.random.default_rng([plan.seed, PATHS, chunk])
+    cat = _catalog
+    created = _timestamps(plan, rng, stop - start)
+    paths, links, path_quizzes = [], [], []
+    for i in range(start, stop):
+        path_id = plan.first_ids["paths"] + i
+        creator = plan.parent_id(i * plan.parents // plan.paths) if plan.parents else plan.admin_id
+        paths.append((path_id, f"Percorso {i + 1}", None, int(cat.path_bonus[i]), creator,
+                      created[i - start], created[i - start]))
+        quizzes = set()
+        while len(quizzes) < cat.path_sizes[i]:
+            quizzes.update(int(q) for q in sample(cat.quiz_cdf, rng, int(cat.path_sizes[i]) - len(quizzes)))
+        links.extend((plan.first_ids["quizzes"] + quiz, path_id) for quiz in sorted(quizzes))
+        # Copie dei quiz nel percorso, come le crea POST /path-quizzes/create
+        path_quizzes.extend(
+            (*_quiz_text(quiz), int(cat.points[quiz]), order, plan.first_ids["quizzes"] + quiz, path_id,
+             created[i - start], created[i - start])
+            for order, quiz in enumerate(sorted(quizzes))
+        )
+    with _engine.begin() as conn:
+        copy_rows(conn, Path.__table__, ("id", "name", "description", "bonus_points", "creator_id",
+                                         "created_at", "updated_at"), paths)
+        copy_rows(conn, quiz_path_association, ("quiz_id", "path_id"), links)
+        copy_rows(conn, PathQuiz.__table__, ("question", "options", "correct_answer", "explanation", "points",
+                                             "order", "original_quiz_id", "path_id", "created_at", "updated_at"),
+                  path_quizzes)
+    return {"paths": len(paths), "quiz_path_association": len(links), "path_quizzes": len(path_quizzes)}
+
+
+def _students_chunk(plan: Plan, chunk: int, start: int, stop: int) -> Dict[str, int]:
+    rng = np.random.default_rng([plan.seed, STUDENTS, chunk])
+    cat = _catalog
+    n = stop - start
+
+    # Tentativi: numero per studente a coda lunga, quiz secondo la popolarità
+    ability = rng.normal(0.8, 1.0, n)
+    activity = (rng.pareto(1.5, n) + 1) / 3  # media 1
+    counts = rng.poisson(plan.attempts * np.minimum(activity, MAX_ACTIVITY))
+    counts[rng.random(n) < INACTIVE_STUDENTS] = 0
+    if not plan.quizzes:
+        counts[:] = 0
+    owner = np.repeat(np.arange(n), counts)
+    quiz = sample(cat.quiz_cdf, rng, len(owner)) if plan.quizzes else owner
+    correct = rng.random(len(owner)) < 1 / (1 + np.exp(-(ability[owner] - cat.difficulty[quiz])))
+    earned = np.where(correct, cat.points[quiz], 0)
+    answer = cat.a[quiz] + cat.b[quiz] + np.where(correct, 0, rng.choice(WRONG_DELTAS, len(owner)))
+    created = np.array(_timestamps(plan, rng, len(owner)), dtype=object)
+    order = np.argsort(created, kind="stable")
+    attempts = [
+        (str(answer[j]), bool(correct[j]), int(earned[j]), bool(correct[j]), plan.student_id(start + int(owner[j])),
+         plan.first_ids["quizzes"] + int(quiz[j]), created[j], created[j])
+        for j in order
+    ]
+    balance = np.bincount(owner, weights=earned, minlength=n).astype("int64")
+
+    # Percorsi assegnati, con il bonus per quelli completati
+    progress = []
+    if plan.paths:
+        assigned = rng.choice(len(PATHS_PER_STUDENT_P), n, p=PATHS_PER_STUDENT_P)
+        for i in np.flatnonzero(assigned):
+            for path in sorted(set(int(p) for p in sample(cat.path_cdf, rng, int(assigned[i])))):
+                size = int(cat.path_sizes[path])
+                done = int(rng.integers(0, size + 1))
+                bonus = int(cat.path_bonus[path]) if done == size else 0
+                balance[i] += bonus
+                progress.append((bonus, 1, done, done == size, plan.student_id(start + int(i)),
+                                 plan.first_ids["paths"] + path))
+
+    # Negozio e acquisti entro i punti guadagnati
+    shops, purchases = [], []
+    purchase_times = iter(_timestamps(plan, rng, n * MAX_PURCHASES)) if plan.rewards else iter(())
+    for i in range(n if plan.rewards else 0):
+        student_id = plan.student_id(start + i)
+        shop = rng.choice(plan.rewards, min(int(rng.integers(*SHOP_SIZES)), plan.rewards), replace=False)
+        shops.extend((student_id, plan.first_ids["rewards"] + int(r), int(rng.integers(1, 6))) for r in shop)
+        wanted = min(int(rng.poisson(0.5 * balance[i] / cat.reward_costs.mean())), MAX_PURCHASES)
+        for reward in rng.choice(shop, wanted) if wanted else ():
+            cost = int(cat.reward_costs[reward])
+            if cost <= balance[i]:
+                balance[i] -= cost
+                when = next(purchase_times)
+                purchases.append((student_id, plan.first_ids["rewards"] + int(reward), cost,
+                                  bool(rng.random() < 0.7), when, when))
+
+    created_users = _signup_times(plan, rng, n)
+    students = [
+        _user_row(plan, plan.student_id(start + i), "student", start + i, int(balance[i]), created_users[i])
+        for i in range(n)
+    ]
+    families = [(plan.parent_id((start + i) * plan.parents // plan.students), plan.student_id(start + i))
+                for i in range(n)] if plan.parents else []
+    # Saldo iniziale nel registro, così ledger.reconcile non trova differenze
+    opening = [(plan.student_id(start + i), int(balance[i]), int(balance[i]), ledger.OPENING_BALANCE)
+               for i in range(n) if balance[i]]
+
+    with _engine.begin() as conn:
+        copy_rows(conn, User.__table__, USER_COLUMNS, students)
+        copy_rows(conn, points_ledger, ("user_id", "delta", "balance", "reason"), opening)
+        copy_rows(conn, parent_student_association, ("parent_id", "student_id"), families)
+        copy_rows(conn, UserProgress.__table__, ("points", "level", "completed_quizzes", "completed", "user_id",
+                                                 "path_id"), progress)
+        copy_rows(conn, user_reward_shop_association, ("user_id", "reward_id", "quantity"), shops)
+        copy_rows(conn, QuizAttempt.__table__, ("answer", "correct", "points_earned", "completed", "user_id",
+                                                "quiz_id", "created_at", "updated_at"), attempts)
+        copy_rows(conn, RewardPurchase.__table__, ("user_id", "reward_id", "point_cost", "is_delivered",
+                                                   "created_at", "updated_at"), purchases)
+    return {"users": len(students), "points_ledger": len(opening),
+            "parent_student_association": len(families), "user_progress": len(progress),
+            "user_reward_shop_association": len(shops), "quiz_attempts": len(attempts),
+            "reward_purchases": len(purchases)}
+
+
+def _run_chunk(job: Tuple) -> Dict[str, int]:
+    generate, plan, chunk, start, stop = job
+    return generate(plan, chunk, start, stop)
+
+
+def prepare(engine, plan: Plan) -> None:
+    """Legge gli id di partenza e crea admin, categorie, difficoltà e premi."""
+    with engine.begin() as conn:
+        for table in (User, Quiz, Path, Reward):
+            plan.first_ids[table.__tablename__] = (conn.scalar(select(func.max(table.id))) or 0) + 1
+
+        if not conn.scalar(select(func.count(Category.id))):
+            copy_rows(conn, Category.__table__, ("name",), [(name,) for name in DEFAULT_CATEGORIES])
+        if not conn.scalar(select(func.count(DifficultyLevel.id))):
+            copy_rows(conn, DifficultyLevel.__table__, ("name", "value"), list(DEFAULT_LEVELS))
+        plan.categories = list(conn.scalars(select(Category.id).order_by(Category.id)))
+        plan.levels = list(conn.scalars(select(DifficultyLevel.id).order_by(DifficultyLevel.value)))
+
+        created = plan.until - timedelta(days=plan.days + 1)
+        copy_rows(conn, User.__table__, USER_COLUMNS, [
+            (plan.admin_id, f"{plan.prefix}_admin", f"{plan.prefix}_admin@example.com", plan.password_hash,
+             "Amministratore", "admin", True, 0, created, created),
+        ])
+        costs = Catalog(plan).reward_costs
+        copy_rows(conn, Reward.__table__, ("id", "name", "description", "point_cost", "is_active", "creator_id",
+                                           "created_at", "updated_at"), [
+            (plan.first_ids["rewards"] + i, f"Premio {i + 1}", None, int(costs[i]), True, plan.admin_id,
+             created, created)
+            for i in range(plan.rewards)
+        ])
+
+
+def finish(engine) -> None:
+    """Riallinea le sequenze dopo gli id espliciti e aggiorna le statistiche del planner."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            for table in ("users", "quizzes", "paths", "rewards", "categories", "difficulty_levels"):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+                ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def run_phase(label: str, generate, plan: Plan, total: int, chunk_size: int, executor) -> Dict[str, int]:
+    jobs = [(generate, plan, chunk, start, min(start + chunk_size, total))
+            for chunk, start in enumerate(range(0, total, chunk_size))]
+    start_time = time.perf_counter()
+    rows: Dict[str, int] = {}
+    results = executor.map(_run_chunk, jobs) if executor else map(_run_chunk, jobs)
+    for done, result in enumerate(results, 1):
+        for table, count in result.items():
+            rows[table] = rows.get(table, 0) + count
+        print(f"\r  {label}: {done}/{len(jobs)} blocchi", end="", flush=True)
+    elapsed = time.perf_counter() - start_time
+    total_rows = sum(rows.values())
+    print(f"\r  {label}: {total_rows} righe in {elapsed:.1f} s ({total_rows / max(elapsed, 1e-9):,.0f} righe/s)  "
+          + ", ".join(f"{table}={count}" for table, count in rows.items()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera dati sintetici per i benchmark")
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--parents", type=int, help="default: uno ogni 2 studenti")
+    parser.add_argument("--quizzes", type=int, default=20_000)
+    parser.add_argument("--paths", type=int, help="default: uno ogni 20 studenti")
+    parser.add_argument("--rewards", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=40, help="tentativi medi per studente")
+    parser.add_argument("--days", type=int, default=365, help="giorni di storico")
+    parser.add_argument("--until", type=date.fromisoformat, default=date.today(),
+                        help="ultimo giorno dello storico (escluso)")
+    parser.add_argument("--seed", type=int, default=49)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="righe principali per blocco")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--prefix", default="load", help="prefisso degli username")
+    parser.add_argument("--create-tables", action="store_true", help="crea le tabelle mancanti")
+    args = parser.parse_args()
+
+    url = os.environ.get("BENCH_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    if not url:
+        parser.error("impostare BENCH_DATABASE_URL o DATABASE_URL")
+    plan = Plan(
+        url=url,
+        seed=args.seed,
+        until=datetime.combine(args.until, datetime.min.time()),
+        days=args.days,
+        chunk_size=args.chunk_size,
+        students=args.students,
+        parents=args.students // 2 if args.parents is None else args.parents,
+        quizzes=args.quizzes,
+        paths=max(1, args.students // 20) if args.paths is None else args.paths,
+        rewards=args.rewards,
+        attempts=args.attempts,
+        prefix=args.prefix,
+        # Stessa password per tutti: l'hash bcrypt viene calcolato una volta sola
+        password_hash=get_password_hash(PASSWORD),
+    )
+    if plan.paths and not plan.quizzes:
+        parser.error("i percorsi richiedono almeno un quiz (--quizzes)")
+
+    engine = create_engine(url, poolclass=NullPool)
+    if args.create_tables:
+        Base.metadata.create_all(bind=engine)
+    workers = args.workers
+    if engine.dialect.name == "sqlite" and workers > 1:
+        print("SQLite ammette un solo scrittore: uso un solo processo")
+        workers = 1
+
+    start = time.perf_counter()
+    prepare(engine, plan)
+    print(f"Generazione su {engine.url.render_as_string(hide_password=True)} con {workers} processi "
+          f"(seed {plan.seed}, primo id utente {plan.first_ids['users']})")
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(plan,)) if workers > 1 else None
+    if executor is None:
+        _init_worker(plan)
+    try:
+        # Ordine dettato dalle chiavi esterne
+        rows = {}
+        for label, generate, total, chunk_size in (
+            ("genitori", _parents_chunk, plan.parents, plan.chunk_size),
+            ("quiz", _quizzes_chunk, plan.quizzes, plan.chunk_size),
+            ("percorsi", _paths_chunk, plan.paths, max(1, plan.chunk_size // 10)),
+            ("studenti", _students_chunk, plan.students, max(1, plan.chunk_size // 10)),
+        ):
+            for table, count in run_phase(label, generate, plan, total, chunk_size, executor).items():
+                rows[table] = rows.get(table, 0) + count
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    finish(engine)
+    print(f"Completato in {time.perf_counter() - start:.1f} s: {sum(rows.values())} righe")
+
+
+if __name__ == "__main__":
+    main()
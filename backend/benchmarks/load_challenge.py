@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test di carico di una sfida giocata contemporaneamente da molti studenti.
+
+Ogni studente (1000 per default) avvia il tentativo, risponde a tutti i quiz
+del percorso e completa la sfida, usando direttamente le funzioni degli
+endpoint (POST /challenges/attempt, POST /quizzes/attempt con
+challenge_attempt_id, PUT /challenges/attempt/{id}/complete) da un pool di
+thread, ognuno con la propria sessione. Al termine stampa i percentili di
+latenza per operazione e verifica che:
+  - tutti i tentativi siano completati;
+  - i contatori di ogni tentativo coincidano con le risposte registrate;
+  - il bonus sia stato accreditato solo a chi ha risposto bene a tutto.
+
+Uso:
+    python benchmarks/load_challenge.py [--students 1000] [--quizzes 10] [--workers 32]
+
+Per default usa un file SQLite temporaneo; impostare BENCH_DATABASE_URL per
+eseguirlo su PostgreSQL. Esce con codice 1 se una delle verifiche fallisce.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import case, create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.api import challenges as challenges_api
+from app.api import quizzes as quizzes_api
+from app.models import Base, User
+from app.models.challenge import Challenge, QuizAttempt, UserChallenge
+from app.models.quiz import Path, Quiz
+from app.schemas.challenge import UserChallengeCreate
+from app.schemas.quiz import QuizAttemptCreate
+
+BONUS_POINTS = 25
+
+
+def seed(db, n_students, n_quizzes):
+    admin = User(username="load_admin", email="load_admin@example.com",
+                 hashed_password="x", role="admin")
+    parent = User(username="load_parent", email="load_parent@example.com",
+                  hashed_password="x", role="parent")
+    db.add_all([admin, parent])
+    db.commit()
+
+    quizzes = [
+        Quiz(question=f"Domanda {i}", options=["a", "b", "c"], correct_answer="a",
+             points=10, creator_id=admin.id)
+        for i in range(n_quizzes)
+    ]
+    path = Path(name="Percorso sfida", bonus_points=BONUS_POINTS, creator_id=parent.id, quizzes=quizzes)
+    db.add(path)
+    db.commit()
+
+    challenge = Challenge(
+        name="Sfida di carico",
+        start_date=datetime.now() - timedelta(hours=1),
+        end_date=datetime.now() + timedelta(hours=1),
+        path_id=path.id,
+        creator_id=parent.id,
+    )
+    db.add(challenge)
+
+    students = [
+        User(username=f"load_student_{i}", email=f"load_student_{i}@example.com",
+             hashed_password="x", role="student", points=0)
+        for i in range(n_students)
+    ]
+    db.add_all(students)
+    db.commit()
+    return challenge.id, [quiz.id for quiz in quizzes], [student.id for student in students]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--quizzes", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--accuracy", type=float, default=0.8, help="probabilità di risposta corretta")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load_challenge.db")
+    connect_args = {"check_same_thread": False, "timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=args.workers, max_overflow=0)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    with Session() as db:
+        challenge_id, quiz_ids, student_ids = seed(db, args.students, args.quizzes)
+
+    rng = random.Random(args.seed)
+    answers = {
+        student_id: ["a" if rng.random() < args.accuracy else "b" for _ in quiz_ids]
+        for student_id in student_ids
+    }
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def timed(operation, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        except HTTPException as e:
+            errors[f"{operation}: {e.status_code} {e.detail}"] += 1
+            raise
+        finally:
+            latencies[operation].append((time.perf_counter() - start) * 1000)
+
+    def play(student_id):
+        with Session() as db:
+            student = db.get(User, student_id)
+            attempt = timed("avvio", lambda: challenges_api.create_challenge_attempt(
+                db=db, attempt_in=UserChallengeCreate(challenge_id=challenge_id), current_user=student
+            ))
+            attempt_id = attempt.id
+            for quiz_id, answer in zip(quiz_ids, answers[student_id]):
+                timed("risposta", lambda: quizzes_api.create_quiz_attempt(
+                    db=db,
+                    attempt_in=QuizAttemptCreate(quiz_id=quiz_id, answer=answer,
+                                                 challenge_attempt_id=attempt_id),
+                    current_user=student,
+                ))
+            timed("completamento", lambda: challenges_api.complete_challenge_attempt(
+                attempt_id=attempt_id, db=db, current_user=student
+            ))
+
+    # L'endpoint dei quiz stampa molti messaggi di debug: li scartiamo durante il test
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(lambda sid: _safe(play, sid), student_ids))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.students} studenti x {args.quizzes} quiz, {args.workers} thread, {engine.dialect.name}")
+    print(f"Tempo totale: {elapsed:.1f} s, {sum(len(v) for v in latencies.values()) / elapsed:.0f} operazioni/s\n")
+    print(f"{'operazione':<16}{'n':>8}{'media':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for operation in ("avvio", "risposta", "completamento"):
+        values = latencies[operation]
+        if values:
+            print(f"{operation:<16}{len(values):>8}{statistics.mean(values):>10.2f}"
+                  f"{percentile(values, 0.5):>10.2f}{percentile(values, 0.95):>10.2f}"
+                  f"{percentile(values, 0.99):>10.2f}")
+    for error, count in sorted(errors.items()):
+        print(f"  errore {error}: {count}")
+
+    with Session() as db:
+        attempts = db.query(UserChallenge).filter(UserChallenge.challenge_id == challenge_id).all()
+        recorded = {
+            attempt_id: (attempted, correct, points or 0)
+            for attempt_id, attempted, correct, points in db.query(
+                QuizAttempt.challenge_attempt_id,
+                func.count(QuizAttempt.id),
+                func.sum(case((QuizAttempt.correct == True, 1), else_=0)),
+                func.sum(case((QuizAttempt.correct == True, QuizAttempt.points_earned), else_=0)),
+            ).filter(QuizAttempt.challenge_attempt_id.isnot(None)).group_by(QuizAttempt.challenge_attempt_id)
+        }
+        points = dict(db.query(User.id, User.points).filter(User.id.in_(student_ids)))
+
+    def expected_points(attempt):
+        bonus = BONUS_POINTS if attempt.correct_answers == len(quiz_ids) else 0
+        return attempt.quiz_points + bonus
+
+    checks = {
+        "nessun errore": not errors and all(results),
+        "un tentativo completato per studente": len(attempts) == args.students and all(a.completed for a in attempts),
+        "contatori = risposte registrate": all(
+            recorded.get(a.id, (0, 0, 0)) == (a.attempted_quizzes, a.correct_answers, a.quiz_points)
+            for a in attempts
+        ),
+        "punti del tentativo = quiz + bonus": all(a.points_earned == expected_points(a) for a in attempts),
+        "saldo studenti = punti delle sfide": all(
+            points[a.user_id] == expected_points(a) for a in attempts
+        ),
+    }
+    print()
+    for name, passed in checks.items():
+        print(f"  [{'OK' if passed else 'FALLITO'}] {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+def _safe(fn, *args):
+    try:
+        fn(*args)
+        return True
+    except HTTPException:
+        return False
+
+
+if __name__ == "__main__":
+    main()
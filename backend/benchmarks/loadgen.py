@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Generatore di carico HTTP che simula una classe (asyncio + httpx).
+
+Ogni utente virtuale fa login e poi ripete, con una pausa casuale tra un
+flusso e l'altro, i flussi reali dell'interfaccia:
+  studenti
+    - browse: elenco dei quiz (una pagina a caso) e dettaglio di un quiz;
+    - answer: una pagina di quiz e 3-5 risposte (POST /quizzes/attempt);
+    - paths: GET /paths/my-paths e risposta al prossimo quiz del percorso
+      (POST /quizzes/attempt e POST /paths/complete-quiz/{path}/{quiz});
+    - path_quizzes: un percorso assegnato (GET /paths/assigned/{studente}), i
+      suoi quiz e quelli già completati, e la risposta al prossimo
+      (POST /path-quizzes/attempt);
+    - shop: negozio, storico acquisti e, una volta su tre, un acquisto;
+  genitori
+    - progress: GET /progress/children, il progresso di un figlio e la
+      classifica dei figli.
+
+Gli utenti partono in modo scaglionato durante --ramp-up (il login di massa
+è misurato come flusso a sé). Al termine stampa per ogni richiesta e per ogni
+flusso: numero, errori, richieste al secondo e percentili di latenza;
+--json salva lo stesso report su file.
+
+Il server deve essere già avviato (es. gunicorn, vedi gunicorn.conf.py) su un
+database popolato con gli utenti di carico:
+
+    python seed_db.py --load-students 1000 --load-parents 100
+
+Uso:
+    python benchmarks/loadgen.py [--base-url http://localhost:8000] [--students 200] [--parents 20]
+                                 [--duration 60] [--ramp-up 10] [--think-time 1.0]
+                                 [--scenarios browse,answer,paths,path_quizzes,shop,progress] [--json report.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+API = "/api/v1"
+PASSWORD = "load"
+
+# Peso dei flussi degli studenti
+STUDENT_SCENARIOS = {"browse": 4, "answer": 4, "paths": 2, "path_quizzes": 2, "shop": 1}
+PARENT_SCENARIOS = {"progress": 1}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+class Recorder:
+    """Latenze per richiesta (metodo + template) e per flusso"""
+
+    def __init__(self):
+        self.requests: Dict[str, List[float]] = defaultdict(list)
+        self.request_errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.scenarios: Dict[str, List[float]] = defaultdict(list)
+        self.scenario_errors: Dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def summary(self) -> Dict[str, Dict]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+
+        def stats(latencies: List[float], errors: int) -> Dict:
+            values = sorted(latencies)
+            return {
+                "count": len(values),
+                "errors": errors,
+                "rps": round(len(values) / elapsed, 2) if elapsed else 0,
+                **{f"p{p}": round(percentile(values, p) * 1000, 1) for p in (50, 90, 95, 99)},
+                "max": round(values[-1] * 1000, 1) if values else 0,
+            }
+
+        return {
+            "elapsed_seconds": round(elapsed, 1),
+            "requests": {name: {**stats(values, self.request_errors[name]),
+                                "status": dict(self.status_codes[name])}
+                         for name, values in sorted(self.requests.items())},
+            "scenarios": {name: stats(values, self.scenario_errors[name])
+                          for name, values in sorted(self.scenarios.items())},
+        }
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, username: str, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.user_id: Optional[int] = None
+
+    async def call(self, method: str, name: str, url: str, expected=(200, 201), **kwargs):
+        """Esegue una richiesta registrandone la latenza sotto `name` (template senza id)."""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, API + url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.requests[name].append(time.perf_counter() - start)
+            self.recorder.request_errors[name] += 1
+            self.recorder.status_codes[name][0] += 1
+            raise ScenarioError(f"{name}: {type(e).__name__}")
+        self.recorder.requests[name].append(time.perf_counter() - start)
+        self.recorder.status_codes[name][response.status_code] += 1
+        if response.status_code not in expected:
+            self.recorder.request_errors[name] += 1
+            raise ScenarioError(f"{name}: HTTP {response.status_code}")
+        return response.json() if response.content else None
+
+    async def run_scenario(self, name: str, flow) -> None:
+        start = time.perf_counter()
+        try:
+            await flow()
+        except ScenarioError:
+            self.recorder.scenario_errors[name] += 1
+        self.recorder.scenarios[name].append(time.perf_counter() - start)
+
+    # Flussi
+
+    async def login(self) -> None:
+        token = await self.call("POST", "POST /login", "/login",
+                                data={"username": self.username, "password": PASSWORD})
+        self.headers = {"Authorization": f"Bearer {token['access_token']}"}
+        me = await self.call("GET", "GET /users/me", "/users/me")
+        self.user_id = me["id"]
+
+    async def browse(self) -> None:
+        page = await self.call("GET", "GET /quizzes/", "/quizzes/",
+                               params={"skip": self.rng.randint(0, 5) * 20, "limit": 20})
+        if page["quizzes"]:
+            quiz = self.rng.choice(page["quizzes"])
+            await self.call("GET", "GET /quizzes/{quiz_id}", f"/quizzes/{quiz['id']}")
+
+    async def answer_quiz(self, quiz: Dict) -> Dict:
+        # Risposta corretta due volte su tre
+        answer = quiz["correct_answer"] if self.rng.random() < 0.66 else self.rng.choice(quiz["options"])
+        return await self.call("POST", "POST /quizzes/attempt", "/quizzes/attempt",
+                               json={"quiz_id": quiz["id"], "answer": answer})
+
+    async def answer(self) -> None:
+        page = await self.call("GET", "GET /quizzes/", "/quizzes/",
+                               params={"skip": self.rng.randint(0, 10) * 10, "limit": 10})
+        for quiz in self.rng.sample(page["quizzes"], min(len(page["quizzes"]), self.rng.randint(3, 5))):
+            await self.answer_quiz(quiz)
+
+    async def paths(self) -> None:
+        paths = await self.call("GET", "GET /paths/my-paths", "/paths/my-paths")
+        for path in paths:
+            if not path["quizzes"]:
+                continue
+            completed = set(await self.call("GET", "GET /paths/student/{path_id}/completed-quizzes",
+                                            f"/paths/student/{path['template_id']}/completed-quizzes"))
+            pending = [quiz for quiz in path["quizzes"] if quiz["id"] not in completed]
+            if pending:
+                quiz = pending[0]
+                await self.answer_quiz(quiz)
+                await self.call("POST", "POST /paths/complete-quiz/{path_id}/{quiz_id}",
+                                f"/paths/complete-quiz/{path['template_id']}/{quiz['id']}")
+                return
+
+    async def path_quizzes(self) -> None:
+        paths = await self.call("GET", "GET /paths/assigned/{student_id}", f"/paths/assigned/{self.user_id}")
+        if not paths:
+            return
+        path_id = self.rng.choice(paths)["id"]
+        quizzes = await self.call("GET", "GET /path-quizzes/path/{path_id}", f"/path-quizzes/path/{path_id}")
+        completed = set(await self.call("GET", "GET /path-quizzes/completed/{path_id}",
+                                        f"/path-quizzes/completed/{path_id}"))
+        pending = [quiz for quiz in quizzes if quiz["id"] not in completed]
+        if pending:
+            quiz = pending[0]
+            # Risposta corretta due volte su tre, come in answer_quiz
+            answer = quiz["correct_answer"] if self.rng.random() < 0.66 else self.rng.choice(quiz["options"])
+            await self.call("POST", "POST /path-quizzes/attempt", "/path-quizzes/attempt",
+                            json={"path_quiz_id": quiz["id"], "answer": answer})
+
+    async def shop(self) -> None:
+        shop = await self.call("GET", "GET /student/shop/", "/student/shop/")
+        await self.call("GET", "GET /student/purchases/", "/student/purchases/")
+        if shop and self.rng.random() < 1 / 3:
+            reward = self.rng.choice(shop)
+            # 400 = punti insufficienti: risposta attesa, non un errore del server
+            await self.call("POST", "POST /student/purchase/", "/student/purchase/",
+                            json={"reward_id": reward["id"]}, expected=(200, 400))
+
+    async def progress(self) -> None:
+        children = await self.call("GET", "GET /progress/children", "/progress/children")
+        if children["children"]:
+            child = self.rng.choice(children["children"])
+            await self.call("GET", "GET /progress/student/{student_id}", f"/progress/student/{child['id']}")
+        await self.call("GET", "GET /leaderboard/parent/{parent_id}", f"/leaderboard/parent/{self.user_id}")
+
+    async def run(self, scenarios: Dict[str, int], deadline: float, think_time: float) -> None:
+        await self.run_scenario("login", self.login)
+        if not self.headers:
+            return
+        flows = {name: getattr(self, name) for name in scenarios}
+        names, weights = list(scenarios), list(scenarios.values())
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            await self.run_scenario(name, flows[name])
+            # Pausa esponenziale, come il tempo di lettura di un utente reale
+            await asyncio.sleep(min(self.rng.expovariate(1 / think_time), deadline - time.perf_counter())
+                                if think_time > 0 else 0)
+
+
+async def run_load(args) -> Recorder:
+    selected = set(args.scenarios.split(","))
+    student_scenarios = {name: weight for name, weight in STUDENT_SCENARIOS.items() if name in selected}
+    parent_scenarios = {name: weight for name, weight in PARENT_SCENARIOS.items() if name in selected}
+
+    users = []
+    if student_scenarios:
+        users += [(f"load_student_{i}", student_scenarios) for i in range(1, args.students + 1)]
+    if parent_scenarios:
+        users += [(f"load_parent_{i}", parent_scenarios) for i in range(1, args.parents + 1)]
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=len(users), max_keepalive_connections=len(users))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.ramp_up + args.duration
+
+        async def start_user(n: int, username: str, scenarios: Dict[str, int]) -> None:
+            # Partenze distribuite uniformemente sul ramp-up
+            await asyncio.sleep(args.ramp_up * n / max(len(users), 1))
+            user = VirtualUser(client, recorder, username, random.Random(f"{args.seed}-{username}"))
+            await user.run(scenarios, deadline, args.think_time)
+
+        await asyncio.gather(*(start_user(n, username, scenarios)
+                               for n, (username, scenarios) in enumerate(users)))
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def print_report(summary: Dict) -> None:
+    header = f"{'count':>8}{'err':>6}{'rps':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    for section, title in (("scenarios", "flusso"), ("requests", "richiesta")):
+        print(f"\n{title:<48}{header}   (ms)")
+        for name, row in summary[section].items():
+            print(f"{name:<48}{row['count']:>8}{row['errors']:>6}{row['rps']:>8.1f}"
+                  f"{row['p50']:>9.1f}{row['p90']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}{row['max']:>9.1f}")
+    total = sum(row["count"] for row in summary["requests"].values())
+    errors = sum(row["errors"] for row in summary["requests"].values())
+    print(f"\n{total} richieste in {summary['elapsed_seconds']} s "
+          f"({total / summary['elapsed_seconds']:.1f}/s), {errors} errori")
+    for name, row in summary["requests"].items():
+        failures = {code: n for code, n in row["status"].items() if code not in (200, 201)}
+        if failures:
+            print(f"  {name}: {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--parents", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60, help="secondi di carico dopo il ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=10)
+    parser.add_argument("--think-time", type=float, default=1.0, help="pausa media tra due flussi (s)")
+    parser.add_argument("--scenarios", default=",".join([*STUDENT_SCENARIOS, *PARENT_SCENARIOS]))
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=48)
+    parser.add_argument("--json", help="salva il report in formato JSON")
+    args = parser.parse_args()
+
+    recorder = asyncio.run(run_load(args))
+    summary = recorder.summary()
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    total = sum(row["count"] for row in summary["requests"].values())
+    sys.exit(1 if total == 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Stress test degli acquisti concorrenti nel negozio premi.
+
+Più thread, ognuno con la propria sessione, acquistano lo stesso premio per lo
+stesso studente nello stesso momento. Alla fine verifica che:
+  - i punti dello studente non siano mai negativi;
+  - i punti spesi coincidano con la somma degli acquisti registrati;
+  - non siano stati venduti più pezzi di quelli presenti nel negozio.
+
+Uso:
+    python benchmarks/stress_purchase.py [--threads 32] [--attempts 20]
+                                         [--points 500] [--cost 30] [--quantity 40]
+
+Per default usa un file SQLite temporaneo; impostare BENCH_DATABASE_URL per
+eseguirlo su PostgreSQL, dove le transazioni sono davvero concorrenti.
+Esce con codice 1 se una delle verifiche fallisce. Le stesse verifiche, in
+scala ridotta, sono in tests/test_purchase_concurrency.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User
+from app.models.reward import Reward, RewardPurchase, user_reward_shop_association
+from app.services import shop
+
+
+def seed(db, points, cost, quantity):
+    suffix = os.getpid()
+    admin = User(username=f"stress_admin_{suffix}", email=f"stress_admin_{suffix}@example.com",
+                 hashed_password="x", role="admin")
+    student = User(username=f"stress_student_{suffix}", email=f"stress_student_{suffix}@example.com",
+                   hashed_password="x", role="student", points=points)
+    db.add_all([admin, student])
+    db.commit()
+
+    reward = Reward(name="Premio conteso", point_cost=cost, creator_id=admin.id)
+    db.add(reward)
+    db.commit()
+
+    db.execute(user_reward_shop_association.insert().values(
+        user_id=student.id, reward_id=reward.id, quantity=quantity
+    ))
+    db.commit()
+    return student.id, reward.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=20, help="acquisti tentati da ogni thread")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--cost", type=int, default=30)
+    parser.add_argument("--quantity", type=int, default=40)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "stress_purchase.db")
+    connect_args = {"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=args.threads, max_overflow=0)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    with Session() as db:
+        student_id, reward_id = seed(db, args.points, args.cost, args.quantity)
+
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(args.attempts):
+            with Session() as db:
+                try:
+                    shop.purchase(db, student_id, reward_id)
+                    outcome = "ok"
+                except shop.PurchaseError as e:
+                    outcome = f"{e.status_code} {e.detail.split('.')[0]}"
+                except OperationalError:
+                    # SQLite: database bloccato oltre il timeout
+                    db.rollback()
+                    outcome = "lock timeout"
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session() as db:
+        final_points = db.query(User.points).filter(User.id == student_id).scalar()
+        purchases, spent = db.query(
+            func.count(RewardPurchase.id), func.coalesce(func.sum(RewardPurchase.point_cost), 0)
+        ).filter(RewardPurchase.user_id == student_id).one()
+        left = db.query(user_reward_shop_association.c.quantity).filter(
+            user_reward_shop_association.c.user_id == student_id,
+            user_reward_shop_association.c.reward_id == reward_id
+        ).scalar() or 0
+
+    expected = min(args.points // args.cost, args.quantity)
+    print(f"{args.threads} thread x {args.attempts} tentativi su {engine.dialect.name}")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:<40} {count}")
+    print(f"\nAcquisti registrati: {purchases} (attesi {expected})")
+    print(f"Punti: iniziali {args.points}, spesi {spent}, finali {final_points}")
+    print(f"Quantità rimasta nel negozio: {left} di {args.quantity}")
+
+    checks = {
+        "punti mai negativi": final_points >= 0,
+        "punti spesi = punti scalati": args.points - final_points == spent,
+        "nessun pezzo venduto in più": purchases + left == args.quantity and purchases <= args.quantity,
+        "acquisti attesi completati": purchases == expected or outcomes["lock timeout"] > 0,
+    }
+    print()
+    for name, passed in checks.items():
+        print(f"  [{'OK' if passed else 'FALLITO'}] {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Configurazione di gunicorn per la produzione (worker uvicorn).
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Variabili d'ambiente:
+    WEB_CONCURRENCY          numero di worker (default: 2 * CPU + 1, al massimo 12)
+    PORT                     porta di ascolto (default 8000)
+    DB_MAX_CONNECTIONS       max_connections di PostgreSQL (default 100)
+    DB_RESERVED_CONNECTIONS  connessioni lasciate a migrazioni, psql, pgAdmin (default 10)
+    GUNICORN_MAX_REQUESTS    richieste dopo cui un worker viene riciclato (default 2000)
+    METRICS_DIR              directory dove i worker scrivono le metriche (default in /dev/shm)
+    METRICS_TOKEN            bearer token per GET /metrics (senza, /metrics risponde 404)
+
+L'applicazione è caricata nel master prima del fork (preload_app), così il
+codice e gli indici importati sono condivisi copy-on-write tra i worker;
+l'import non apre connessioni al database, che vengono aperte dal lifespan di
+ogni worker. Il pool di ogni worker (DB_POOL_SIZE + DB_MAX_OVERFLOW) è
+calcolato in modo che worker × pool resti sotto max_connections, salvo che le
+due variabili siano già impostate.
+
+Cache in memoria: ogni worker ha le sue, aggiornate subito solo dalle
+modifiche che passano da quel worker. Le modifiche fatte da un altro worker
+diventano visibili al più dopo (impostazioni in app/core/config.py):
+    negozio dello studente          SHOP_CACHE_TTL_SECONDS (30 s)
+    snapshot dei percorsi           PATH_SNAPSHOT_TTL_SECONDS (60 s)
+    classifiche                     LEADERBOARD_REFRESH_SECONDS (60 s, +20% di jitter)
+    finestre delle sfide            CHALLENGE_SCHEDULE_REFRESH_SECONDS (60 s, +20% di jitter)
+    aggregati delle statistiche     ANALYTICS_REFRESH_SECONDS (60 s)
+    catalogo delle raccomandazioni  RECOMMENDATION_REFRESH_SECONDS (300 s, +20% di jitter)
+    padronanza degli studenti       RECOMMENDATION_MASTERY_TTL_SECONDS (300 s)
+    indice di ricerca               QUIZ_SEARCH_REFRESH_SECONDS (300 s, solo senza tsvector)
+    id degli amministratori         ADMIN_IDS_TTL_SECONDS in app/core/authz.py (300 s)
+I punti e gli acquisti sono letti e scritti sempre sul database.
+
+Metriche: ogni worker scrive i suoi contatori in METRICS_DIR e GET /metrics
+risponde con la somma di tutti i worker; il master svuota la directory
+all'avvio e archivia i contatori dei worker che escono (app/core/metrics.py).
+
+Riavvio graduale: `kill -HUP <pid del master>` avvia nuovi worker e chiude i
+vecchi dopo le richieste in corso (con preload il codice non viene ricaricato:
+per un nuovo deploy si riavvia il container).
+"""
+import multiprocessing
+import os
+import tempfile
+
+workers = int(os.getenv("WEB_CONCURRENCY", min(2 * multiprocessing.cpu_count() + 1, 12)))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+preload_app = True
+
+# Riciclo dei worker contro la crescita della memoria; il jitter evita che si riavviino tutti insieme
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# Heartbeat dei worker in memoria invece che sul filesystem del container
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+forwarded_allow_ips = "*"
+accesslog = "-"
+
+
+def _pool_per_worker(workers: int) -> tuple:
+    """(pool_size, max_overflow) per worker entro max_connections."""
+    available = int(os.getenv("DB_MAX_CONNECTIONS", 100)) - int(os.getenv("DB_RESERVED_CONNECTIONS", 10))
+    per_worker = max(available // workers, 1)
+    pool_size = min(5, per_worker)
+    return pool_size, per_worker - pool_size
+
+
+if "DB_POOL_SIZE" not in os.environ and "DB_MAX_OVERFLOW" not in os.environ:
+    # Letti da app.core.config al preload dell'applicazione
+    _pool_size, _max_overflow = _pool_per_worker(workers)
+    os.environ["DB_POOL_SIZE"] = str(_pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(_max_overflow)
+
+# Letta da app.core.config al preload dell'applicazione; una per container
+os.environ.setdefault("METRICS_DIR", os.path.join(worker_tmp_dir or tempfile.gettempdir(), "quiz-app-metrics"))
+
+
+def on_starting(server):
+    # I contatori di un'esecuzione precedente non vanno sommati a quelli nuovi
+    from app.core.metrics import reset_directory
+    reset_directory(os.environ["METRICS_DIR"])
+
+
+def when_ready(server):
+    server.log.info(
+        "%d worker, pool per worker %s + %s overflow",
+        workers, os.environ.get("DB_POOL_SIZE"), os.environ.get("DB_MAX_OVERFLOW"),
+    )
+
+
+def post_fork(server, worker):
+    # Il worker non deve riusare connessioni eventualmente aperte dal master
+    from app.db.session import engine
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # I contatori del worker uscito passano nell'archivio, così i totali non calano
+    from app.core.metrics import mark_process_dead
+    mark_process_dead(os.environ["METRICS_DIR"], worker.pid)
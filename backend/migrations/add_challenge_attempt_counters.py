@@ -0,0 +1,88 @@
+"""
+Migrazione per il sistema dei tentativi di sfida.
+
+- aggiunge a 'user_challenges' le colonne start_time, completed_time e i
+  contatori total_quizzes, attempted_quizzes, correct_answers, quiz_points;
+- aggiunge a 'quiz_attempts' la colonna challenge_attempt_id;
+- crea gli indici compositi e il vincolo univoco (challenge_attempt_id, quiz_id).
+
+I contatori dei tentativi già esistenti vengono ricalcolati dalle risposte.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+STATEMENTS = [
+    ("Aggiunta delle colonne a 'user_challenges'...", """
+        ALTER TABLE user_challenges
+        ADD COLUMN IF NOT EXISTS start_time TIMESTAMP NOT NULL DEFAULT now(),
+        ADD COLUMN IF NOT EXISTS completed_time TIMESTAMP DEFAULT NULL,
+        ADD COLUMN IF NOT EXISTS total_quizzes INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS attempted_quizzes INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS correct_answers INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS quiz_points INTEGER NOT NULL DEFAULT 0;
+    """),
+    ("Valori mancanti di 'completed'...", """
+        UPDATE user_challenges SET completed = false WHERE completed IS NULL;
+        ALTER TABLE user_challenges ALTER COLUMN completed SET NOT NULL;
+    """),
+    ("Aggiunta della colonna 'challenge_attempt_id' a 'quiz_attempts'...", """
+        ALTER TABLE quiz_attempts
+        ADD COLUMN IF NOT EXISTS challenge_attempt_id INTEGER
+        REFERENCES user_challenges(id) DEFAULT NULL;
+    """),
+    ("Creazione degli indici...", """
+        CREATE INDEX IF NOT EXISTS ix_user_challenges_user_challenge_completed
+            ON user_challenges (user_id, challenge_id, completed);
+        CREATE INDEX IF NOT EXISTS ix_user_challenges_challenge_completed
+            ON user_challenges (challenge_id, completed);
+        CREATE INDEX IF NOT EXISTS ix_quiz_attempts_user_quiz
+            ON quiz_attempts (user_id, quiz_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_quiz_attempts_challenge_quiz
+            ON quiz_attempts (challenge_attempt_id, quiz_id);
+    """),
+    ("Ricalcolo dei contatori dei tentativi esistenti...", """
+        UPDATE user_challenges uc SET total_quizzes = (
+            SELECT COUNT(*) FROM quiz_path_association qpa
+            JOIN challenges c ON c.path_id = qpa.path_id
+            WHERE c.id = uc.challenge_id
+        );
+        UPDATE user_challenges uc SET
+            attempted_quizzes = agg.attempted,
+            correct_answers = agg.correct,
+            quiz_points = agg.points
+        FROM (
+            SELECT challenge_attempt_id,
+                   COUNT(*) AS attempted,
+                   COUNT(*) FILTER (WHERE correct) AS correct,
+                   COALESCE(SUM(points_earned), 0) AS points
+            FROM quiz_attempts
+            WHERE challenge_attempt_id IS NOT NULL
+            GROUP BY challenge_attempt_id
+        ) agg
+        WHERE agg.challenge_attempt_id = uc.id;
+    """),
+]
+
+try:
+    with engine.begin() as conn:
+        for message, statement in STATEMENTS:
+            print(message)
+            conn.execute(text(statement))
+        print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
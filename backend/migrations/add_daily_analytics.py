@@ -0,0 +1,63 @@
+"""
+Migrazione per creare le tabelle degli aggregati giornalieri usati dagli
+analytics dell'amministratore ('daily_activity', 'daily_active_students',
+'analytics_watermarks') e popolarle con lo storico esistente.
+
+Il popolamento è lo stesso aggiornamento incrementale eseguito dall'endpoint,
+a blocchi di ANALYTICS_BATCH_SIZE id: la migrazione può essere interrotta e
+rilanciata, riprende dall'ultimo blocco salvato.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services import analytics
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+TABLES = {
+    "daily_activity": """
+        day DATE PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct_answers INTEGER NOT NULL DEFAULT 0,
+        points_earned INTEGER NOT NULL DEFAULT 0,
+        purchases INTEGER NOT NULL DEFAULT 0,
+        points_spent INTEGER NOT NULL DEFAULT 0
+    """,
+    "daily_active_students": """
+        day DATE NOT NULL,
+        user_id INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id)
+    """,
+    "analytics_watermarks": """
+        source VARCHAR PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0
+    """,
+}
+
+try:
+    with engine.begin() as conn:
+        for name, columns in TABLES.items():
+            print(f"Creazione della tabella '{name}'...")
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} ({columns})"))
+
+    print("Calcolo degli aggregati dallo storico...")
+    with Session(engine) as db:
+        batches = analytics.refresh(db)
+    print(f"Blocchi elaborati: {batches}")
+    print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
@@ -0,0 +1,60 @@
+"""
+Migrazione per garantire un solo tentativo in corso per studente e sfida:
+crea l'indice univoco parziale 'uq_user_challenges_open_attempt' su
+user_challenges (user_id, challenge_id) WHERE completed = false.
+
+I duplicati già presenti (tentativi aperti insieme da richieste concorrenti)
+vengono chiusi prima di creare l'indice: per ogni studente e sfida resta
+aperto il tentativo con più risposte (a parità, il primo creato); gli altri
+vengono segnati come completati senza punti, le loro risposte restano
+collegate. Il tempo di completamento è nullo, per distinguerli.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+STATEMENTS = [
+    ("Chiusura dei tentativi in corso duplicati...", """
+        UPDATE user_challenges SET completed = true, points_earned = 0
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, challenge_id
+                    ORDER BY attempted_quizzes DESC, id
+                ) AS position
+                FROM user_challenges
+                WHERE completed = false
+            ) open_attempts
+            WHERE position > 1
+        );
+    """),
+    ("Creazione dell'indice 'uq_user_challenges_open_attempt'...", """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_user_challenges_open_attempt
+            ON user_challenges (user_id, challenge_id) WHERE completed = false;
+    """),
+]
+
+try:
+    with engine.begin() as conn:
+        for message, statement in STATEMENTS:
+            print(message)
+            result = conn.execute(text(statement))
+            if result.rowcount > 0:
+                print(f"  Righe modificate: {result.rowcount}")
+        print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
@@ -0,0 +1,37 @@
+"""
+Migrazione per creare le tabelle delle copie dei quiz nei percorsi
+('student_paths', 'path_quizzes', 'path_quiz_attempts') usate da
+app/api/paths.py e app/api/path_quizzes.py.
+
+Le tabelle e gli indici sono quelli dei modelli; la migrazione può essere
+rilanciata, crea solo ciò che manca. I percorsi già assegnati si convertono
+poi con POST /api/v1/paths/migrate-to-student-paths.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from app.core.config import settings
+from app.models import PathQuiz, PathQuizAttempt, StudentPath
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+try:
+    with engine.begin() as conn:
+        # Ordine delle chiavi esterne: path_quizzes riferisce student_paths
+        for model in (StudentPath, PathQuiz, PathQuizAttempt):
+            print(f"Creazione della tabella '{model.__tablename__}'...")
+            model.__table__.create(bind=conn, checkfirst=True)
+    print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
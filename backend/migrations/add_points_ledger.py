@@ -0,0 +1,43 @@
+"""
+Migrazione per creare il registro dei punti ('points_ledger') in cui
+app.services.ledger registra ogni variazione di users.points, e aprirlo con
+il saldo attuale di ogni studente.
+
+Il saldo iniziale è la riconciliazione del registro con users.points
+(motivo 'opening_balance'): la migrazione può essere rilanciata, aggiunge
+righe solo per gli studenti il cui saldo non coincide ancora con il registro.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.points import points_ledger
+from app.services import ledger
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+try:
+    with engine.begin() as conn:
+        # Tabella e indice dal modello: la colonna id autoincrementale dipende dal database
+        print("Creazione della tabella 'points_ledger'...")
+        points_ledger.create(bind=conn, checkfirst=True)
+
+    print("Registrazione del saldo iniziale degli studenti...")
+    with Session(engine) as db:
+        opened = ledger.reconcile(db, repair=True, reason=ledger.OPENING_BALANCE)
+    print(f"Studenti con saldo iniziale registrato: {len(opened)}")
+    print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
@@ -0,0 +1,37 @@
+"""
+Migrazione per aggiungere gli indici (user_id, created_at) usati dal report
+dei progressi dello studente (attività recenti con ORDER BY created_at DESC
+LIMIT 5) su 'quiz_attempts', 'user_challenges' e 'reward_purchases'.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+INDEXES = {
+    "ix_quiz_attempts_user_created": "quiz_attempts (user_id, created_at)",
+    "ix_user_challenges_user_created": "user_challenges (user_id, created_at)",
+    "ix_reward_purchases_user_created": "reward_purchases (user_id, created_at)",
+}
+
+try:
+    with engine.begin() as conn:
+        for name, target in INDEXES.items():
+            print(f"Creazione dell'indice '{name}'...")
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+        print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
@@ -0,0 +1,72 @@
+"""
+Migrazione per creare le tabelle delle statistiche per quiz
+('quiz_item_stats', 'quiz_student_progress') usate da /admin/quiz-stats
+e calcolarle dai tentativi esistenti.
+
+Il calcolo è lo stesso job incrementale eseguito dall'endpoint, a blocchi di
+ANALYTICS_BATCH_SIZE tentativi: la migrazione può essere interrotta e
+rilanciata, riprende dall'ultimo blocco salvato. Richiede la tabella
+'analytics_watermarks' (migrations/add_daily_analytics.py).
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services import quiz_stats
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+TABLES = {
+    "quiz_item_stats": """
+        quiz_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct_attempts INTEGER NOT NULL DEFAULT 0,
+        p_value FLOAT NOT NULL DEFAULT 0,
+        students INTEGER NOT NULL DEFAULT 0,
+        students_completed INTEGER NOT NULL DEFAULT 0,
+        attempts_to_completion INTEGER NOT NULL DEFAULT 0,
+        mean_attempts_to_completion FLOAT,
+        answer_counts JSON NOT NULL
+    """,
+    "quiz_student_progress": """
+        quiz_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        completed_at_attempt INTEGER,
+        PRIMARY KEY (quiz_id, user_id)
+    """,
+}
+
+INDEXES = {
+    "ix_quiz_item_stats_p_value": "quiz_item_stats (p_value)",
+    "ix_quiz_item_stats_mean_attempts_to_completion": "quiz_item_stats (mean_attempts_to_completion)",
+}
+
+try:
+    with engine.begin() as conn:
+        for name, columns in TABLES.items():
+            print(f"Creazione della tabella '{name}'...")
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} ({columns})"))
+        for name, target in INDEXES.items():
+            print(f"Creazione dell'indice '{name}'...")
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+
+    print("Calcolo delle statistiche dai tentativi esistenti...")
+    with Session(engine) as db:
+        batches = quiz_stats.refresh(db)
+    print(f"Blocchi elaborati: {batches}")
+    print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
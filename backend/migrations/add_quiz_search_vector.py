@@ -0,0 +1,71 @@
+"""
+Migrazione per la ricerca testuale dei quiz su PostgreSQL.
+
+Aggiunge a 'quizzes' la colonna 'search_vector' (tsvector), il trigger che la
+ricalcola quando cambiano domanda o spiegazione e l'indice GIN usato da
+GET /quizzes/search. Il vettore unisce il dizionario 'italian' (con radici,
+pesi A per la domanda e B per la spiegazione) e il dizionario 'simple' (parole
+intere, pesi C e D), così trovano corrispondenza sia le forme flesse sia i
+termini non italiani. Su altri database la ricerca usa un indice in memoria e
+la migrazione non fa nulla.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+VECTOR = """
+    setweight(to_tsvector('italian', coalesce({row}question, '')), 'A') ||
+    setweight(to_tsvector('italian', coalesce({row}explanation, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}question, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce({row}explanation, '')), 'D')
+"""
+
+try:
+    if engine.dialect.name != "postgresql":
+        print(f"Database {engine.dialect.name}: la ricerca usa l'indice in memoria, nulla da fare.")
+    else:
+        with engine.begin() as conn:
+            print("Aggiunta della colonna 'search_vector'...")
+            conn.execute(text("ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+
+            print("Creazione del trigger di aggiornamento...")
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION quizzes_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {VECTOR.format(row="NEW.")};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+            """))
+            conn.execute(text("DROP TRIGGER IF EXISTS quizzes_search_vector_trigger ON quizzes"))
+            conn.execute(text("""
+                CREATE TRIGGER quizzes_search_vector_trigger
+                BEFORE INSERT OR UPDATE OF question, explanation ON quizzes
+                FOR EACH ROW EXECUTE FUNCTION quizzes_search_vector_update()
+            """))
+
+            print("Calcolo del vettore per i quiz esistenti...")
+            result = conn.execute(text(f"UPDATE quizzes SET search_vector = {VECTOR.format(row='')}"))
+            print(f"Quiz aggiornati: {result.rowcount}")
+
+            print("Creazione dell'indice GIN 'ix_quizzes_search_vector'...")
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_quizzes_search_vector ON quizzes USING GIN (search_vector)"
+            ))
+        print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
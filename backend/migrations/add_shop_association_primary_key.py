@@ -0,0 +1,71 @@
+"""
+Migrazione per aggiungere la chiave primaria (user_id, reward_id)
+alla tabella 'user_reward_shop_association'.
+
+La chiave serve all'assegnazione in blocco dei premi, che usa
+INSERT ... ON CONFLICT (user_id, reward_id) DO UPDATE. Eventuali righe
+duplicate vengono prima unite sommandone le quantità; le righe senza
+utente o premio vengono eliminate.
+"""
+import sys
+import os
+
+# Aggiungi il percorso della root del progetto al sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+# Ottieni URL del database dalla configurazione
+DATABASE_URL = settings.DATABASE_URL
+print(f"Utilizzo DATABASE_URL: {DATABASE_URL}")
+
+print("Connessione al database...")
+engine = create_engine(DATABASE_URL)
+
+try:
+    with engine.begin() as conn:
+        print("Verifica se la chiave primaria esiste già...")
+        result = conn.execute(text(
+            """
+            SELECT constraint_name
+            FROM information_schema.table_constraints
+            WHERE table_name = 'user_reward_shop_association'
+              AND constraint_type = 'PRIMARY KEY'
+            """
+        ))
+
+        if result.fetchone():
+            print("La chiave primaria esiste già. Migrazione non necessaria.")
+        else:
+            print("Unione delle righe duplicate...")
+            conn.execute(text(
+                """
+                CREATE TEMPORARY TABLE shop_association_dedup ON COMMIT DROP AS
+                SELECT user_id, reward_id, SUM(COALESCE(quantity, 1)) AS quantity
+                FROM user_reward_shop_association
+                WHERE user_id IS NOT NULL AND reward_id IS NOT NULL
+                GROUP BY user_id, reward_id
+                """
+            ))
+            conn.execute(text("DELETE FROM user_reward_shop_association"))
+            conn.execute(text(
+                """
+                INSERT INTO user_reward_shop_association (user_id, reward_id, quantity)
+                SELECT user_id, reward_id, quantity FROM shop_association_dedup
+                """
+            ))
+
+            print("Aggiunta della chiave primaria (user_id, reward_id)...")
+            conn.execute(text(
+                """
+                ALTER TABLE user_reward_shop_association
+                ADD CONSTRAINT user_reward_shop_association_pkey
+                PRIMARY KEY (user_id, reward_id);
+                """
+            ))
+            print("Migrazione completata con successo!")
+
+    print("Connessione al database chiusa.")
+except Exception as e:
+    print(f"Errore durante la migrazione: {e}")
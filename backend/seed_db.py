@@ -1,11 +1,24 @@
 #!/usr/bin/env python3
 """
 Script per popolare il database con dati iniziali
+
+Uso:
+    python seed_db.py
+    python seed_db.py --load-students 1000 --load-parents 100 --load-quizzes 500 --load-attempts 20
+
+Con le opzioni --load-* aggiunge ai dati di esempio gli utenti e i dati per i
+test di carico (benchmarks/loadgen.py): studenti load_student_N e genitori
+load_parent_N con password "load", quiz, quiz dei percorsi di esempio con un
+percorso assegnato a ogni studente, premi nei negozi degli studenti e uno
+storico di tentativi.
 """
+import argparse
 import os
+import random
 import sys
 from datetime import datetime, timedelta
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 # Aggiungiamo il percorso alla directory principale dell'app
@@ -14,9 +27,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.core.security import get_password_hash
 from app.db.session import SessionLocal, engine
 from app.models.base import Base
-from app.models.user import User
-from app.models.quiz import Category, Quiz, DifficultyLevel, Path
+from app.models.user import User, parent_student_association
+from app.models.quiz import Category, Quiz, DifficultyLevel, Path, PathQuiz, quiz_category_association, quiz_path_association
 from app.models.challenge import Challenge, QuizAttempt, UserChallenge, UserProgress, UserReward
+from app.models.reward import Reward, user_reward_shop_association
+from app.services import ledger
+
+LOAD_PASSWORD = "load"
+LOAD_CHUNK = 5000
 
 
 def init_db(db: Session) -> None:
@@ -214,11 +232,122 @@ def init_db(db: Session) -> None:
     print("Database initialization completed!")
 
 
+def _insert_chunks(db: Session, table, rows) -> None:
+    for start in range(0, len(rows), LOAD_CHUNK):
+        db.execute(insert(table), rows[start:start + LOAD_CHUNK])
+
+
+def seed_load(db: Session, students: int, parents: int, quizzes: int, attempts: int, seed: int = 48) -> None:
+    """Aggiunge utenti e dati per i test di carico (da chiamare dopo init_db)"""
+    rng = random.Random(seed)
+    # Stessa password per tutti: l'hash bcrypt viene calcolato una volta sola
+    hashed_password = get_password_hash(LOAD_PASSWORD)
+    admin = db.query(User).filter(User.username == "admin").first()
+    categories = [category.id for category in db.query(Category).all()]
+    levels = [level.id for level in db.query(DifficultyLevel).all()]
+    paths = [path.id for path in db.query(Path).all()]
+
+    print(f"Creating {students} load students and {parents} load parents...")
+    _insert_chunks(db, User.__table__, [
+        {"username": f"load_student_{i}", "email": f"load_student_{i}@example.com",
+         "hashed_password": hashed_password, "full_name": f"Studente {i}",
+         "role": "student", "is_active": True, "points": rng.randint(0, 500)}
+        for i in range(1, students + 1)
+    ] + [
+        {"username": f"load_parent_{i}", "email": f"load_parent_{i}@example.com",
+         "hashed_password": hashed_password, "full_name": f"Genitore {i}",
+         "role": "parent", "is_active": True, "points": None}
+        for i in range(1, parents + 1)
+    ])
+    ids = dict(db.query(User.username, User.id).filter(User.username.like("load_%")))
+    student_ids = [ids[f"load_student_{i}"] for i in range(1, students + 1)]
+    parent_ids = [ids[f"load_parent_{i}"] for i in range(1, parents + 1)]
+    if parent_ids:
+        # Ogni studente ha un genitore, assegnati a turno
+        _insert_chunks(db, parent_student_association, [
+            {"parent_id": parent_ids[i % len(parent_ids)], "student_id": student_id}
+            for i, student_id in enumerate(student_ids)
+        ])
+
+    print(f"Creating {quizzes} load quizzes...")
+    first_quiz_id = (db.query(Quiz.id).order_by(Quiz.id.desc()).limit(1).scalar() or 0) + 1
+    quiz_rows = []
+    for i in range(quizzes):
+        a, b = rng.randint(1, 99), rng.randint(1, 99)
+        options = sorted({str(a + b), str(a + b + 1), str(a + b - 1), str(a + b + 10)})
+        quiz_rows.append({
+            "id": first_quiz_id + i, "question": f"Quanto fa {a} + {b}?", "options": options,
+            "correct_answer": str(a + b), "explanation": f"{a} + {b} = {a + b}",
+            "points": rng.choice((1, 2, 5, 10)), "creator_id": admin.id,
+            "difficulty_level_id": rng.choice(levels),
+        })
+    _insert_chunks(db, Quiz.__table__, quiz_rows)
+    _insert_chunks(db, quiz_category_association, [
+        {"quiz_id": quiz["id"], "category_id": rng.choice(categories)} for quiz in quiz_rows
+    ])
+    # I primi quiz vanno nei percorsi di esempio
+    _insert_chunks(db, quiz_path_association, [
+        {"quiz_id": quiz["id"], "path_id": path_id}
+        for n, path_id in enumerate(paths) for quiz in quiz_rows[n * 10:(n + 1) * 10]
+    ])
+    # Copie per /path-quizzes e un percorso assegnato a ogni studente, a turno
+    _insert_chunks(db, PathQuiz.__table__, [
+        {"question": quiz["question"], "options": quiz["options"], "correct_answer": quiz["correct_answer"],
+         "explanation": quiz["explanation"], "points": quiz["points"], "order": order,
+         "original_quiz_id": quiz["id"], "path_id": path_id}
+        for n, path_id in enumerate(paths) for order, quiz in enumerate(quiz_rows[n * 10:(n + 1) * 10])
+    ])
+    if paths:
+        _insert_chunks(db, UserProgress.__table__, [
+            {"user_id": student_id, "path_id": paths[i % len(paths)], "points": 0, "level": 1,
+             "completed_quizzes": 0, "completed": False}
+            for i, student_id in enumerate(student_ids)
+        ])
+
+    print("Creating load rewards and shops...")
+    rewards = [Reward(name=f"Premio {i}", description="Premio per i test di carico",
+                      point_cost=10 * i, creator_id=admin.id) for i in range(1, 11)]
+    db.add_all(rewards)
+    db.flush()
+    _insert_chunks(db, user_reward_shop_association, [
+        {"user_id": student_id, "reward_id": reward.id, "quantity": 1000}
+        for student_id in student_ids for reward in rewards
+    ])
+
+    print(f"Creating {attempts} attempts per load student...")
+    now = datetime.utcnow()
+    attempt_rows = []
+    for student_id in student_ids:
+        for quiz in rng.sample(quiz_rows, min(attempts, len(quiz_rows))):
+            correct = rng.random() < 0.65
+            attempt_rows.append({
+                "user_id": student_id, "quiz_id": quiz["id"],
+                "answer": quiz["correct_answer"] if correct else quiz["options"][0],
+                "correct": correct, "completed": correct,
+                "points_earned": quiz["points"] if correct else 0,
+                "created_at": now - timedelta(minutes=rng.randint(10, 60 * 24 * 60)),
+            })
+    _insert_chunks(db, QuizAttempt.__table__, attempt_rows)
+    db.commit()
+
+
 def main() -> None:
     """Main function to initialize the database"""
+    parser = argparse.ArgumentParser(description="Popola il database con dati di esempio")
+    parser.add_argument("--load-students", type=int, default=0, help="studenti per i test di carico")
+    parser.add_argument("--load-parents", type=int, default=0)
+    parser.add_argument("--load-quizzes", type=int, default=200)
+    parser.add_argument("--load-attempts", type=int, default=20, help="tentativi per studente")
+    args = parser.parse_args()
+
     db = SessionLocal()
     try:
         init_db(db)
+        if args.load_students or args.load_parents:
+            seed_load(db, args.load_students, args.load_parents, args.load_quizzes, args.load_attempts)
+        # I punti sono scritti direttamente in users.points: il saldo entra nel registro come opening_balance
+        opened = ledger.reconcile(db, repair=True, reason=ledger.OPENING_BALANCE)
+        print(f"Recorded {len(opened)} opening balances in points_ledger")
     finally:
         db.close()
 
@@ -0,0 +1,209 @@
+"""
+Fixture comuni dei test.
+
+Il database di test è un file SQLite temporaneo, oppure quello indicato da
+TEST_DATABASE_URL (per PostgreSQL usare un database dedicato: le tabelle
+vengono cancellate e ricreate). DATABASE_URL viene impostato prima di
+importare l'applicazione, così anche l'engine e SessionLocal dei servizi
+puntano al database di test.
+
+I test usano l'applicazione vera di app.main, con middleware, ORJSONResponse
+e lifespan: se app.main non si importa, la raccolta dei test fallisce. Il
+lifespan è avviato una volta per sessione, dopo il seed, come in un worker.
+"""
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, List
+
+if "TEST_DATABASE_URL" in os.environ:
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+else:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.setdefault("ENVIRONMENT", "test")
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import delete
+
+from app.core.security import create_access_token
+from app.db.session import SessionLocal, engine
+from app.main import app as main_app
+from app.models import Base
+
+from tests.seed import seed
+
+BASELINE_FILE = Path(__file__).with_name("query_counts.json")
+# Thread avviati insieme da run_concurrently
+THREADS = 8
+
+
+class Client:
+    """Client sincrono sull'applicazione ASGI (senza server; il lifespan è della fixture client)."""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def request(self, method: str, url: str, token: str = None, **kwargs) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        async def send():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await client.request(method, url, headers=headers, **kwargs)
+        return asyncio.run(send())
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-query-baseline", action="store_true",
+        help=f"riscrive {BASELINE_FILE.name} con il numero di query osservato per ogni endpoint",
+    )
+
+
+def pytest_report_header(config):
+    return f"database di test: {engine.url.render_as_string(hide_password=True)}"
+
+
+@pytest.fixture(scope="session")
+def app() -> FastAPI:
+    return main_app
+
+
+@pytest.fixture(scope="session")
+def ids():
+    """Schema ricreato e dati di seed; id da usare nei path."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        return seed(db)
+
+
+@pytest.fixture(scope="session")
+def tokens(ids):
+    roles = {"admin": "admin_id", "parent": "parent_id", "student": "student_id", "writer": "writer_id"}
+    return {role: create_access_token(ids[key]) for role, key in roles.items()}
+
+
+@pytest.fixture(scope="session")
+def client(app, ids) -> Client:
+    """Client con il lifespan dell'applicazione avviato sul database già popolato."""
+    lifespan = app.router.lifespan_context(app)
+    asyncio.run(lifespan.__aenter__())
+    yield Client(app)
+    asyncio.run(lifespan.__aexit__(None, None, None))
+
+
+class Cleanup:
+    """Righe create da un test, cancellate alla fine in ordine inverso di registrazione"""
+
+    _sequence = itertools.count()
+
+    def __init__(self):
+        self._filters = []
+
+    @classmethod
+    def unique(cls, prefix: str) -> str:
+        """Nome non ancora usato nella sessione di test (username, email, nomi)."""
+        return f"{prefix}{next(cls._sequence)}"
+
+    def add(self, column, value) -> None:
+        """Cancella alla fine le righe della tabella di `column` con quel valore (es. User.id, id)."""
+        self._filters.append((column, value))
+
+    def run(self) -> None:
+        with SessionLocal() as db:
+            for column, value in reversed(self._filters):
+                table = getattr(column, "class_", None)
+                table = column.table if table is None else table
+                db.execute(delete(table).where(column == value))
+            db.commit()
+        self._filters.clear()
+
+
+@pytest.fixture
+def cleanup(ids) -> Cleanup:
+    rows = Cleanup()
+    yield rows
+    rows.run()
+
+
+def _run_concurrently(fn: Callable[[], Any], threads: int = THREADS) -> List[Any]:
+    """
+    Esegue `fn` in `threads` thread partiti insieme (Barrier), ognuno con la
+    propria sessione se `fn` ne apre una; restituisce i risultati. Un'eccezione
+    in un thread viene rilanciata dopo che tutti hanno finito.
+    """
+    results, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            with lock:
+                errors.append(e)
+            return
+        with lock:
+            results.append(result)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+@pytest.fixture
+def run_concurrently():
+    return _run_concurrently
+
+
+class QueryBaseline:
+    """Numero massimo di query atteso per endpoint, per dialetto del database"""
+
+    def __init__(self, path: Path, dialect: str, update: bool):
+        self.path = path
+        self.dialect = dialect
+        self.update = update
+        self.data = json.loads(path.read_text()) if path.exists() else {}
+        self.observed = {}
+
+    def expected(self, key: str):
+        return self.data.get(self.dialect, {}).get(key)
+
+    def record(self, key: str, count: int) -> None:
+        self.observed[key] = count
+
+    def save(self) -> None:
+        counts = self.data.setdefault(self.dialect, {})
+        counts.update(self.observed)
+        self.data[self.dialect] = dict(sorted(counts.items()))
+        self.path.write_text(json.dumps(self.data, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture(scope="session")
+def query_baseline(request):
+    baseline = QueryBaseline(BASELINE_FILE, engine.dialect.name,
+                             request.config.getoption("--update-query-baseline"))
+    yield baseline
+    if baseline.update and baseline.observed:
+        baseline.save()
\ No newline at end of file
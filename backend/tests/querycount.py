@@ -0,0 +1,50 @@
+"""
+Conteggio delle istruzioni SQL eseguite durante un blocco.
+
+    with count_queries() as queries:
+        client.get(...)
+    assert queries.count <= 5, queries.report()
+
+`assert_max_queries(n)` fa lo stesso e fallisce con l'elenco delle query.
+Il listener è registrato sulla classe Engine, quindi conta anche le query
+delle sessioni aperte dai servizi con SessionLocal.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split()))
+
+    def report(self) -> str:
+        return f"{self.count} query:\n" + "\n".join(
+            f"  {i}. {statement[:300]}" for i, statement in enumerate(self.statements, 1)
+        )
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter._record)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryCounter]:
+    with count_queries() as counter:
+        yield counter
+    assert counter.count <= limit, f"Attese al massimo {limit} query, eseguite {counter.report()}"
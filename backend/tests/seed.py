@@ -0,0 +1,139 @@
+"""
+Dati deterministici per i test: pochi utenti per ruolo, categorie, livelli,
+quiz, un percorso (con le copie dei quiz assegnate a uno studente) con una
+sfida attiva, tentativi, premi e acquisti.
+
+Gli id non sono fissati: `seed` restituisce gli id da usare nei path degli
+endpoint (quiz_id, student_id, challenge_id, ...).
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Category, Challenge, DifficultyLevel, Path, PathQuiz, PathQuizAttempt, Quiz, QuizAttempt, Reward,
+    RewardPurchase, StudentPath, User, UserChallenge, UserProgress, parent_student_association, user_reward_shop_association,
+)
+
+N_STUDENTS = 5
+N_QUIZZES = 40
+ATTEMPTS_PER_STUDENT = 15
+
+
+def _user(db: Session, username: str, role: str, points=None) -> User:
+    user = User(username=username, email=f"{username}@example.com", hashed_password="x",
+                full_name=username.title(), role=role, points=points)
+    db.add(user)
+    return user
+
+
+def seed(db: Session) -> Dict[str, int]:
+    rng = random.Random(47)
+    # Tentativi più vecchi della finestra di ritardo degli aggregati (ANALYTICS_LAG_SECONDS)
+    past = datetime.utcnow() - timedelta(days=10)
+
+    admin = _user(db, "admin", "admin")
+    parent = _user(db, "parent", "parent")
+    students = [_user(db, f"student{i}", "student", points=0) for i in range(1, N_STUDENTS + 1)]
+    writer = _user(db, "writer", "student", points=500)
+    db.flush()
+    db.execute(parent_student_association.insert(), [
+        {"parent_id": parent.id, "student_id": student.id} for student in students
+    ])
+
+    categories = [Category(name=name, color="#336699") for name in ("Matematica", "Storia", "Scienze")]
+    levels = [DifficultyLevel(name=name, value=value) for value, name in enumerate(("Facile", "Medio", "Difficile"), 1)]
+    db.add_all(categories + levels)
+    db.flush()
+
+    quizzes = []
+    for i in range(N_QUIZZES):
+        answer = str(i * 2)
+        quizzes.append(Quiz(
+            question=f"Quanto fa {i} + {i}? Domanda di {categories[i % 3].name.lower()}",
+            options=[answer, str(i * 2 + 1), str(i * 2 + 2), str(i * 2 + 3)],
+            correct_answer=answer,
+            explanation=f"{i} + {i} = {answer}",
+            points=5,
+            creator_id=admin.id,
+            difficulty_level_id=levels[i % 3].id,
+            categories=[categories[i % 3]],
+        ))
+    db.add_all(quizzes)
+
+    path = Path(name="Percorso base", description="Primi quiz", bonus_points=10,
+                creator_id=admin.id, quizzes=quizzes[:5])
+    db.add(path)
+    db.flush()
+
+    now = datetime.utcnow()
+    challenge = Challenge(name="Sfida della settimana", description="Percorso base", points=20,
+                          start_date=now - timedelta(days=1), end_date=now + timedelta(days=6),
+                          path_id=path.id, creator_id=admin.id)
+    db.add(challenge)
+    db.flush()
+    user_challenge = UserChallenge(user_id=students[0].id, challenge_id=challenge.id,
+                                   total_quizzes=5, start_time=now)
+    db.add(user_challenge)
+    db.add(UserProgress(user_id=students[0].id, path_id=path.id, points=10, completed_quizzes=2))
+    db.add(StudentPath(name=path.name, description=path.description, bonus_points=path.bonus_points,
+                       template_id=path.id, user_id=students[0].id, completed_quizzes=1))
+    path_quizzes = [
+        PathQuiz(question=quiz.question, options=quiz.options, correct_answer=quiz.correct_answer,
+                 explanation=quiz.explanation, points=quiz.points, order=i, original_quiz_id=quiz.id,
+                 path_id=path.id)
+        for i, quiz in enumerate(path.quizzes)
+    ]
+    db.add_all(path_quizzes)
+    db.flush()
+    db.add(PathQuizAttempt(user_id=students[0].id, path_quiz_id=path_quizzes[0].id,
+                           answer=path_quizzes[0].correct_answer, correct=True,
+                           points_earned=path_quizzes[0].points, completed=True))
+    db.flush()
+
+    for n, student in enumerate(students):
+        for quiz in rng.sample(quizzes, ATTEMPTS_PER_STUDENT):
+            correct = rng.random() < 0.6
+            db.add(QuizAttempt(
+                user_id=student.id, quiz_id=quiz.id,
+                answer=quiz.correct_answer if correct else quiz.options[1],
+                correct=correct, points_earned=quiz.points if correct else 0,
+                completed=correct, created_at=past + timedelta(hours=n, minutes=quiz.id),
+            ))
+            if correct:
+                student.points += quiz.points
+
+    rewards = [Reward(name=f"Premio {i}", description="Premio di prova", point_cost=10 * i,
+                      creator_id=admin.id) for i in range(1, 4)]
+    db.add_all(rewards)
+    db.flush()
+    db.execute(user_reward_shop_association.insert(), [
+        {"user_id": student.id, "reward_id": reward.id, "quantity": 1}
+        for student in students + [writer] for reward in rewards
+    ])
+    db.add(RewardPurchase(user_id=students[0].id, reward_id=rewards[0].id,
+                          point_cost=rewards[0].point_cost, created_at=past))
+    db.commit()
+
+    return {
+        "admin_id": admin.id,
+        "parent_id": parent.id,
+        "student_id": students[0].id,
+        "user_id": students[0].id,
+        "writer_id": writer.id,
+        "quiz_id": quizzes[0].id,
+        "category_id": categories[0].id,
+        "level_id": levels[0].id,
+        "path_id": path.id,
+        "path_quiz_id": path_quizzes[0].id,
+        "challenge_id": challenge.id,
+        "attempt_id": user_challenge.id,
+        "reward_id": rewards[0].id,
+        # Lo studente "writer" è usato dai test che scrivono: prima un giro di riscaldamento, poi la misura
+        "writer_warmup_quiz_id": quizzes[-2].id,
+        "writer_quiz_id": quizzes[-1].id,
+        "writer_warmup_reward_id": rewards[1].id,
+        "writer_reward_id": rewards[2].id,
+    }
@@ -0,0 +1,76 @@
+"""
+Aggiornamento incrementale degli aggregati (IncrementalRefresh in
+app/services/analytics.py): limite di blocchi separato per ogni tabella di
+origine, arretrato smaltito dalle richieste successive, un solo aggiornamento
+per volta nel worker.
+"""
+import threading
+
+from app.core.config import settings
+from app.services.analytics import IncrementalRefresh
+
+
+class _Db:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def _fold(backlog: list, during=lambda: None):
+    """Fold finto: somma un blocco dell'arretrato `backlog` ([n]) finché ce ne sono"""
+    def fold(db) -> bool:
+        during()
+        if backlog[0] == 0:
+            return False
+        backlog[0] -= 1
+        return True
+    return fold
+
+
+def test_each_fold_has_its_own_budget():
+    attempts, purchases = [5], [3]
+    refresher = IncrementalRefresh((_fold(attempts), _fold(purchases)))
+    assert refresher.refresh(_Db(), max_batches=2) == 4
+    assert attempts == [3] and purchases == [1]
+    assert refresher.refresh(_Db()) == 4
+    assert attempts == [0] and purchases == [0]
+
+
+def test_request_backlog_is_continued_by_next_requests(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_REQUEST_MAX_BATCHES", 2)
+    monkeypatch.setattr(settings, "ANALYTICS_REFRESH_SECONDS", 3600)
+    attempts = [5]
+    refresher = IncrementalRefresh((_fold(attempts),))
+
+    refresher.ensure_fresh(_Db())
+    assert attempts == [3]
+    # Arretrato non smaltito: la richiesta successiva continua subito
+    refresher.ensure_fresh(_Db())
+    refresher.ensure_fresh(_Db())
+    assert attempts == [0]
+    # Arretrato smaltito: fino a ANALYTICS_REFRESH_SECONDS non si aggiorna
+    attempts[0] = 1
+    refresher.ensure_fresh(_Db())
+    assert attempts == [1]
+
+
+def test_concurrent_request_does_not_wait(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_REQUEST_MAX_BATCHES", 1)
+    folding, release = threading.Event(), threading.Event()
+    attempts = [1]
+    refresher = IncrementalRefresh((_fold(attempts, during=lambda: (folding.set(), release.wait(5))),))
+
+    running = threading.Thread(target=refresher.ensure_fresh, args=(_Db(),))
+    running.start()
+    assert folding.wait(5)
+    db = _Db()
+    refresher.ensure_fresh(db)
+    assert db.commits == 0
+    release.set()
+    running.join(5)
+    assert attempts == [0]
@@ -0,0 +1,44 @@
+"""
+Cache LRU con versioni (app/core/cache.py): un valore calcolato prima di
+un'invalidazione non viene salvato, anche quando la versione della chiave è
+già stata dimenticata, e le versioni tenute in memoria restano limitate.
+"""
+from app.core.cache import LRUCache
+
+
+def test_stale_value_is_not_stored():
+    cache = LRUCache(maxsize=4)
+    version = cache.version("a")
+    cache.invalidate("a")
+    assert not cache.put("a", 1, version)
+    assert cache.put("a", 2, cache.version("a"))
+    assert cache.get("a") == 2
+
+
+def test_versions_are_bounded():
+    cache = LRUCache(maxsize=4)
+    for key in range(1000):
+        cache.invalidate(key)
+    assert len(cache._versions) <= 4
+
+    for key in range(1000, 1010):
+        assert cache.put(key, key, cache.version(key))
+    assert len(cache) == 4
+    assert len(cache._versions) <= 4
+
+
+def test_stale_value_is_not_stored_after_version_is_forgotten():
+    cache = LRUCache(maxsize=2)
+    version = cache.version("a")
+    cache.invalidate("a")
+    # Altre invalidazioni spingono fuori la versione di "a"
+    for key in range(10):
+        cache.invalidate(key)
+    assert not cache.put("a", 1, version)
+
+
+def test_clear_discards_values_in_flight():
+    cache = LRUCache(maxsize=4)
+    version = cache.version("a")
+    cache.clear()
+    assert not cache.put("a", 1, version)
@@ -0,0 +1,71 @@
+"""
+Avvio dei tentativi di sfida (app/services/challenge_attempts.py): un solo
+tentativo in corso per studente e sfida anche con richieste concorrenti, e
+nessun tentativo su un percorso senza quiz.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.session import SessionLocal
+from app.models import Challenge, Path, Quiz, User, UserChallenge, quiz_path_association
+from app.services import challenge_attempts
+
+
+@pytest.fixture
+def make_challenge(ids, cleanup):
+    """Crea studente, percorso con `n_quizzes` quiz e sfida dedicati; restituisce (student_id, challenge_id)"""
+
+    def make(n_quizzes: int):
+        with SessionLocal() as db:
+            username = cleanup.unique("challenger")
+            student = User(username=username, email=f"{username}@example.com",
+                           hashed_password="x", role="student", points=0)
+            quizzes = db.query(Quiz).order_by(Quiz.id).limit(n_quizzes).all()
+            path = Path(name=cleanup.unique("Percorso sfida "), creator_id=ids["admin_id"], quizzes=quizzes)
+            db.add_all([student, path])
+            db.flush()
+            now = datetime.utcnow()
+            challenge = Challenge(name=cleanup.unique("Sfida "), points=10, path_id=path.id, creator_id=ids["admin_id"],
+                                  start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+            db.add(challenge)
+            db.commit()
+            cleanup.add(User.id, student.id)
+            cleanup.add(Path.id, path.id)
+            cleanup.add(quiz_path_association.c.path_id, path.id)
+            cleanup.add(Challenge.id, challenge.id)
+            cleanup.add(UserChallenge.challenge_id, challenge.id)
+            return student.id, challenge.id
+
+    return make
+
+
+def test_concurrent_starts_share_one_attempt(make_challenge, run_concurrently):
+    student_id, challenge_id = make_challenge(3)
+
+    def start():
+        with SessionLocal() as db:
+            challenge = db.get(Challenge, challenge_id)
+            return challenge_attempts.start_attempt(db, student_id, challenge).id
+
+    attempt_ids = run_concurrently(start)
+
+    assert len(set(attempt_ids)) == 1
+    with SessionLocal() as db:
+        open_attempts = db.query(UserChallenge).filter(
+            UserChallenge.user_id == student_id,
+            UserChallenge.challenge_id == challenge_id,
+            UserChallenge.completed == False,
+        ).all()
+    assert [attempt.id for attempt in open_attempts] == attempt_ids[:1]
+    assert open_attempts[0].total_quizzes == 3
+
+
+def test_empty_path_is_rejected(make_challenge):
+    student_id, challenge_id = make_challenge(0)
+    with SessionLocal() as db:
+        challenge = db.get(Challenge, challenge_id)
+        with pytest.raises(challenge_attempts.ChallengeAttemptError) as e:
+            challenge_attempts.start_attempt(db, student_id, challenge)
+        assert e.value.status_code == 400
+        assert db.query(UserChallenge).filter(UserChallenge.challenge_id == challenge_id).count() == 0
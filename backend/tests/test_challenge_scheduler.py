@@ -0,0 +1,74 @@
+"""
+Ricarica dello scheduler delle sfide (app/services/challenge_scheduler.py):
+una sola ricarica per volta mentre le altre richieste leggono l'indice
+precedente, e gli aggiornamenti arrivati durante la lettura dal database non
+vanno persi.
+"""
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services.challenge_scheduler import ChallengeScheduler
+
+
+def _challenge(challenge_id: int, creator_id: int = 1) -> SimpleNamespace:
+    now = datetime.now()
+    return SimpleNamespace(
+        id=challenge_id, name=f"Sfida {challenge_id}", description=None, points=10,
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1), is_active=True,
+        creator_id=creator_id, path_id=1, created_at=now,
+    )
+
+
+class _Db:
+    """Sessione finta: db.query(Challenge).all() restituisce `challenges` dopo aver chiamato `during_read`"""
+
+    def __init__(self, challenges, during_read=lambda: None):
+        self.challenges = challenges
+        self.during_read = during_read
+        self.reads = 0
+
+    def query(self, model):
+        return self
+
+    def all(self):
+        self.reads += 1
+        self.during_read()
+        return list(self.challenges)
+
+
+def _active_ids(scheduler: ChallengeScheduler) -> list:
+    return [challenge.id for challenge in scheduler.active_for_creators()]
+
+
+def test_updates_during_rebuild_are_kept():
+    scheduler = ChallengeScheduler(refresh_seconds=60)
+    scheduler.rebuild(_Db([_challenge(1), _challenge(2)]))
+
+    def commit_elsewhere():
+        # Sfida creata e sfida eliminata dopo la lettura della ricarica
+        scheduler.upsert(_challenge(3))
+        scheduler.remove(2)
+
+    scheduler.rebuild(_Db([_challenge(1), _challenge(2)], during_read=commit_elsewhere))
+    assert _active_ids(scheduler) == [1, 3]
+
+
+def test_expired_index_is_rebuilt_once():
+    scheduler = ChallengeScheduler(refresh_seconds=0)
+    scheduler.rebuild(_Db([_challenge(1)]))
+    reading, release = threading.Event(), threading.Event()
+    db = _Db([_challenge(1), _challenge(2)], during_read=lambda: (reading.set(), release.wait(5)))
+
+    rebuilding = threading.Thread(target=scheduler.ensure_fresh, args=(db,))
+    rebuilding.start()
+    assert reading.wait(5)
+    # Durante la ricarica le altre richieste non rileggono e servono l'indice precedente
+    for _ in range(3):
+        scheduler.ensure_fresh(db)
+    assert _active_ids(scheduler) == [1]
+    release.set()
+    rebuilding.join(5)
+
+    assert db.reads == 1
+    assert _active_ids(scheduler) == [1, 2]
@@ -0,0 +1,59 @@
+"""
+Esportazione Parquet (app/services/exports.py): lo schema è quello dichiarato
+per il dataset, non quello dedotto dal primo blocco, così una colonna nulla
+nel primo blocco e valorizzata dopo non rompe l'esportazione.
+"""
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services import exports
+
+
+def _read(body) -> "pa.Table":
+    return pq.read_table(io.BytesIO(b"".join(body)))
+
+
+def test_null_column_in_first_chunk():
+    columns = [field.name for field in exports.parquet_schema("attempts")]
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    first = [(1, 10, "anna", 5, None, "4", True, 3, at)]
+    second = [(2, 10, "anna", 6, 7, "5", False, 0, at), (3, 11, "luca", 5, None, "4", True, 3, at)]
+
+    table = _read(exports._parquet(iter([(columns, first), (columns, second)]), "attempts"))
+    assert table.schema == exports.parquet_schema("attempts")
+    assert table.column("challenge_attempt_id").to_pylist() == [None, 7, None]
+
+
+def test_decimal_precision_changes_between_chunks():
+    columns = [field.name for field in exports.parquet_schema("progress")]
+    first = [(1, "anna", None, 10, 3, 1, Decimal("33.33"), 0, 0, 0)]
+    second = [(2, "luca", "Luca Bianchi", 20, 7, 7, Decimal("100.00"), 1, 1, 50)]
+
+    table = _read(exports._parquet(iter([(columns, first), (columns, second)]), "progress"))
+    assert table.column("accuracy").to_pylist() == [33.33, 100.0]
+    assert table.column("full_name").to_pylist() == [None, "Luca Bianchi"]
+
+
+@pytest.mark.parametrize("dataset", sorted(exports.DATASETS))
+def test_export_matches_schema(ids, monkeypatch, dataset):
+    # Blocchi piccoli: più row group anche con i dati di seed
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+    table = _read(exports.export(dataset, exports.PARQUET, session_factory=SessionLocal))
+    assert table.schema == exports.parquet_schema(dataset)
+    with SessionLocal() as db:
+        assert table.num_rows == len(db.execute(exports.DATASETS[dataset](None, None)).all())
+
+
+def test_parquet_endpoint(client, tokens):
+    response = client.get("/api/v1/admin/export/purchases", params={"format": "parquet"}, token=tokens["admin"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == exports.MEDIA_TYPES[exports.PARQUET]
+    assert pq.read_table(io.BytesIO(response.content)).schema == exports.parquet_schema("purchases")
@@ -0,0 +1,85 @@
+"""
+Registro dei punti (app/services/ledger.py): prelievi condizionali con
+min_balance, saldo impostato con set_points e rettifica di reconcile per i
+punti scritti direttamente in users.points (come fanno i seed).
+"""
+import pytest
+
+from app.db.session import SessionLocal
+from app.models import User, points_ledger
+from app.services import ledger
+
+
+@pytest.fixture
+def student(cleanup):
+    """Crea uno studente con i punti dati senza righe nel registro; restituisce l'id"""
+
+    def make(points: int) -> int:
+        with SessionLocal() as db:
+            username = cleanup.unique("ledger")
+            user = User(username=username, email=f"{username}@example.com", hashed_password="x",
+                        role="student", points=points)
+            db.add(user)
+            db.commit()
+            cleanup.add(User.id, user.id)
+            cleanup.add(points_ledger.c.user_id, user.id)
+            return user.id
+
+    return make
+
+
+def _mismatch(db, user_id: int):
+    return next((row for row in ledger.reconcile(db) if row["user_id"] == user_id), None)
+
+
+def test_add_points_respects_min_balance(student):
+    student_id = student(0)
+    with SessionLocal() as db:
+        assert ledger.add_points(db, student_id, 10, ledger.QUIZ, 1) == 10
+        # Prelievo oltre il saldo: nessuna modifica e nessuna riga
+        assert ledger.add_points(db, student_id, -15, ledger.PURCHASE, 2, min_balance=0) is None
+        assert ledger.add_points(db, student_id, -10, ledger.PURCHASE, 3, min_balance=0) == 0
+        db.commit()
+
+        assert ledger.get_balance(db, student_id) == 0
+        rows = ledger.history(db, student_id)
+        assert [(row["delta"], row["balance"], row["reason"], row["reference_id"]) for row in rows] == [
+            (-10, 0, ledger.PURCHASE, 3),
+            (10, 10, ledger.QUIZ, 1),
+        ]
+        assert _mismatch(db, student_id) is None
+
+
+def test_set_points_records_difference(student):
+    student_id = student(0)
+    with SessionLocal() as db:
+        ledger.add_points(db, student_id, 8, ledger.QUIZ)
+        assert ledger.set_points(db, student_id, 42, ledger.MANUAL) == 42
+        # Stesso saldo: nessuna variazione da registrare
+        assert ledger.set_points(db, student_id, 42, ledger.MANUAL) == 42
+        assert ledger.set_points(db, -1, 42, ledger.MANUAL) is None
+        db.commit()
+
+        rows = ledger.history(db, student_id)
+        assert [(row["delta"], row["balance"], row["reason"]) for row in rows] == [
+            (34, 42, ledger.MANUAL),
+            (8, 8, ledger.QUIZ),
+        ]
+        assert db.get(User, student_id).points == 42
+
+
+def test_reconcile_repairs_opening_balance(student):
+    # Punti scritti direttamente, come in seed_db.py prima del registro
+    student_id = student(30)
+    with SessionLocal() as db:
+        ledger.add_points(db, student_id, 5, ledger.QUIZ)
+        db.commit()
+
+        mismatch = _mismatch(db, student_id)
+        assert (mismatch["points"], mismatch["ledger_points"], mismatch["difference"]) == (35, 5, 30)
+
+        repaired = ledger.reconcile(db, repair=True, reason=ledger.OPENING_BALANCE)
+        assert student_id in {row["user_id"] for row in repaired}
+        assert _mismatch(db, student_id) is None
+        latest = ledger.history(db, student_id, limit=1)[0]
+        assert (latest["delta"], latest["balance"], latest["reason"]) == (30, 35, ledger.OPENING_BALANCE)
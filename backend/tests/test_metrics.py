@@ -0,0 +1,65 @@
+"""
+Metriche (app/core/metrics.py): somma tra i worker tramite METRICS_DIR e
+GET /metrics riservato a chi ha METRICS_TOKEN.
+"""
+import os
+
+from app.core import metrics as metrics_module
+from app.core.config import settings
+from app.core.metrics import Metrics, RequestStats, collect, mark_process_dead
+
+
+def _observe(metrics: Metrics, route: str, times: int) -> None:
+    for _ in range(times):
+        metrics.observe("GET", route, 200, 0.01, RequestStats(), slow=False)
+
+
+def _requests(metrics: Metrics, route: str) -> int:
+    return metrics.requests.get(("GET", route, 200), 0)
+
+
+def test_workers_are_summed(tmp_path):
+    directory = str(tmp_path)
+    worker = Metrics(directory)
+    other = Metrics()
+    _observe(worker, "/a", 3)
+    _observe(other, "/a", 2)
+    _observe(other, "/b", 1)
+    # Un altro worker scrive il suo file
+    metrics_module._write_json(metrics_module._worker_path(directory, 123456), other.snapshot())
+
+    worker.flush()
+    total = collect(directory)
+    assert _requests(total, "/a") == 5
+    assert _requests(total, "/b") == 1
+    assert total.durations[("GET", "/a")].count == 5
+    assert 'http_requests_total{method="GET",route="/a",status="200"} 5' in worker.render()
+
+
+def test_dead_worker_is_archived(tmp_path):
+    directory = str(tmp_path)
+    for pid, times in ((111, 4), (222, 1)):
+        dead = Metrics()
+        _observe(dead, "/a", times)
+        metrics_module._write_json(metrics_module._worker_path(directory, pid), dead.snapshot())
+
+    mark_process_dead(directory, 111)
+    mark_process_dead(directory, 222)
+    mark_process_dead(directory, 222)  # già archiviato: nessun doppio conteggio
+
+    assert not os.path.exists(metrics_module._worker_path(directory, 111))
+    assert _requests(collect(directory), "/a") == 5
+
+
+def test_metrics_require_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer altro"}).status_code == 404
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
@@ -0,0 +1,91 @@
+"""
+Cache degli snapshot dei percorsi (app/services/path_snapshot.py): contenuto
+costruito dal database, invalidazione locale e scadenza per gli altri worker.
+"""
+import pytest
+
+from app.db.session import SessionLocal
+from app.models import Path, PathQuiz, UserProgress
+from app.services.path_snapshot import PathSnapshotCache
+
+
+def _path_quiz(path_id: int, order: int) -> PathQuiz:
+    return PathQuiz(question=f"Domanda {order}", options=["a", "b"], correct_answer="a",
+                    points=3, order=order, path_id=path_id)
+
+
+@pytest.fixture
+def path_id(ids):
+    """
+    Percorso dedicato con due quiz (inseriti in ordine inverso), assegnato
+    allo studente; eliminato alla fine per non cambiare i dati degli altri test.
+    """
+    with SessionLocal() as db:
+        path = Path(name="Percorso snapshot", bonus_points=7, creator_id=ids["parent_id"])
+        db.add(path)
+        db.flush()
+        db.add_all([_path_quiz(path.id, 1), _path_quiz(path.id, 0)])
+        db.add(UserProgress(user_id=ids["student_id"], path_id=path.id))
+        db.commit()
+        path_id = path.id
+    yield path_id
+    with SessionLocal() as db:
+        db.query(PathQuiz).filter(PathQuiz.path_id == path_id).delete()
+        db.query(UserProgress).filter(UserProgress.path_id == path_id).delete()
+        db.query(Path).filter(Path.id == path_id).delete()
+        db.commit()
+
+
+def _add_quiz(path_id: int, order: int) -> int:
+    with SessionLocal() as db:
+        path_quiz = _path_quiz(path_id, order)
+        db.add(path_quiz)
+        db.commit()
+        return path_quiz.id
+
+
+def test_build(path_id, ids):
+    cache = PathSnapshotCache(maxsize=4, ttl=60)
+    with SessionLocal() as db:
+        snapshot = cache.get(db, path_id)
+        assert cache.get(db, path_id) is snapshot
+        assert cache.get(db, -1) is None
+
+        assert snapshot.creator_id == ids["parent_id"]
+        assert snapshot.bonus_points == 7
+        assert snapshot.is_assigned_to(ids["student_id"])
+        assert not snapshot.is_assigned_to(ids["writer_id"])
+        assert [quiz.order for quiz in snapshot.quizzes] == [0, 1]
+
+        path_quiz_id = snapshot.quizzes[0].id
+        assert cache.get_for_path_quiz(db, path_quiz_id) is snapshot
+        assert snapshot.quizzes_by_id[path_quiz_id].question == "Domanda 0"
+
+
+def test_invalidate_path(path_id):
+    cache = PathSnapshotCache(maxsize=4, ttl=60)
+    with SessionLocal() as db:
+        before = cache.get(db, path_id)
+    path_quiz_id = _add_quiz(path_id, 2)
+
+    with SessionLocal() as db:
+        # Senza invalidazione lo snapshot resta quello in cache
+        assert cache.get(db, path_id) is before
+        cache.invalidate_path(path_id)
+        after = cache.get(db, path_id)
+    assert after is not before
+    assert path_quiz_id in after.quizzes_by_id
+
+
+def test_expired_snapshot_is_rebuilt(path_id):
+    # Modifica servita da un altro worker: nessuna invalidazione in questo processo
+    cache = PathSnapshotCache(maxsize=4, ttl=0)
+    with SessionLocal() as db:
+        before = cache.get(db, path_id)
+    path_quiz_id = _add_quiz(path_id, 3)
+
+    with SessionLocal() as db:
+        after = cache.get(db, path_id)
+        assert path_quiz_id in after.quizzes_by_id
+        assert cache.get_for_path_quiz(db, path_quiz_id).path_id == path_id
+    assert len(after.quizzes) == len(before.quizzes) + 1
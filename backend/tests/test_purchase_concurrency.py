@@ -0,0 +1,99 @@
+"""
+Acquisti concorrenti dello stesso premio (app/services/shop.py): più thread,
+ognuno con la propria sessione, comprano per lo stesso studente nello stesso
+momento. Nessun pezzo venduto oltre la quantità del negozio, saldo mai
+negativo, punti scalati uguali alla somma degli acquisti e al registro.
+
+Su SQLite le transazioni di scrittura sono serializzate dal lock del file;
+con TEST_DATABASE_URL su PostgreSQL sono davvero concorrenti.
+"""
+from collections import Counter
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import SessionLocal
+from app.models import Reward, RewardPurchase, User, points_ledger, user_reward_shop_association
+from app.services import ledger, shop
+from tests.conftest import THREADS
+
+ATTEMPTS = 5
+
+
+@pytest.fixture
+def shop_setup(ids, cleanup):
+    """Crea studente e premio dedicati; restituisce una funzione (punti, costo, quantità) -> id"""
+
+    def make(points: int, cost: int, quantity: int):
+        with SessionLocal() as db:
+            username = cleanup.unique("buyer")
+            student = User(username=username, email=f"{username}@example.com", hashed_password="x",
+                           role="student", points=points)
+            reward = Reward(name=cleanup.unique("Premio conteso "), point_cost=cost, creator_id=ids["admin_id"])
+            db.add_all([student, reward])
+            db.flush()
+            db.execute(user_reward_shop_association.insert().values(
+                user_id=student.id, reward_id=reward.id, quantity=quantity
+            ))
+            db.commit()
+            cleanup.add(User.id, student.id)
+            cleanup.add(Reward.id, reward.id)
+            cleanup.add(user_reward_shop_association.c.user_id, student.id)
+            cleanup.add(RewardPurchase.user_id, student.id)
+            cleanup.add(points_ledger.c.user_id, student.id)
+            return student.id, reward.id
+
+    return make
+
+
+def _buy(student_id: int, reward_id: int) -> Counter:
+    """ATTEMPTS acquisti in sequenza, ognuno con la propria sessione; esiti contati"""
+    outcomes = Counter()
+    for _ in range(ATTEMPTS):
+        with SessionLocal() as db:
+            try:
+                shop.purchase(db, student_id, reward_id)
+                outcomes["ok"] += 1
+            except shop.PurchaseError as e:
+                outcomes[e.status_code] += 1
+            except OperationalError:
+                # SQLite: database bloccato oltre il timeout
+                db.rollback()
+                outcomes["lock timeout"] += 1
+    return outcomes
+
+
+def _state(student_id: int, reward_id: int):
+    with SessionLocal() as db:
+        points = db.query(User.points).filter(User.id == student_id).scalar()
+        purchases, spent = db.query(
+            func.count(RewardPurchase.id), func.coalesce(func.sum(RewardPurchase.point_cost), 0)
+        ).filter(RewardPurchase.user_id == student_id).one()
+        left = db.query(user_reward_shop_association.c.quantity).filter(
+            user_reward_shop_association.c.user_id == student_id,
+            user_reward_shop_association.c.reward_id == reward_id,
+        ).scalar() or 0
+        history = ledger.history(db, student_id, limit=THREADS * ATTEMPTS)
+    return points, purchases, spent, left, history
+
+
+@pytest.mark.parametrize("points, cost, quantity", [
+    pytest.param(1000, 10, 12, id="limited-quantity"),
+    pytest.param(95, 10, 40, id="limited-points"),
+])
+def test_concurrent_purchases(shop_setup, run_concurrently, points, cost, quantity):
+    student_id, reward_id = shop_setup(points, cost, quantity)
+
+    outcomes = sum(run_concurrently(lambda: _buy(student_id, reward_id)), Counter())
+    final_points, purchases, spent, left, history = _state(student_id, reward_id)
+
+    assert final_points >= 0
+    assert purchases <= quantity
+    assert purchases + left == quantity
+    assert outcomes["ok"] == purchases
+    assert points - final_points == spent == purchases * cost
+    # Ogni acquisto ha la sua riga nel registro dei punti
+    assert sorted(entry["delta"] for entry in history) == [-cost] * purchases
+    if not outcomes["lock timeout"]:
+        assert purchases == min(points // cost, quantity)
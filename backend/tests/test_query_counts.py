@@ -0,0 +1,174 @@
+"""
+Numero di query SQL per endpoint, confrontato con tests/query_counts.json.
+
+Ogni endpoint GET dell'applicazione ha un caso qui sotto (lo verifica
+test_every_get_route_has_a_case). La richiesta viene fatta due volte e si
+conta la seconda, a cache in memoria già calde: è il costo a regime, e non
+dipende dall'ordine dei test. Il test fallisce se le query superano quelle
+registrate; dopo una modifica voluta (o un miglioramento) si aggiorna il file:
+
+    pytest --update-query-baseline
+"""
+import warnings
+from typing import Dict, NamedTuple, Optional
+
+import pytest
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+from app.services.leaderboard import leaderboards
+from tests.querycount import count_queries
+
+API = settings.API_V1_STR
+
+
+class Case(NamedTuple):
+    role: str
+    path: str
+    params: Optional[Dict] = None
+    # Id da usare nel path al posto di quelli di default (es. user_id -> parent_id)
+    path_ids: Optional[Dict[str, str]] = None
+    # Endpoint rotto indipendentemente dal numero di query: il test è atteso fallire
+    broken: Optional[str] = None
+
+
+CASES = [
+    Case("student", "/me"),
+    Case("admin", "/users/"),
+    Case("student", "/users/me"),
+    Case("admin", "/users/{user_id}"),
+    Case("parent", "/users/{user_id}/points-history", path_ids={"user_id": "student_id"}),
+    Case("student", "/quizzes/"),
+    Case("student", "/quizzes/search", {"q": "quanto fa"}),
+    Case("student", "/quizzes/recommended"),
+    Case("student", "/quizzes/{quiz_id}"),
+    Case("student", "/quizzes/completed-quizzes/"),
+    Case("student", "/categories/"),
+    Case("student", "/categories/{category_id}"),
+    Case("student", "/challenges/"),
+    Case("admin", "/challenges/{challenge_id}"),
+    Case("student", "/challenges/attempt/{attempt_id}"),
+    Case("student", "/progress/rewards", broken="progress.py usa Reward senza importarlo"),
+    Case("student", "/progress/rewards/{reward_id}", broken="progress.py usa Reward senza importarlo"),
+    Case("student", "/progress/redemptions"),
+    Case("parent", "/progress/children"),
+    Case("parent", "/progress/student/{student_id}"),
+    Case("admin", "/admin/test"),
+    Case("admin", "/admin/difficulty-levels"),
+    Case("admin", "/admin/paths"),
+    Case("admin", "/admin/paths/{path_id}"),
+    Case("admin", "/admin/stats"),
+    Case("admin", "/admin/users"),
+    Case("admin", "/admin/users/{user_id}"),
+    Case("admin", "/admin/users-stats"),
+    Case("admin", "/admin/quiz-categories-stats"),
+    Case("admin", "/admin/analytics/activity", {"bucket": "week", "window": 2}),
+    Case("admin", "/admin/quiz-stats"),
+    Case("admin", "/admin/points/reconciliation"),
+    Case("admin", "/admin/export/{dataset}", {"format": "csv"}),
+    Case("admin", "/admin/users/{user_id}/quizzes"),
+    Case("admin", "/admin/users/{user_id}/children-progress", path_ids={"user_id": "parent_id"}),
+    Case("admin", "/rewards/"),
+    Case("admin", "/rewards/{reward_id}"),
+    Case("student", "/student/shop/"),
+    Case("student", "/student/purchases/"),
+    Case("parent", "/parent/student-shop/{student_id}"),
+    Case("admin", "/admin/purchases/{student_id}"),
+    Case("parent", "/paths/"),
+    Case("student", "/paths/my-paths"),
+    Case("student", "/paths/my"),
+    Case("admin", "/paths/{path_id}"),
+    Case("student", "/paths/student/{path_id}/completed-quizzes"),
+    Case("parent", "/paths/assigned/{student_id}"),
+    Case("parent", "/paths/student", {"student_id": 0},
+         broken="GET /paths/student è dichiarato dopo /paths/{path_id}, che lo intercetta"),
+    Case("student", "/path-quizzes/path/{path_id}"),
+    Case("student", "/path-quizzes/{path_quiz_id}"),
+    Case("student", "/path-quizzes/completed/{path_id}"),
+    Case("student", "/leaderboard/global"),
+    Case("parent", "/leaderboard/parent/{parent_id}"),
+    Case("student", "/leaderboard/challenge/{challenge_id}"),
+    Case("student", "/leaderboard/me"),
+]
+
+
+def _url(case: Case, ids: Dict[str, int]) -> str:
+    values = {**ids, "dataset": "attempts"}
+    for name, key in (case.path_ids or {}).items():
+        values[name] = ids[key]
+    return API + case.path.format(**values)
+
+
+def check_baseline(query_baseline, key: str, counter) -> None:
+    query_baseline.record(key, counter.count)
+    if query_baseline.update:
+        return
+    expected = query_baseline.expected(key)
+    assert expected is not None, (
+        f"{key} non è in {query_baseline.path.name}: eseguire pytest --update-query-baseline"
+    )
+    assert counter.count <= expected, (
+        f"{key}: {counter.count} query invece di {expected}\n{counter.report()}"
+    )
+    if counter.count < expected:
+        warnings.warn(f"{key}: {counter.count} query invece di {expected}, aggiornare la baseline")
+
+
+@pytest.mark.parametrize("case", [
+    pytest.param(case, id=case.path,
+                 marks=[pytest.mark.xfail(reason=case.broken, strict=True)] if case.broken else [])
+    for case in CASES
+])
+def test_get_query_count(case, client, ids, tokens, query_baseline):
+    url = _url(case, ids)
+    token = tokens[case.role]
+    warmup = client.get(url, token=token, params=case.params)
+    assert warmup.status_code == 200, warmup.text[:500]
+
+    with count_queries() as counter:
+        response = client.get(url, token=token, params=case.params)
+    assert response.status_code == 200, response.text[:500]
+    check_baseline(query_baseline, f"GET {case.path}", counter)
+
+
+def test_submit_attempt_query_count(client, ids, tokens, query_baseline):
+    token = tokens["writer"]
+    warmup = client.post(f"{API}/quizzes/attempt", token=token,
+                         json={"quiz_id": ids["writer_warmup_quiz_id"], "answer": "?"})
+    assert warmup.status_code == 201, warmup.text[:500]
+
+    with count_queries() as counter:
+        response = client.post(f"{API}/quizzes/attempt", token=token,
+                               json={"quiz_id": ids["writer_quiz_id"], "answer": "?"})
+    assert response.status_code == 201, response.text[:500]
+    check_baseline(query_baseline, "POST /quizzes/attempt", counter)
+
+
+def test_purchase_query_count(client, ids, tokens, query_baseline):
+    token = tokens["writer"]
+    warmup = client.post(f"{API}/student/purchase/", token=token,
+                         json={"reward_id": ids["writer_warmup_reward_id"]})
+    assert warmup.status_code == 200, warmup.text[:500]
+
+    with count_queries() as counter:
+        response = client.post(f"{API}/student/purchase/", token=token,
+                               json={"reward_id": ids["writer_reward_id"]})
+    assert response.status_code == 200, response.text[:500]
+    check_baseline(query_baseline, "POST /student/purchase/", counter)
+
+
+def test_every_get_route_has_a_case(app):
+    covered = {API + case.path for case in CASES}
+    routes = {
+        route.path for route in app.routes
+        if isinstance(route, APIRoute) and "GET" in route.methods and route.path.startswith(API)
+    }
+    assert not routes - covered, f"Endpoint GET senza caso in CASES: {sorted(routes - covered)}"
+
+
+def test_client_uses_full_app(client):
+    # Middleware e lifespan di app/main.py, non solo i router
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert "server-timing" in response.headers
+    assert leaderboards.loaded
@@ -0,0 +1,31 @@
+"""
+Snippet della ricerca dei quiz (app/services/quiz_search.py): il testo dei
+quiz arriva come HTML escapato, solo i tag <mark> dell'evidenziazione restano
+markup, sia con l'indice in memoria sia con ts_headline.
+"""
+from app.services.quiz_search import MARK_END, MARK_START, _SEL_END, _SEL_START, highlight, mark_headline, terms
+
+
+def test_highlight_escapes_quiz_text():
+    text = "Quanto fa <script>alert(1)</script> la somma di 2 & 3?"
+    snippet = highlight(text, set(terms("somma")))
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in snippet
+    assert "2 &amp; 3" in snippet
+    assert f"{MARK_START}somma{MARK_END}" in snippet
+
+
+def test_highlight_escapes_highlighted_word():
+    # Il frammento va dalla prima all'ultima parola
+    snippet = highlight("la <b>somma</b> di", set(terms("somma")))
+    assert snippet == f"la &lt;b&gt;{MARK_START}somma{MARK_END}&lt;/b&gt; di"
+
+
+def test_highlight_without_words():
+    assert highlight("<>", set(terms("somma"))) == "&lt;&gt;"
+
+
+def test_mark_headline():
+    headline = f"<img src=x> la {_SEL_START}somma{_SEL_END} di 2 & 3"
+    assert mark_headline(headline) == f"&lt;img src=x&gt; la {MARK_START}somma{MARK_END} di 2 &amp; 3"
+    assert mark_headline(None) == ""
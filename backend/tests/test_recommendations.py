@@ -0,0 +1,117 @@
+"""
+Raccomandazioni dei quiz (app/services/recommendations.py): ordine per
+probabilità stimata vicina a TARGET_SUCCESS, esclusione dei quiz risolti,
+aggiornamento della padronanza in cache dopo il commit di un tentativo e
+padronanza ricalcolata in memoria, non scartata, quando si ricarica il catalogo.
+"""
+import pytest
+
+from app.db.session import SessionLocal
+from app.models import Category, DifficultyLevel, Quiz, QuizAttempt, User, quiz_category_association
+from app.models.analytics import quiz_item_stats
+from app.services.recommendations import Recommender, recommender
+from tests.querycount import count_queries
+
+# Quiz -> (tentativi, corrette) in quiz_item_stats: facilità circa 0.67, 0.25, 0.91
+STATS = {"medio": (10, 7), "difficile": (10, 2), "facile": (20, 19)}
+
+
+@pytest.fixture
+def catalog(ids, cleanup):
+    """Categoria con tre quiz di facilità diversa e uno studente senza tentativi; restituisce gli id"""
+    with SessionLocal() as db:
+        category = Category(name=cleanup.unique("Categoria raccomandazioni "))
+        levels = [DifficultyLevel(name=cleanup.unique("Livello "), value=100 + n) for n in range(2)]
+        username = cleanup.unique("learner")
+        student = User(username=username, email=f"{username}@example.com", hashed_password="x",
+                       role="student", points=0)
+        quizzes = {
+            name: Quiz(question=f"Quiz {name}", options=["a", "b"], correct_answer="a", points=1,
+                       creator_id=ids["admin_id"], difficulty_level=levels[0], categories=[category])
+            for name in STATS
+        }
+        db.add_all([category, *levels, student, *quizzes.values()])
+        db.flush()
+        db.execute(quiz_item_stats.insert(), [
+            {"quiz_id": quizzes[name].id, "attempts": attempts, "correct_attempts": correct,
+             "p_value": correct / attempts, "answer_counts": {}}
+            for name, (attempts, correct) in STATS.items()
+        ])
+        db.commit()
+
+        cleanup.add(Category.id, category.id)
+        for level in levels:
+            cleanup.add(DifficultyLevel.id, level.id)
+        cleanup.add(User.id, student.id)
+        for quiz in quizzes.values():
+            cleanup.add(Quiz.id, quiz.id)
+            cleanup.add(quiz_item_stats.c.quiz_id, quiz.id)
+        cleanup.add(quiz_category_association.c.category_id, category.id)
+        cleanup.add(QuizAttempt.user_id, student.id)
+        return {
+            "student_id": student.id, "category_id": category.id, "level_ids": [level.id for level in levels],
+            **{name: quiz.id for name, quiz in quizzes.items()},
+        }
+
+
+def _answer(student_id: int, quiz_id: int, correct: bool = True) -> None:
+    with SessionLocal() as db:
+        db.add(QuizAttempt(user_id=student_id, quiz_id=quiz_id, answer="a" if correct else "b",
+                           correct=correct, points_earned=1 if correct else 0))
+        db.commit()
+
+
+def _recommended(engine: Recommender, db, catalog) -> list:
+    return [quiz_id for quiz_id, _ in engine.recommend(db, catalog["student_id"], category_id=catalog["category_id"])]
+
+
+def test_ranking_prefers_target_success(catalog):
+    engine = Recommender(refresh_seconds=3600, cache_size=16)
+    with SessionLocal() as db:
+        ranked = engine.recommend(db, catalog["student_id"], category_id=catalog["category_id"])
+    assert [quiz_id for quiz_id, _ in ranked] == [catalog["medio"], catalog["facile"], catalog["difficile"]]
+    assert ranked[0][1] == pytest.approx(8 / 12, abs=1e-3)
+
+
+def test_solved_quizzes_are_excluded(catalog):
+    _answer(catalog["student_id"], catalog["medio"])
+    _answer(catalog["student_id"], catalog["difficile"], correct=False)
+    engine = Recommender(refresh_seconds=3600, cache_size=16)
+    with SessionLocal() as db:
+        recommended = _recommended(engine, db, catalog)
+    assert catalog["medio"] not in recommended
+    assert catalog["difficile"] in recommended
+
+
+def test_committed_attempt_updates_cached_mastery(catalog):
+    with SessionLocal() as db:
+        recommender.rebuild(db)
+        assert _recommended(recommender, db, catalog)[0] == catalog["medio"]
+
+    _answer(catalog["student_id"], catalog["medio"])
+
+    with SessionLocal() as db, count_queries() as queries:
+        recommended = _recommended(recommender, db, catalog)
+    # Padronanza aggiornata dal listener dopo il commit, senza rileggerla dal database
+    assert queries.count == 0, queries.report()
+    assert catalog["medio"] not in recommended
+    assert catalog["medio"] in recommender.mastery_cache.get(catalog["student_id"]).solved
+
+
+def test_catalog_reload_remaps_cached_mastery(catalog):
+    _answer(catalog["student_id"], catalog["medio"])
+    engine = Recommender(refresh_seconds=3600, cache_size=16)
+    with SessionLocal() as db:
+        engine.rebuild(db)
+        before = engine.mastery(db, catalog["student_id"])
+        assert before.difficulties == {catalog["level_ids"][0]: [1, 1]}
+
+        # Il quiz cambia difficoltà: dopo la ricarica le somme seguono il nuovo catalogo
+        db.get(Quiz, catalog["medio"]).difficulty_level_id = catalog["level_ids"][1]
+        db.commit()
+        engine.rebuild(db)
+        with count_queries() as queries:
+            after = engine.mastery(db, catalog["student_id"])
+    assert queries.count == 0, queries.report()
+    assert after is before
+    assert after.difficulties == {catalog["level_ids"][1]: [1, 1]}